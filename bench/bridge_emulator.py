@@ -0,0 +1,292 @@
+import os
+import json
+import random
+import asyncio
+import argparse
+from urllib.parse import urljoin
+from lib.logger import get_logger
+from models.parser import Parser
+from bench.chain_generator import ChainGenerator
+from tornado.web import Application, RequestHandler
+from tornado.ioloop import IOLoop
+from tornado.httpclient import AsyncHTTPClient, HTTPClientError
+
+logger = get_logger('bridge-emulator')
+
+
+class SyntheticSource:
+    """Bridge data served from a ChainGenerator."""
+
+    def __init__(self, generator: ChainGenerator):
+        self.generator = generator
+        self.network = generator.network
+
+    def get_status(self):
+        tip = self.generator.tip
+        slot = {'slot': [tip['epoch'], tip['slot']], 'height': tip['height']}
+        # The current epoch is still open, only the ones before it are packed.
+        return {'packedEpochs': self.generator.epochs - 1, 'tip': {'local': slot, 'remote': slot}}
+
+    def get_tip(self):
+        return self.generator.blocks_by_height[self.generator.tip['height']]
+
+    def get_epoch(self, epoch_id: int):
+        return self.generator.epoch_files.get(epoch_id)
+
+    def get_block_by_height(self, height: int):
+        return self.generator.blocks_by_height.get(height)
+
+    def get_block(self, block_hash: str):
+        return self.generator.blocks_by_hash.get(block_hash)
+
+    def get_genesis(self, genesis_hash: str):
+        return self.generator.genesis if genesis_hash == self.generator.genesis_hash else None
+
+
+class RecordedSource:
+    """
+    Bridge data recorded from a real cardano-http-bridge, laid out as
+    network.json, status.json, tip, genesis/{hash}.json, epoch/{id},
+    height/{h} and block/{hash} in one directory.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.network = self.read_json('network.json')
+
+    def path(self, *parts):
+        return os.path.join(self.directory, *[str(part) for part in parts])
+
+    def read(self, *parts):
+        path = self.path(*parts)
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def read_json(self, *parts):
+        data = self.read(*parts)
+        return json.loads(data) if data is not None else None
+
+    def get_status(self):
+        return self.read_json('status.json')
+
+    def get_tip(self):
+        return self.read('tip')
+
+    def get_epoch(self, epoch_id: int):
+        return self.read('epoch', epoch_id)
+
+    def get_block_by_height(self, height: int):
+        return self.read('height', height)
+
+    def get_block(self, block_hash: str):
+        return self.read('block', block_hash)
+
+    def get_genesis(self, genesis_hash: str):
+        return self.read_json('genesis', f'{genesis_hash}.json')
+
+
+class BridgeEmulator:
+    """
+    Serves the cardano-http-bridge endpoints used by HttpBridge. Every
+    response is delayed by the latency plus its size over the bandwidth.
+    With a fork injected, heights [fork_at, fork_at + fork_length) are
+    served from a side chain until the height after it is requested; from
+    then on the main chain is served, so the importer has to roll back.
+    Posted txs are rejected at the given rate.
+    """
+
+    def __init__(self, source, latency=0.0, bandwidth=None, fork_blocks=None, reject_rate=0.0):
+        self.source = source
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.fork_blocks = fork_blocks or {}
+        self.reject_rate = reject_rate
+        self.random = random.Random(0)
+        self.fork_resolved = False
+        self.signed_txs = []
+        self.stats = {'requests': 0, 'bytes': 0}
+
+    async def delay(self, size: int):
+        seconds = self.latency
+        if self.bandwidth:
+            seconds += size / self.bandwidth
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+    def get_block_by_height(self, height: int):
+        if self.fork_blocks and not self.fork_resolved:
+            if height in self.fork_blocks:
+                return self.fork_blocks[height]
+            if height > max(self.fork_blocks):
+                logger.info('switch from fork to main chain at height: %d', height)
+                self.fork_resolved = True
+
+        return self.source.get_block_by_height(height)
+
+    def routes(self):
+        return [(r'/([^/]+)/(.*)', BridgeHandler, {'emulator': self})]
+
+    def app(self):
+        return Application(self.routes(), log_function=lambda handler: None)
+
+
+class BridgeHandler(RequestHandler):
+
+    def initialize(self, emulator: BridgeEmulator):
+        self.emulator = emulator
+        self.source = emulator.source
+
+    async def respond(self, data):
+        if data is None:
+            self.set_status(404)
+            return
+
+        if isinstance(data, (dict, list)):
+            data = json.dumps(data).encode()
+            self.set_header('Content-Type', 'application/json')
+        else:
+            self.set_header('Content-Type', 'application/octet-stream')
+
+        self.emulator.stats['requests'] += 1
+        self.emulator.stats['bytes'] += len(data)
+        await self.emulator.delay(len(data))
+        self.write(data)
+
+    async def get(self, network: str, path: str):
+        if network != self.source.network['name']:
+            self.set_status(404)
+            return
+
+        resource, _, arg = path.partition('/')
+        if resource == 'status':
+            data = self.source.get_status()
+        elif resource == 'tip':
+            data = self.source.get_tip()
+        elif resource == 'epoch':
+            data = self.source.get_epoch(int(arg))
+        elif resource == 'height':
+            data = self.emulator.get_block_by_height(int(arg))
+        elif resource == 'block':
+            data = self.source.get_block(arg)
+        elif resource == 'genesis':
+            data = self.source.get_genesis(arg)
+        else:
+            data = None
+
+        await self.respond(data)
+
+    async def post(self, network: str, path: str):
+        if path != 'txs/signed':
+            self.set_status(404)
+            return
+
+        await self.emulator.delay(len(self.request.body))
+        if self.emulator.random.random() < self.emulator.reject_rate:
+            self.set_status(400)
+            self.write('tx rejected by bridge emulator')
+            return
+
+        self.emulator.signed_txs.append(self.request.body)
+        self.write({'success': True})
+
+
+async def record(bridge_url: str, network: dict, directory: str, epochs: int, heights: int):
+    """Copies the given epochs and the blocks above them from a real bridge."""
+    client = AsyncHTTPClient()
+    network_url = urljoin(bridge_url, network['name']) + '/'
+
+    async def fetch(path: str):
+        try:
+            resp = await client.fetch(urljoin(network_url, path), request_timeout=600)
+            return resp.body
+        except HTTPClientError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def save(data: bytes, *parts):
+        path = os.path.join(directory, *[str(part) for part in parts])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    save(json.dumps(network).encode(), 'network.json')
+    save(await fetch(f'genesis/{network["genesis"]}'), 'genesis', f'{network["genesis"]}.json')
+    status = json.loads(await fetch('status'))
+    epochs = min(epochs, status['packedEpochs'])
+    parser = Parser()
+    height = 0
+    for epoch_id in range(epochs):
+        data = await fetch(f'epoch/{epoch_id}')
+        save(data, 'epoch', epoch_id)
+        for block in parser.parse_epoch(data, {'omitEbb': True}):
+            height = block.height
+        logger.info('recorded epoch: %d up to height: %d', epoch_id, height)
+
+    tip = None
+    for block_height in range(height + 1, height + 1 + heights):
+        data = await fetch(f'height/{block_height}')
+        if data is None:
+            break
+        block = parser.parse_block(data)
+        save(data, 'height', block_height)
+        save(data, 'block', block.hash)
+        tip = block
+
+    # The recording ends at the last block saved, the status is rewritten to match.
+    if tip:
+        slot = {'slot': [tip.epoch, tip.slot], 'height': tip.height}
+        save(await fetch(f'height/{tip.height}'), 'tip')
+        status = {'packedEpochs': epochs, 'tip': {'local': slot, 'remote': slot}}
+    save(json.dumps(status).encode(), 'status.json')
+    logger.info('recorded %d epochs and %d blocks into: %s', epochs, heights, directory)
+
+
+def add_source_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--recorded', help='directory with recorded bridge data instead of a synthetic chain')
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--blocks-per-epoch', type=int, default=200)
+    parser.add_argument('--txs-per-block', type=int, default=10)
+    parser.add_argument('--outputs-per-tx', type=int, default=2)
+    parser.add_argument('--wallets', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--bandwidth', type=float, default=None, help='bytes per second')
+    parser.add_argument('--fork-at', type=int, default=None, help='height the injected fork starts at')
+    parser.add_argument('--fork-length', type=int, default=3)
+    parser.add_argument('--reject-rate', type=float, default=0.0, help='share of posted txs the bridge rejects')
+
+
+def emulator_from_args(args):
+    if args.recorded:
+        return BridgeEmulator(RecordedSource(args.recorded), args.latency, args.bandwidth, reject_rate=args.reject_rate)
+
+    generator = ChainGenerator(
+        args.epochs, args.blocks_per_epoch, args.txs_per_block,
+        args.outputs_per_tx, args.wallets, args.seed
+    ).generate()
+    fork_blocks = generator.fork(args.fork_at, args.fork_length) if args.fork_at else None
+    return BridgeEmulator(SyntheticSource(generator), args.latency, args.bandwidth, fork_blocks, args.reject_rate)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='cardano-http-bridge emulator')
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--record', help='bridge url to record from into --recorded')
+    parser.add_argument('--record-heights', type=int, default=1000, help='blocks recorded after the packed epochs')
+    add_source_arguments(parser)
+    args = parser.parse_args()
+
+    if args.record:
+        from config import config
+        IOLoop.current().run_sync(
+            lambda: record(args.record, config['network'], args.recorded, args.epochs, args.record_heights)
+        )
+    else:
+        emulator = emulator_from_args(args)
+        emulator.app().listen(args.port)
+        logger.info('bridge emulator for network: %s is listen on port: %d', emulator.source.network['name'], args.port)
+        IOLoop.current().start()
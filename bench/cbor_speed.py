@@ -0,0 +1,94 @@
+import os
+import sys
+import argparse
+from time import time
+from lib import address as address_codec
+from lib.cbor_codec import codec, cbor2, BACKENDS
+from models.block import Block
+from models.epoch import Epoch
+from bench.chain_generator import ChainGenerator
+from bench.bridge_emulator import RecordedSource
+
+
+def epoch_blobs(data: bytes):
+    blocks_list, offset = data[16:], 0
+    while offset < len(blocks_list):
+        block_size, blob = Epoch.get_blockdata_by_offset(blocks_list, offset)
+        yield blob
+        offset += block_size + 4 + (block_size % 4 and 4 - block_size % 4)
+
+
+def load_blobs(args):
+    if args.recorded:
+        source = RecordedSource(args.recorded)
+        blobs = []
+        for name in sorted(os.listdir(source.path('epoch')), key=int):
+            blobs += list(epoch_blobs(source.get_epoch(name)))
+        if os.path.isdir(source.path('height')):
+            for name in sorted(os.listdir(source.path('height')), key=int):
+                blobs.append(source.get_block_by_height(name))
+        return source.network, blobs
+
+    generator = ChainGenerator(args.epochs, args.blocks_per_epoch, args.txs_per_block, wallets=args.wallets).generate()
+    blobs = []
+    for epoch_id in sorted(generator.epoch_files):
+        blobs += list(epoch_blobs(generator.epoch_files[epoch_id]))
+    return generator.network, blobs
+
+
+def clear_caches():
+    for func in [address_codec.encode_raw, address_codec.decode_raw, address_codec.redeem_key_to_address]:
+        func.cache_clear()
+
+
+def measure(blobs: list, start_time: int, rounds: int):
+    clear_caches()
+    start = time()
+    for _ in range(rounds):
+        for blob in blobs:
+            codec.loads(blob)
+    decode_seconds = time() - start
+
+    clear_caches()
+    start = time()
+    for _ in range(rounds):
+        for blob in blobs:
+            Block.from_CBOR(blob, start_time)
+    return decode_seconds, time() - start
+
+
+def main(args):
+    network, blobs = load_blobs(args)
+    size = sum(len(blob) for blob in blobs)
+    print(f'{len(blobs)} blocks, {size / 1024 / 1024:.1f} MB from {args.recorded or "a synthetic chain"}')
+    backends = [backend for backend in BACKENDS if backend != 'cbor2' or cbor2 is not None]
+    if len(backends) < len(BACKENDS):
+        print('  cbor2 is not installed, only the pure python backend is measured')
+
+    print(f'speed over {args.rounds} rounds:')
+    results = {}
+    for backend in backends:
+        codec.set_backend(backend)
+        results[backend] = measure(blobs, network['startTime'], args.rounds)
+        decode_seconds, parse_seconds = results[backend]
+        blocks = len(blobs) * args.rounds
+        print(f'  {backend:<6} decode: {blocks / decode_seconds:9.1f} blocks/s {size * args.rounds / decode_seconds / 1024 / 1024:7.1f} MB/s'
+              f'  parse: {blocks / parse_seconds:9.1f} blocks/s')
+    if len(results) > 1:
+        base = results[BACKENDS[0]]
+        for backend, (decode_seconds, parse_seconds) in results.items():
+            if backend != BACKENDS[0]:
+                print(f'  {backend} speedup: decode {base[0] / decode_seconds:.2f}x, parse {base[1] / parse_seconds:.2f}x')
+
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='decode and parse speed of the cbor backends')
+    parser.add_argument('--recorded', help='directory with recorded bridge data, see bench/bridge_emulator.py --record')
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--blocks-per-epoch', type=int, default=200)
+    parser.add_argument('--txs-per-block', type=int, default=10)
+    parser.add_argument('--wallets', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=3)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,189 @@
+import json
+import base64
+import random
+import binascii
+from lib import utils
+from lib import address as address_codec
+from lib.cbor_codec import codec
+from hashlib import blake2b, sha3_256
+from models.block import SLOTS_IN_EPOCH
+from nacl.signing import SigningKey
+
+EPOCH_FILE_HEADER = b'\x00' * 16
+BENCH_START_TIME = 1506203091
+
+
+class Wallet:
+    """
+    Ed25519 key pair with a regular (type 0) Byron address derived from it.
+    """
+
+    def __init__(self, seed: bytes):
+        key_seed = blake2b(seed, digest_size=32).digest()
+        chain_code = blake2b(seed + b'cc', digest_size=32).digest()
+        self.signing_key = SigningKey(key_seed)
+        self.xpub = bytes(self.signing_key.verify_key) + chain_code
+        root = blake2b(
+            sha3_256(codec.dumps([0, [0, self.xpub], {}], canonical=True)).digest(),
+            digest_size=28
+        ).digest()
+        payload = codec.dumps([root, {}, 0])
+        self.address_struct = [codec.Tag(24, payload), binascii.crc32(payload)]
+        self.address = address_codec.encode_address(self.address_struct)
+
+    def sign(self, tx_id: str, protocol_magic=0):
+        # Byron tx signatures cover a tag, the protocol magic and the tx id.
+        data = b'\x01' + codec.dumps(protocol_magic) + codec.dumps(bytes.fromhex(tx_id))
+        return self.signing_key.sign(data).signature
+
+    def witness(self, tx_id: str, protocol_magic=0):
+        return [0, codec.Tag(24, codec.dumps([self.xpub, self.sign(tx_id, protocol_magic)]))]
+
+
+def build_spend_tx(tx_hash: str, index: int, wallet: Wallet, amount: int, receivers: list, fee=200000):
+    """Signed tx moving one output of the wallet to the receivers in equal shares."""
+    inputs = [[0, codec.Tag(24, codec.dumps([bytes.fromhex(tx_hash), index]))]]
+    share = (amount - fee) // len(receivers)
+    outputs = [[receiver.address_struct, share] for receiver in receivers]
+    tx_id, _ = utils.pack_raw_txid_and_body([[inputs, outputs, {}], []])
+    return tx_id, share, [[inputs, outputs, {}], [wallet.witness(tx_id)]]
+
+
+def pack_epoch(blobs: list):
+    data = [EPOCH_FILE_HEADER]
+    for blob in blobs:
+        data.append(len(blob).to_bytes(4, byteorder='big'))
+        data.append(blob)
+        padding = len(blob) % 4
+        if padding:
+            data.append(b'\x00' * (4 - padding))
+
+    return b''.join(data)
+
+
+class ChainGenerator:
+    """
+    Deterministic synthetic chain in cardano-http-bridge formats: a genesis
+    with avvm and non-avvm balances, packed epoch files and raw blocks. Txs
+    spend genesis and earlier outputs, so the importer resolves inputs from
+    its database just like on mainnet.
+    """
+
+    def __init__(self, epochs=3, blocks_per_epoch=200, txs_per_block=10, outputs_per_tx=2, wallets=500, seed=1):
+        self.random = random.Random(seed)
+        self.epochs = epochs
+        self.blocks_per_epoch = min(blocks_per_epoch, SLOTS_IN_EPOCH)
+        self.txs_per_block = txs_per_block
+        self.outputs_per_tx = outputs_per_tx
+        self.wallets = [Wallet(seed.to_bytes(4, 'big') + i.to_bytes(4, 'big')) for i in range(wallets)]
+        self.unspent = []
+        self.blocks = []
+        self.blocks_by_hash = {}
+        self.blocks_by_height = {}
+        self.epoch_files = {}
+        self.genesis = self.build_genesis()
+        self.genesis_hash = blake2b(json.dumps(self.genesis, sort_keys=True).encode(), digest_size=32).hexdigest()
+
+    def build_genesis(self):
+        avvm_distr, non_avvm_balances = {}, {}
+        for i, wallet in enumerate(self.wallets):
+            amount = self.random.randint(10 ** 9, 10 ** 12)
+            if i % 2:
+                non_avvm_balances[wallet.address] = str(amount)
+                utxo_hash = address_codec.address_hash(wallet.address)
+                self.unspent.append((utxo_hash, 0, wallet, amount))
+            else:
+                redeem_key = blake2b(wallet.xpub, digest_size=32).digest()
+                public_redeem_key = base64.urlsafe_b64encode(redeem_key).decode()
+                avvm_distr[public_redeem_key] = str(amount)
+                receiver = address_codec.redeem_key_to_address(public_redeem_key)
+                # Redeem outputs are spent by the wallet holding the key.
+                self.unspent.append((address_codec.address_hash(receiver), 0, wallet, amount))
+
+        return {
+            'avvmDistr': avvm_distr,
+            'nonAvvmBalances': non_avvm_balances,
+            'protocolConsts': {'protocolMagic': 0},
+        }
+
+    def build_tx(self):
+        self.random.shuffle(self.unspent)
+        tx_hash, index, wallet, amount = self.unspent.pop()
+        receivers = self.random.sample(self.wallets, self.outputs_per_tx)
+        tx_id, share, tx = build_spend_tx(tx_hash, index, wallet, amount, receivers)
+        for i, receiver in enumerate(receivers):
+            self.unspent.append((tx_id, i, receiver, share))
+
+        return tx
+
+    def add_block(self, block_type: int, header: list, body: list):
+        blob = codec.dumps([block_type, [header, body, {}]])
+        block_hash = utils.header_to_id(header, block_type)
+        self.blocks_by_hash[block_hash] = blob
+        return block_hash, blob
+
+    def ebb(self, epoch: int, prev_hash: bytes, height: int):
+        header = [0, prev_hash, b'\x00' * 32, [epoch, [height]], [{}]]
+        return self.add_block(0, header, [])
+
+    def main_block(self, epoch: int, slot: int, prev_hash: bytes, height: int, txs: list, extra=b''):
+        consensus = [[epoch, slot], b'\x00' * 64, [height], [0, b'\x00' * 64]]
+        header = [0, prev_hash, b'\x00' * 32, consensus, [[0, 1, 0], [1, 0], {}, extra]]
+        body = [txs, [0, {}], [], [[], []]]
+        return self.add_block(1, header, body)
+
+    def generate(self):
+        prev_hash, height = b'\x00' * 32, 0
+        slot_step = SLOTS_IN_EPOCH // self.blocks_per_epoch
+        for epoch in range(self.epochs):
+            blobs = []
+            ebb_hash, blob = self.ebb(epoch, prev_hash, height)
+            blobs.append(blob)
+            prev_hash = bytes.fromhex(ebb_hash)
+            for i in range(self.blocks_per_epoch):
+                height += 1
+                txs = [self.build_tx() for _ in range(min(self.txs_per_block, len(self.unspent)))]
+                block_hash, blob = self.main_block(epoch, i * slot_step, prev_hash, height, txs)
+                blobs.append(blob)
+                self.blocks.append({
+                    'hash': block_hash,
+                    'prev_hash': prev_hash,
+                    'epoch': epoch,
+                    'slot': i * slot_step,
+                    'height': height,
+                    'txs': txs,
+                })
+                self.blocks_by_height[height] = blob
+                prev_hash = bytes.fromhex(block_hash)
+
+            self.epoch_files[epoch] = pack_epoch(blobs)
+
+        return self
+
+    def fork(self, from_height: int, length: int):
+        # Same txs as the main chain under different block hashes, so the
+        # importer has to roll back and apply them again when it switches.
+        fork_blocks = {}
+        prev_hash = self.blocks[from_height - 1]['prev_hash']
+        for block in self.blocks[from_height - 1:from_height - 1 + length]:
+            block_hash, blob = self.main_block(
+                block['epoch'], block['slot'], prev_hash, block['height'], block['txs'], extra=b'fork'
+            )
+            fork_blocks[block['height']] = blob
+            prev_hash = bytes.fromhex(block_hash)
+
+        return fork_blocks
+
+    @property
+    def tip(self):
+        return self.blocks[-1]
+
+    @property
+    def network(self):
+        return {
+            'name': 'bench',
+            'genesis': self.genesis_hash,
+            'startTime': BENCH_START_TIME,
+            'networkMagic': None,
+            'protocolMagic': 0,
+        }
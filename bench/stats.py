@@ -0,0 +1,74 @@
+import inspect
+import contextvars
+from time import time
+from collections import defaultdict
+
+_active_stages = contextvars.ContextVar('active_stages', default=frozenset())
+
+
+class StageTimer:
+    """
+    Wall time per stage, summed over calls. Stages overlap while requests or
+    the epoch pipeline run concurrently, so they do not add up to the total.
+    Nested calls of a stage inside the same task are only timed once.
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+
+    def enter(self, stage: str):
+        active = _active_stages.get()
+        if stage in active:
+            return None
+
+        return _active_stages.set(active | {stage}), time()
+
+    def exit(self, stage: str, entered):
+        if entered is None:
+            return
+
+        token, start = entered
+        _active_stages.reset(token)
+        self.seconds[stage] += time() - start
+        self.calls[stage] += 1
+
+    def wrap(self, owner, name: str, stage: str):
+        func = getattr(owner, name)
+        timer = self
+
+        if inspect.iscoroutinefunction(func):
+            async def wrapper(*args, **kwargs):
+                entered = timer.enter(stage)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    timer.exit(stage, entered)
+        else:
+            def wrapper(*args, **kwargs):
+                entered = timer.enter(stage)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    timer.exit(stage, entered)
+
+        setattr(owner, name, wrapper)
+
+    def wrap_all(self, cls, stage: str):
+        for name, func in list(vars(cls).items()):
+            if inspect.iscoroutinefunction(func):
+                self.wrap(cls, name, stage)
+
+    def report(self, stages: list):
+        for stage in stages:
+            calls = self.calls[stage]
+            average = self.seconds[stage] / calls * 1000 if calls else 0
+            print(f'    {stage:<12} {self.seconds[stage]:8.2f}s in {calls} calls, {average:.2f}ms avg')
+
+
+def percentile(values: list, p: float):
+    if not values:
+        return 0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
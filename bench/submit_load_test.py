@@ -0,0 +1,181 @@
+import os
+import re
+import json
+import base64
+import asyncio
+import argparse
+import multiprocessing
+from time import time
+from datetime import datetime
+from collections import Counter, deque
+from config import config
+from lib import utils
+from lib.cbor_codec import codec
+from bench.stats import StageTimer, percentile
+from bench.chain_generator import ChainGenerator, build_spend_tx
+from bench.bridge_emulator import BridgeEmulator, SyntheticSource
+from constants.transaction import TX_SUCCESS_STATUS
+from tornado.web import Application
+from tornado.ioloop import IOLoop
+from tornado.httpclient import AsyncHTTPClient
+
+OUTPUTS_PER_FUNDING_TX = 100
+FUNDING_AMOUNT = 10 ** 9
+
+
+async def seed(database, generator: ChainGenerator, count: int):
+    """
+    Stores funding txs and their outputs as if they were imported, and returns
+    one signed tx spending each output, base64 encoded.
+    """
+    funding_txs, spendable = [], []
+    for i in range(0, count, OUTPUTS_PER_FUNDING_TX):
+        receivers = [generator.random.choice(generator.wallets) for _ in range(min(OUTPUTS_PER_FUNDING_TX, count - i))]
+        inputs = [[0, codec.Tag(24, codec.dumps([os.urandom(32), 0]))]]
+        outputs = [[receiver.address_struct, FUNDING_AMOUNT] for receiver in receivers]
+        tx = utils.convert_raw_tx_to_obj([[inputs, outputs, {}], []], {
+            'txTime': datetime.utcnow(),
+            'txOrdinal': len(funding_txs),
+            'status': TX_SUCCESS_STATUS,
+            'blockNum': 1,
+            'block_hash': None,
+        })
+        funding_txs.append(tx)
+        spendable += [(tx['id'], index, receiver) for index, receiver in enumerate(receivers)]
+
+    await database.save_many_txs(funding_txs, {tx['id']: [] for tx in funding_txs})
+    await database.save_utxos(list(utils.get_txs_utxos(funding_txs).values()))
+
+    payloads = []
+    for tx_hash, index, wallet in spendable:
+        _, _, tx = build_spend_tx(tx_hash, index, wallet, FUNDING_AMOUNT, [generator.random.choice(generator.wallets)])
+        payloads.append(base64.b64encode(codec.dumps(tx)).decode())
+
+    return payloads
+
+
+def normalize_error(message: str):
+    # Hashes differ per tx, errors are grouped by their text only.
+    return re.sub(r'[0-9a-f]{16,}', '<hash>', message)[:120]
+
+
+async def send_all(url: str, payloads: list, concurrency: int, rate: float, keys: int):
+    AsyncHTTPClient.configure(None, max_clients=concurrency)
+    client = AsyncHTTPClient()
+    pending = deque(enumerate(payloads))
+    results = []
+    start = time()
+
+    async def worker():
+        while pending:
+            i, payload = pending.popleft()
+            # With a fixed rate latency counts from the scheduled send time, so
+            # a saturated server is not hidden by the generator sending less.
+            scheduled = start + i / rate if rate else time()
+            if scheduled > time():
+                await asyncio.sleep(scheduled - time())
+
+            headers = {'X-Api-Key': f'load-test-{i % keys}'} if keys else {}
+            try:
+                resp = await client.fetch(
+                    url, method='POST', body=json.dumps({'signedTx': payload}),
+                    headers=headers, raise_error=False, request_timeout=120
+                )
+                try:
+                    body = json.loads(resp.body)
+                except ValueError:
+                    body = {'message': (resp.body or b'').decode(errors='replace')}
+                error = None if resp.code == 200 and body.get('success') else normalize_error(body.get('message') or '')
+                results.append((time() - scheduled, resp.code, error))
+            except Exception as e:
+                results.append((time() - scheduled, 599, type(e).__name__))
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return results, time() - start
+
+
+def drive(url: str, payloads: list, concurrency: int, rate: float, keys: int, conn):
+    # Runs in its own process, the client does not compete with the server
+    # for the event loop.
+    conn.send(IOLoop.current().run_sync(lambda: send_all(url, payloads, concurrency, rate, keys)))
+    conn.close()
+
+
+def report(results: list, elapsed: float, timer: StageTimer):
+    latencies = [latency * 1000 for latency, _, _ in results]
+    errors = Counter((status, error) for _, status, error in results if error is not None or status != 200)
+    succeeded = len(results) - sum(errors.values())
+    print(f'{len(results)} requests in {elapsed:.2f}s, {succeeded} succeeded')
+    print(f'  throughput: {len(results) / elapsed:.1f} req/s ({succeeded / elapsed:.1f} accepted/s)')
+    print(f'  latency:    p50 {percentile(latencies, 50):.1f}ms, p95 {percentile(latencies, 95):.1f}ms, '
+          f'p99 {percentile(latencies, 99):.1f}ms, max {max(latencies, default=0):.1f}ms')
+    if errors:
+        print('  errors:')
+        for (status, error), count in errors.most_common():
+            print(f'    {count:6d} x {status} {error}')
+    print('  stages (wall time, overlapping):')
+    timer.report(['parse', 'validation', 'bridge post', 'db store'])
+
+
+async def run(args, emulator: BridgeEmulator):
+    # Imported late: the handlers read network and admission settings from config.
+    from db import DB
+    from routers import Routers
+
+    timer = StageTimer()
+    timer.wrap(Routers.SignHandler, 'parse_raw_tx', 'parse')
+    timer.wrap(Routers.SignHandler, 'validate_tx', 'validation')
+    timer.wrap(Routers.SignHandler, 'send_tx', 'bridge post')
+    timer.wrap(Routers.SignHandler, 'store_txs_as_pending', 'db store')
+
+    database = DB()
+    if args.reset_db:
+        await database.create_schema(drop=True)
+    payloads = await seed(database, emulator.source.generator, args.requests)
+    database.close()
+
+    # Access logs of every request would cost more than the handlers.
+    Application(Routers()(), log_function=lambda handler: None).listen(args.port, '127.0.0.1')
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=drive, args=(
+        f'http://127.0.0.1:{args.port}/api/txs/signed', payloads, args.concurrency, args.rate, args.keys, sender
+    ))
+    process.start()
+
+    def receive():
+        while not receiver.poll(1):
+            if not process.is_alive():
+                raise Exception(f'load generator exited with code: {process.exitcode}')
+        return receiver.recv()
+
+    results, elapsed = await IOLoop.current().run_in_executor(None, receive)
+    process.join()
+
+    report(results, elapsed, timer)
+    print(f'  bridge:     {len(emulator.signed_txs)} txs accepted by the stub bridge')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='load test of the signed tx submission api')
+    parser.add_argument('--port', type=int, default=19090)
+    parser.add_argument('--bridge-port', type=int, default=18083)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--rate', type=float, default=None, help='requests per second, unbounded by default')
+    parser.add_argument('--keys', type=int, default=0, help='api keys to spread requests over, none by default: one client address quota')
+    parser.add_argument('--wallets', type=int, default=200)
+    parser.add_argument('--bridge-latency', type=float, default=0.0)
+    parser.add_argument('--reject-rate', type=float, default=0.0)
+    parser.add_argument('--reset-db', action='store_true', help='drop and recreate all tables first')
+    args = parser.parse_args()
+
+    generator = ChainGenerator(epochs=1, blocks_per_epoch=1, txs_per_block=0, wallets=args.wallets).generate()
+    emulator = BridgeEmulator(SyntheticSource(generator), args.bridge_latency, reject_rate=args.reject_rate)
+    emulator.app().listen(args.bridge_port, '127.0.0.1')
+    config['bridgeUrl'] = f'http://127.0.0.1:{args.bridge_port}'
+    config['network'] = generator.network
+    # Without keys every request shares the quota of the one client address.
+    config.setdefault('admission', {})['apiKeys'] = [f'load-test-{i}' for i in range(args.keys)]
+
+    IOLoop.current().run_sync(lambda: run(args, emulator))
@@ -0,0 +1,84 @@
+import argparse
+import resource
+from time import time
+from config import config
+from bench.bridge_emulator import add_source_arguments, emulator_from_args
+from bench.stats import StageTimer
+from tornado.ioloop import IOLoop
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on linux. For children it is the largest
+    # single worker, not their sum.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+def children_cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def run(args, emulator):
+    # Imported late: network settings are read from config when these are built.
+    from db import DB
+    from server import load_genesis
+    from models.parser import Parser
+    from models.http_bridge import HttpBridge
+    from models.scheduler import Scheduler
+
+    timer = StageTimer()
+    timer.wrap(HttpBridge, 'get', 'download')
+    timer.wrap(Parser, 'parse_block', 'parse')
+    timer.wrap_all(DB, 'db')
+
+    database = DB()
+    if args.reset_db:
+        await database.create_schema(drop=True)
+    await load_genesis(database, HttpBridge())
+
+    target_height = emulator.source.get_status()['tip']['local']['height']
+    scheduler = Scheduler()
+    start, children_cpu_start = time(), children_cpu_seconds()
+    height = 0
+    while height < target_height:
+        await scheduler.check_tip()
+        best_block_num = await database.get_best_block_num()
+        if best_block_num['height'] <= height and not emulator.fork_blocks:
+            raise Exception(f'sync stalled at height: {height}, tip is: {target_height}')
+        height = best_block_num['height']
+        if time() - start > args.timeout:
+            raise Exception(f'sync timed out at height: {height}, tip is: {target_height}')
+    elapsed = time() - start
+
+    with database.conn as cursor:
+        cursor.execute('SELECT count(*) AS count FROM txs')
+        tx_count = cursor.fetchone()['count']
+    database.close()
+
+    own_rss, children_rss = peak_rss_mb()
+    print(f'synced {height} blocks and {tx_count} txs in {elapsed:.2f}s')
+    print(f'  blocks/sec: {height / elapsed:.1f}')
+    print(f'  txs/sec:    {tx_count / elapsed:.1f}')
+    print(f'  peak rss:   {own_rss:.1f} MB (parse workers: {children_rss:.1f} MB)')
+    print(f'  bridge:     {emulator.stats["requests"]} requests, {emulator.stats["bytes"] / 1024 / 1024:.1f} MB')
+    print('  stages (wall time, overlapping):')
+    timer.report(['download', 'parse', 'db'])
+    print(f'    {"parse cpu":<12} {children_cpu_seconds() - children_cpu_start:8.2f}s in epoch workers')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='full sync benchmark against the bridge emulator')
+    parser.add_argument('--port', type=int, default=18082)
+    parser.add_argument('--reset-db', action='store_true', help='drop and recreate all tables first')
+    parser.add_argument('--timeout', type=float, default=3600)
+    add_source_arguments(parser)
+    args = parser.parse_args()
+
+    emulator = emulator_from_args(args)
+    emulator.app().listen(args.port, '127.0.0.1')
+    config['bridgeUrl'] = f'http://127.0.0.1:{args.port}'
+    config['network'] = emulator.source.network
+
+    IOLoop.current().run_sync(lambda: run(args, emulator))
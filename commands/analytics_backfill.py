@@ -0,0 +1,88 @@
+from time import time
+from itertools import groupby
+from operator import itemgetter
+from db import DB, WorkerDBs
+from config import config
+from lib import analytics
+from lib.logger import get_logger
+from models.watched_addresses import WatchedAddresses
+from concurrent.futures import ThreadPoolExecutor
+from constants.scheduler import ROLLBACK_BLOCKS_COUNT
+from tornado.ioloop import IOLoop
+from tornado.options import define, options
+
+logger = get_logger('analytics-backfill')
+
+define('dir', type=str, default=None, help='export directory, analyticsExport.dir by default')
+define('workers', type=int, default=2, help='epochs exported in parallel')
+define('from_epoch', type=int, default=0, help='first epoch to export')
+define('to_epoch', type=int, default=None, help='last epoch to export, the newest final one by default')
+define('force', type=bool, default=False, help='export epochs that were exported before again')
+
+worker_dbs = WorkerDBs()
+
+
+def export_epoch(directory: str, epoch: int):
+    database = worker_dbs.get()
+
+    blocks = database.get_epoch_blocks(epoch)
+    if not blocks:
+        logger.warning('epoch %d has no stored blocks', epoch)
+        return 0
+
+    txs = database.get_txs_by_heights(blocks[0]['block_height'], blocks[-1]['block_height'])
+    block_txs = {height: list(rows) for height, rows in groupby(txs, key=itemgetter('block_num'))}
+    rows = analytics.EpochRows(epoch, True)
+    for block in blocks:
+        rows.add_block(block['block_hash'], block['prev_hash'], block['block_height'], block['slot'], [{
+            'id': tx['hash'],
+            'txOrdinal': tx['tx_ordinal'],
+            'txTime': tx['time'],
+            'inputs': tx['inputs'],
+            'outputs': list(zip(tx['outputs_address'], tx['outputs_amount'])),
+        } for tx in block_txs.get(block['block_height'], [])])
+
+    path = analytics.write_epoch(directory, rows)
+    logger.info('epoch %d: %d blocks and %d txs exported to %s', epoch, len(blocks), len(txs), path)
+    return len(txs)
+
+
+async def main():
+    directory = options.dir or config.get('analyticsExport', {}).get('dir')
+    if not directory:
+        raise Exception('--dir or analyticsExport.dir is required')
+    if not analytics.is_available():
+        raise Exception('analytics export requires pyarrow')
+    # Filtered databases only store the txs of watched addresses.
+    if WatchedAddresses.is_enabled():
+        raise Exception('txs are incomplete with watched addresses enabled, epochs can not be exported')
+
+    start = time()
+    database = DB()
+    best_block_num = await database.get_best_block_num()
+    # Epochs ending in the rollback window may still change.
+    last_final = database.get_last_epoch_boundary()
+    database.close()
+    if not last_final:
+        logger.info('no complete epoch is imported yet')
+        return
+
+    to_epoch = last_final['epoch'] if last_final['block_height'] <= best_block_num['height'] - ROLLBACK_BLOCKS_COUNT else last_final['epoch'] - 1
+    if options.to_epoch is not None:
+        to_epoch = min(to_epoch, options.to_epoch)
+    exported = set() if options.force else analytics.exported_epochs(directory)
+    epochs = [epoch for epoch in range(options.from_epoch, to_epoch + 1) if epoch not in exported]
+    logger.info('export %d epochs to %s', len(epochs), directory)
+
+    try:
+        with ThreadPoolExecutor(max_workers=options.workers) as executor:
+            tx_counts = list(executor.map(lambda epoch: export_epoch(directory, epoch), epochs))
+    finally:
+        worker_dbs.close()
+
+    logger.info('%d epochs, %d txs exported in %d seconds', len(epochs), sum(tx_counts), time() - start)
+
+
+if __name__ == '__main__':
+    options.parse_command_line()
+    IOLoop.current().run_sync(main)
@@ -0,0 +1,144 @@
+import sys
+import threading
+from time import time
+from collections import defaultdict
+from db import DB, WorkerDBs
+from config import config
+from lib.logger import get_logger
+from models.http_bridge import HttpBridge
+from models.watched_addresses import WatchedAddresses
+from concurrent.futures import ThreadPoolExecutor
+from constants.db import CHECK_CHUNK_BLOCKS, CHECK_WORKERS
+from tornado.ioloop import IOLoop
+from tornado.options import define, options
+
+logger = get_logger('check-consistency')
+
+define('workers', type=int, default=CHECK_WORKERS, help='parallel database connections')
+define('chunk_blocks', type=int, default=CHECK_CHUNK_BLOCKS, help='block heights checked per query')
+define('from_height', type=int, default=0, help='first height to check')
+define('to_height', type=int, default=None, help='last height to check, the stored tip by default')
+define('max_report', type=int, default=100, help='max discrepancies printed per check')
+define('bridge', type=bool, default=False, help='verify links over epoch boundary blocks with the bridge')
+
+worker_dbs = WorkerDBs()
+
+
+class Report:
+
+    def __init__(self):
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def add(self, check: str, height, message: str, *args):
+        with self.lock:
+            self.counts[check] += 1
+            if self.counts[check] <= options.max_report:
+                logger.warning('height %s: %s: ' + message, height, check, *args)
+
+
+def check_chunk(low: int, high: int, history_from: int, is_filtered: bool, report: Report):
+    """
+    Runs every check over one range of heights on the connection of the
+    worker thread. Returns the boundary links to verify and the fees paid.
+    """
+    database = worker_dbs.get()
+    boundary_links, unknown_links, fees = [], 0, 0
+
+    for row in database.check_blocks_chain(low, high):
+        if row['expected_prev_hash'] is None:
+            report.add('chain', row['block_height'], 'no block stored below')
+        elif row['prev_hash'] is None:
+            unknown_links += 1
+        elif row['epoch'] != row['prev_epoch']:
+            # The first block of an epoch points to its boundary block, which
+            # is not stored.
+            boundary_links.append(row)
+        else:
+            report.add('chain', row['block_height'], 'prev hash %s, block below is %s', row['prev_hash'], row['expected_prev_hash'])
+
+    if is_filtered:
+        return boundary_links, unknown_links, None
+
+    for row in database.check_txs_amounts(low, high):
+        fees += (row['inputs'] or 0) - (row['outputs'] or 0)
+        if row['block_num'] < history_from:
+            continue
+        if row['outputs'] != row['created']:
+            report.add('outputs', row['block_num'], 'txs output %s, utxos created %s', row['outputs'], row['created'])
+        if row['inputs'] != row['spent']:
+            report.add('inputs', row['block_num'], 'txs input %s, utxos spent %s', row['inputs'], row['spent'])
+
+    for row in database.check_txs_inputs(max(low, history_from), high):
+        report.add('inputs', row['block_num'], 'tx %s spends %s, which is not in utxos_backup', row['hash'], row['utxo_id'])
+
+    return boundary_links, unknown_links, fees
+
+
+async def check_boundary_links(links: list, report: Report):
+    http_bridge = HttpBridge()
+    for link in links:
+        ebb = await http_bridge.get_block(link['prev_hash'])
+        if not ebb.is_EBB or ebb.prev_hash != link['expected_prev_hash']:
+            report.add(
+                'chain', link['block_height'], 'boundary block %s points to %s, block below is %s',
+                link['prev_hash'], ebb.prev_hash, link['expected_prev_hash']
+            )
+
+
+async def main():
+    start = time()
+    database = DB()
+    best_block_num = await database.get_best_block_num()
+    to_height = options.to_height if options.to_height is not None else best_block_num['height']
+    is_full_range = options.from_height == 0 and to_height >= best_block_num['height']
+    # txs are only complete without an address filter, utxo history only
+    # above the pruned heights.
+    is_filtered = WatchedAddresses.is_enabled()
+    retention = config.get('utxoHistoryRetention')
+    history_from = best_block_num['height'] - retention if retention is not None else 0
+    if is_filtered:
+        logger.info('watched addresses are enabled, only the chain of blocks is checked')
+
+    report = Report()
+    chunks = [
+        (low, min(low + options.chunk_blocks - 1, to_height))
+        for low in range(options.from_height, to_height + 1, options.chunk_blocks)
+    ]
+    logger.info('check heights %d-%d in %d chunks', options.from_height, to_height, len(chunks))
+    try:
+        with ThreadPoolExecutor(max_workers=options.workers) as executor:
+            results = list(executor.map(lambda chunk: check_chunk(*chunk, history_from, is_filtered, report), chunks))
+    finally:
+        worker_dbs.close()
+
+    boundary_links = [link for links, _, _ in results for link in links]
+    unknown_links = sum(unknown for _, unknown, _ in results)
+    if unknown_links:
+        logger.info('%d blocks were stored without prev hash, their links are not checked', unknown_links)
+    if options.bridge:
+        await check_boundary_links(boundary_links, report)
+    else:
+        logger.info('%d epoch boundary links not checked, run with --bridge to verify them', len(boundary_links))
+
+    if is_full_range and not is_filtered and retention is None:
+        # Byron fees are not paid out, the unspent outputs are the genesis
+        # outputs minus every fee paid so far.
+        fees = sum(fee for _, _, fee in results)
+        supply = database.get_supply()
+        if supply['unspent'] != supply['genesis'] - fees:
+            report.add('supply', best_block_num['height'], 'unspent %s, genesis %s minus fees %s', supply['unspent'], supply['genesis'], fees)
+    else:
+        logger.info('total supply is only checked over the full range of a complete, unpruned database')
+    database.close()
+
+    for check, count in sorted(report.counts.items()):
+        logger.warning('%s: %d discrepancies', check, count)
+    logger.info('checked %d blocks in %d seconds, %d discrepancies', to_height - options.from_height + 1, time() - start, sum(report.counts.values()))
+    return sum(report.counts.values())
+
+
+if __name__ == '__main__':
+    options.parse_command_line()
+    discrepancies = IOLoop.current().run_sync(main)
+    sys.exit(1 if discrepancies else 0)
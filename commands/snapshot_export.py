@@ -0,0 +1,88 @@
+import os
+from time import time
+from db import DB, WorkerDBs
+from config import config
+from lib import snapshot
+from lib.logger import get_logger
+from concurrent.futures import ThreadPoolExecutor
+from constants.db import SNAPSHOT_VERSION, SNAPSHOT_CHUNK_BLOCKS, SNAPSHOT_WORKERS
+from tornado.ioloop import IOLoop
+from tornado.options import define, options
+
+logger = get_logger('snapshot-export')
+
+define('dir', type=str, default=None, help='directory the snapshot is written to')
+define('workers', type=int, default=SNAPSHOT_WORKERS, help='parallel COPY connections')
+define('chunk_blocks', type=int, default=SNAPSHOT_CHUNK_BLOCKS, help='block heights per chunk file')
+
+worker_dbs = WorkerDBs()
+
+
+def export_chunk(snapshot_id: str, height: int, table: str, index: int, low: int, high: int):
+    # Every worker keeps one connection, each chunk is read in its own
+    # transaction on the exported snapshot.
+    database = worker_dbs.get()
+
+    columns, query = snapshot.SNAPSHOT_TABLES[table]
+    name = snapshot.chunk_file_name(table, index)
+    rows = 0
+
+    def copy(f):
+        nonlocal rows
+        rows = database.copy_to(query, {'low': low, 'high': high, 'height': height}, f)
+
+    database.begin_snapshot(snapshot_id)
+    try:
+        size, sha256 = snapshot.write_chunk(os.path.join(options.dir, name), copy)
+    finally:
+        database.end_snapshot()
+
+    logger.info('exported %s: %d rows of blocks %d-%d', name, rows, low, high)
+    return {'file': name, 'table': table, 'columns': columns, 'rows': rows, 'size': size, 'sha256': sha256}
+
+
+async def main():
+    if not options.dir:
+        raise Exception('--dir is required')
+
+    os.makedirs(options.dir, exist_ok=True)
+    database = DB()
+    start = time()
+    # The snapshot stays open until every chunk is written, all workers read
+    # the same state while the importer keeps running.
+    snapshot_id = database.begin_snapshot()
+    try:
+        cut = database.get_last_epoch_boundary()
+        if not cut:
+            raise Exception('no complete epoch is imported yet')
+
+        height = cut['block_height']
+        logger.info('export snapshot at the end of epoch %d, height: %d', cut['epoch'], height)
+        tasks = [
+            (table, index, low, high)
+            for table in snapshot.SNAPSHOT_TABLES
+            for index, (low, high) in enumerate(snapshot.chunk_ranges(height, options.chunk_blocks))
+        ]
+        with ThreadPoolExecutor(max_workers=options.workers) as executor:
+            chunks = list(executor.map(lambda task: export_chunk(snapshot_id, height, *task), tasks))
+    finally:
+        worker_dbs.close()
+        database.end_snapshot()
+        database.close()
+
+    snapshot.write_manifest(options.dir, {
+        'version': SNAPSHOT_VERSION,
+        'genesis': config['network']['genesis'],
+        'createdAt': time(),
+        'tip': {'hash': cut['block_hash'], 'height': height, 'epoch': cut['epoch'], 'slot': cut['slot']},
+        'chunks': chunks,
+    })
+    logger.info(
+        'snapshot of %d chunks, %d MB written to %s in %d seconds',
+        len(chunks), sum(chunk['size'] for chunk in chunks) / 1024 / 1024, options.dir, time() - start
+    )
+
+
+if __name__ == '__main__':
+    options.parse_command_line()
+    IOLoop.current().run_sync(main)
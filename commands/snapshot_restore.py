@@ -0,0 +1,81 @@
+import os
+import gzip
+from time import time
+from db import DB, WorkerDBs
+from config import config
+from lib import snapshot
+from lib.logger import get_logger
+from concurrent.futures import ThreadPoolExecutor
+from constants.db import SNAPSHOT_VERSION, SNAPSHOT_WORKERS
+from tornado.ioloop import IOLoop
+from tornado.options import define, options
+
+logger = get_logger('snapshot-restore')
+
+define('dir', type=str, default=None, help='directory of the snapshot')
+define('workers', type=int, default=SNAPSHOT_WORKERS, help='parallel COPY connections')
+define('force', type=bool, default=False, help='drop existing tables first')
+
+worker_dbs = WorkerDBs()
+
+
+def verify_chunk(chunk: dict):
+    sha256 = snapshot.file_sha256(os.path.join(options.dir, chunk['file']))
+    if sha256 != chunk['sha256']:
+        raise Exception(f'checksum mismatch of {chunk["file"]}: {sha256} != {chunk["sha256"]}')
+
+
+def load_chunk(chunk: dict):
+    with gzip.open(os.path.join(options.dir, chunk['file']), 'rb') as f:
+        rows = worker_dbs.get().copy_from(chunk['table'], chunk['columns'], f)
+
+    logger.info('loaded %s: %d rows', chunk['file'], rows)
+    return rows
+
+
+async def main():
+    if not options.dir:
+        raise Exception('--dir is required')
+
+    start = time()
+    manifest = snapshot.read_manifest(options.dir)
+    if manifest['version'] != SNAPSHOT_VERSION:
+        raise Exception(f'unsupported snapshot version: {manifest["version"]}')
+    if manifest['genesis'] != config['network']['genesis']:
+        raise Exception(f'snapshot is of another network, genesis: {manifest["genesis"]}')
+
+    chunks = manifest['chunks']
+    with ThreadPoolExecutor(max_workers=options.workers) as executor:
+        list(executor.map(verify_chunk, chunks))
+    logger.info('checksums of %d chunks verified', len(chunks))
+
+    database = DB()
+    if not options.force and await database.is_schema_created():
+        raise Exception('the database is not empty, restore with --force to drop its tables')
+
+    await database.create_schema(drop=options.force)
+    await database.ensure_tx_partitions(manifest['tip']['height'])
+    tables = list(set(chunk['table'] for chunk in chunks))
+    # Secondary indexes are built once after the load instead of row by row.
+    indexes = database.drop_secondary_indexes(tables)
+
+    try:
+        with ThreadPoolExecutor(max_workers=options.workers) as executor:
+            rows = sum(executor.map(load_chunk, chunks))
+            logger.info('%d rows loaded, rebuild %d indexes', rows, len(indexes))
+            list(executor.map(lambda definition: worker_dbs.get().create_index(definition), indexes))
+    finally:
+        worker_dbs.close()
+
+    tip = manifest['tip']
+    await database.update_best_block_num(tip['height'])
+    await database.reset_address_id_sequence()
+    await database.rebuild_address_balances()
+    database.analyze(tables + ['address_balances', 'tx_hashes'])
+    database.close()
+    logger.info('snapshot restored up to height %d in %d seconds, the importer continues from there', tip['height'], time() - start)
+
+
+if __name__ == '__main__':
+    options.parse_command_line()
+    IOLoop.current().run_sync(main)
@@ -0,0 +1,35 @@
+from db import DB
+from lib.logger import get_logger
+from tornado.ioloop import IOLoop
+from tornado.options import define, options
+
+logger = get_logger('verify-balances')
+
+define('rebuild', type=bool, default=False, help='rebuild address_balances from utxos after the check')
+define('max_report', type=int, default=100, help='max drifted addresses to print')
+
+
+async def main():
+    database = DB()
+    drifted = 0
+    async for rows in database.iter_address_balances_drift():
+        for row in rows:
+            drifted += 1
+            if drifted <= options.max_report:
+                logger.warning(
+                    'drift on %s: balance %s (stored %s), utxo count %s (stored %s)',
+                    row['address'], row['actual_balance'], row['stored_balance'],
+                    row['actual_utxo_count'], row['stored_utxo_count']
+                )
+
+    logger.info('%d addresses drifted from utxos', drifted)
+    if options.rebuild:
+        await database.rebuild_address_balances()
+        logger.info('address balances rebuilt.')
+
+    database.close()
+
+
+if __name__ == '__main__':
+    options.parse_command_line()
+    IOLoop.current().run_sync(main)
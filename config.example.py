@@ -10,5 +10,80 @@ config = {
         "password": "",
         "port": 5432,
         "timeout": 5
+    },
+    # CBOR backend: "cbor", the pure python package, or "cbor2" with its C implementation.
+    "cbor": {
+        "backend": "cbor"
+    },
+    "epochPipeline": {
+        "queueSize": 2,
+        "parseWorkers": 1,
+        "memoryBudget": 512 * 1024 * 1024
+    },
+    "watchedAddresses": {
+        "enabled": False,
+        "file": None,
+        "bloom": False,
+        "errorRate": 0.001,
+        # Bloom filter capacity as a multiple of the addresses at load, it is
+        # rebuilt when more are added.
+        "bloomHeadroom": 2
+    },
+    # Blocks of spent utxo history kept for point-in-time queries, None keeps all.
+    "utxoHistoryRetention": None,
+    # Admission control in front of /api/txs/signed and /api/txs/signed/batch.
+    # Quotas are per X-Api-Key of apiKeys, or per client address without one.
+    # Other keys are refused. perKeyTxLimit also caps the size of a batch.
+    "admission": {
+        "maxInFlight": 64,
+        "maxQueue": 256,
+        "maxWait": 2,
+        "perKeyLimit": 16,
+        "perKeyTxLimit": 1000,
+        "apiKeys": []
+    },
+    # Origins of web pages allowed to open /api/subscribe besides the same origin.
+    "subscribe": {
+        "allowedOrigins": []
+    },
+    # /api/admin/* endpoints on a listener of their own, bound to address. No
+    # port disables them.
+    "admin": {
+        "port": None,
+        "address": "127.0.0.1"
+    },
+    # Written on shutdown and at checkpoints for a warm restart, no file disables it.
+    "stateManifest": {
+        "file": "state-manifest.json",
+        "checkpointSeconds": 300,
+        "mempool": True
+    },
+    # Final epochs written as parquet files for analytics, needs pyarrow. No dir disables it.
+    "analyticsExport": {
+        "dir": None
+    },
+    # Per block and per epoch aggregates in block_stats and epoch_stats, numpy speeds them up.
+    "chainStats": {
+        "enabled": True
+    },
+    # Batch sizes and intervals of the importer tuned at runtime within the
+    # bounds, see /api/admin/tuning. Missing bounds use the built-in ones.
+    "autoTune": {
+        "enabled": True,
+        "bounds": {
+            "blocksCacheSize": (100, 10000),
+            "maxBlocksPerLoop": (1000, 50000),
+            "epochDownloadThreshold": (0, 21600),
+            "checkTipSeconds": (5, 30)
+        }
+    },
+    "logging": {
+        "level": "INFO",
+        # Per logger overrides, e.g. "DB": "WARNING".
+        "levels": {},
+        # Recent records kept in memory and dumped on errors, 0 disables it. They
+        # are kept from ringBufferLevel on, e.g. "DEBUG", or from the level above.
+        "ringBuffer": 0,
+        "ringBufferLevel": None
     }
 }
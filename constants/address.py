@@ -0,0 +1 @@
+ADDRESS_CACHE_SIZE = 2 ** 16
@@ -0,0 +1,18 @@
+MAX_ADDRESSES_PER_REQUEST = 50
+MAX_HASHES_PER_REQUEST = 100
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
+STREAM_IDLE_TIMEOUT_SECONDS = 30
+STREAM_MAX_SECONDS = 300
+QUERY_POOL_MAX_IDLE = 16
+BALANCE_CACHE_SIZE = 100000
+BALANCE_CACHE_TTL = 30
+MAX_TXS_PER_BATCH = 1000
+BRIDGE_POST_CONCURRENCY = 16
+SUBMIT_MAX_IN_FLIGHT = 64
+SUBMIT_MAX_QUEUE = 256
+SUBMIT_MAX_WAIT_SECONDS = 2
+SUBMIT_PER_KEY_LIMIT = 16
+SUBMIT_PER_KEY_TX_LIMIT = 1000
+WITNESS_VERIFY_WORKERS = 4
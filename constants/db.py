@@ -0,0 +1,15 @@
+SCHEMA_TABLES = [
+    'bestblock', 'blocks', 'tx_records', 'tx_hashes', 'tx_inputs', 'tx_outputs', 'addresses', 'utxos',
+    'utxos_backup', 'address_balances', 'watched_addresses', 'block_stats', 'epoch_stats',
+    'schema_migrations',
+]
+# Tables of databases not migrated yet, now views dropped along with the
+# tables above.
+LEGACY_TABLES = ['txs', 'tx_addresses']
+# Block heights per tx_records partition, sql/migrations/0003 uses the same.
+TX_PARTITION_BLOCKS = 1000000
+SNAPSHOT_VERSION = 3
+SNAPSHOT_CHUNK_BLOCKS = 50000
+SNAPSHOT_WORKERS = 4
+CHECK_CHUNK_BLOCKS = 20000
+CHECK_WORKERS = 4
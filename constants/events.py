@@ -0,0 +1,6 @@
+EVENT_BLOCK_APPLIED = 'block_applied'
+EVENT_ROLLBACK = 'rollback'
+EVENT_TX_STATE = 'tx_state'
+EVENT_OVERFLOW = 'overflow'
+SUBSCRIBER_BUFFER_SIZE = 1000
+MAX_SUBSCRIPTION_FILTERS = 1000
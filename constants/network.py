@@ -2,17 +2,20 @@ TESTNET2 = {
     "name": "testnet2",
     "genesis": "96fceff972c2c06bd3bb5243c39215333be6d56aaf4823073dca31afe5038471",
     "startTime": 1563999616,
-    "networkMagic": 1097911063
+    "networkMagic": 1097911063,
+    "protocolMagic": 1097911063
 }
 STAGING = {
     "name": "staging",
     "genesis": "c6a004d3d178f600cd8caa10abbebe1549bef878f0665aea2903472d5abf7323",
     "startTime": 1506450213,
-    "networkMagic": None
+    "networkMagic": None,
+    "protocolMagic": 633343913
 }
 MAINNET = {
     "name": "mainnet",
     "genesis": "5f20df933584822601f9e3f8c024eb5eb252fe8cefb24d1317dc3d432e940ebb",
     "startTime": 1506203091,
-    "networkMagic": None
+    "networkMagic": None,
+    "protocolMagic": 764824073
 }
@@ -6,3 +6,26 @@ CHECK_TIP_SECONDS = 15
 ROLLBACK_BLOCKS_COUNT = 25
 STATUS_ROLLBACK_REQUIRED = -1
 STATUS_BLOCK_PROCESSED = 1
+EPOCH_PIPELINE_QUEUE_SIZE = 2
+EPOCH_PIPELINE_PARSE_WORKERS = 1
+EPOCH_PIPELINE_MEMORY_BUDGET = 512 * 1024 * 1024
+PARSED_EPOCH_MEMORY_FACTOR = 8
+# Raw size assumed for the first epoch, later ones assume the size of the previous.
+EPOCH_SIZE_ESTIMATE = 8 * 1024 * 1024
+PRUNE_UTXO_HISTORY_SECONDS = 3600
+STATE_CHECKPOINT_SECONDS = 300
+STATE_MANIFEST_VERSION = 1
+CHAIN_STATS_BATCH_BLOCKS = 2000
+# Auto-tuning: bounds of the tuned values, the flush latency and sync loop
+# length they are sized to, and how fast the measured rates follow changes.
+AUTO_TUNE_BOUNDS = {
+    'blocksCacheSize': (100, 10000),
+    'maxBlocksPerLoop': (1000, 50000),
+    'epochDownloadThreshold': (0, 21600),
+    'checkTipSeconds': (5, 30),
+}
+AUTO_TUNE_FLUSH_SECONDS = 1
+AUTO_TUNE_LOOP_SECONDS = 600
+AUTO_TUNE_EWMA_ALPHA = 0.3
+AUTO_TUNE_MIN_CHANGE = 0.1
+AUTO_TUNE_HISTORY_SIZE = 100
@@ -2,3 +2,4 @@ TX_SUCCESS_STATUS = 'Successful'
 TX_PENDING_STATUS = 'Pending'
 TX_FAILED_STATUS = 'Failed'
 TX_STATUS = [TX_SUCCESS_STATUS, TX_PENDING_STATUS, TX_FAILED_STATUS]
+PENDING_TX_TTL = 2 * 60 * 60
@@ -1,12 +1,20 @@
-from lib.logger import get_logger
+from lib.logger import get_logger, get_rate_limited_logger
 from lib import utils
-import json
+import os
+import threading
+from uuid import uuid4
+from contextlib import contextmanager
 from datetime import datetime
 import psycopg2
 from config import config
 from operator import itemgetter
 from psycopg2.extras import RealDictCursor, execute_values
 from constants.transaction import TX_SUCCESS_STATUS, TX_PENDING_STATUS
+from constants.api import STREAM_BATCH_SIZE, STREAM_IDLE_TIMEOUT_SECONDS
+from constants.db import SCHEMA_TABLES, LEGACY_TABLES, TX_PARTITION_BLOCKS
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql', 'migrations')
+ADOPT_LEGACY_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql', 'adopt_legacy_schema.sql')
 
 
 class DB:
@@ -15,6 +23,8 @@ class DB:
         self._cursor = None
         self._connect = None
         self.logger = get_logger('DB')
+        self.sampled_logger = get_rate_limited_logger('DB')
+        self.tx_partitions_until = 0
 
     @property
     def conn(self):
@@ -38,23 +48,137 @@ class DB:
 
         return self._connect
 
-    # def auto_commit(self, is_auto=True):
-    #     self.connect.autocommit = is_auto
+    @contextmanager
+    def transaction(self):
+        # Statements inside the block are committed as one unit of work. Nested
+        # blocks join the outer transaction.
+        if not self.connect.autocommit:
+            yield
+            return
+
+        self.connect.autocommit = False
+        try:
+            yield
+            self.connect.commit()
+        except BaseException:
+            # Also when a generator holding the transaction is closed early.
+            # A connection the server ended has nothing to roll back.
+            if not self.connect.closed:
+                self.connect.rollback()
+            raise
+        finally:
+            if not self.connect.closed:
+                self.connect.autocommit = True
+
+    def is_reusable(self):
+        return not self._connect or (
+            not self._connect.closed and self._connect.autocommit
+            and self._connect.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        )
 
     def close(self):
         if self._connect:
             self._connect.close()
 
+    async def migrate(self):
+        """
+        Applies the numbered scripts in sql/migrations that are not recorded in
+        schema_migrations yet, each one in its own transaction.
+        """
+        migrations = sorted(
+            (int(name.split('_')[0]), name) for name in os.listdir(MIGRATIONS_DIR) if name.endswith('.sql')
+        )
+        with self.conn as cursor:
+            cursor.execute("SELECT to_regclass('schema_migrations') AS migrations, to_regclass('blocks') AS blocks")
+            row = cursor.fetchone()
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS schema_migrations ('
+                '  version integer PRIMARY KEY, name text, applied_at timestamp with time zone DEFAULT now())'
+            )
+
+        if not row['migrations'] and row['blocks']:
+            # Created by the scripts from before migrations existed, brought to
+            # the first migration and recorded at it.
+            self.logger.info('adopt existing schema as migration: %s', migrations[0][1])
+            with open(ADOPT_LEGACY_SCHEMA) as f:
+                sql = f.read()
+            with self.transaction():
+                with self.conn as cursor:
+                    cursor.execute(sql)
+                    cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)', migrations[0])
+
+        with self.conn as cursor:
+            cursor.execute('SELECT version FROM schema_migrations')
+            applied = set(row['version'] for row in cursor.fetchall())
+
+        for version, name in migrations:
+            if version in applied:
+                continue
+
+            self.logger.info('apply migration: %s', name)
+            with open(os.path.join(MIGRATIONS_DIR, name)) as f:
+                sql = f.read()
+            with self.transaction():
+                with self.conn as cursor:
+                    cursor.execute(sql)
+                    cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (%s, %s)', (version, name))
+
+        return True
+
+    async def create_schema(self, drop=False):
+        if drop:
+            self.logger.info('drop all tables')
+            with self.conn as cursor:
+                cursor.execute('DROP TABLE IF EXISTS %s CASCADE' % ', '.join(SCHEMA_TABLES))
+                cursor.execute('DROP TABLE IF EXISTS %s CASCADE' % ', '.join(LEGACY_TABLES))
+
+        return await self.migrate()
+
+    async def is_schema_created(self):
+        with self.conn as cursor:
+            cursor.execute("SELECT to_regclass('blocks') IS NOT NULL AS created")
+            return cursor.fetchone()['created']
+
+    async def has_legacy_tx_encoding(self):
+        """
+        Whether txs were imported with the old tx body encoding: inputs and
+        outputs as definite arrays of byte strings instead of 9f ... ff, so
+        their ids do not match the chain. The oldest tx tells, a database
+        imported before the fix starts with such txs.
+        """
+        sql = 'SELECT tx_body FROM tx_records WHERE tx_body IS NOT NULL ORDER BY block_num, tx_ordinal LIMIT 1'
+        with self.conn as cursor:
+            cursor.execute(sql)
+            row = cursor.fetchone()
+
+        return bool(row) and not row['tx_body'].startswith('839f')
+
+    async def ensure_tx_partitions(self, block_height: int):
+        # txs of blocks above the last range would land in the default
+        # partition, which is meant for pending txs only.
+        if block_height < self.tx_partitions_until:
+            return False
+
+        max_block_num = block_height + TX_PARTITION_BLOCKS
+        with self.conn as cursor:
+            cursor.execute('SELECT create_tx_partitions(%s, %s)', (max_block_num, TX_PARTITION_BLOCKS))
+        self.tx_partitions_until = (max_block_num // TX_PARTITION_BLOCKS) * TX_PARTITION_BLOCKS
+        return True
+
     async def save_utxos(self, utxos: list):
-        sql = 'INSERT INTO utxos '\
-              '(utxo_id, tx_hash, tx_index, receiver, amount, block_num) values %s '\
-              'ON CONFLICT (utxo_id) DO UPDATE '\
-              'SET tx_hash=EXCLUDED.tx_hash, '\
-              '    tx_index=EXCLUDED.tx_index, '\
-              '    receiver=EXCLUDED.receiver, '\
-              '    amount=EXCLUDED.amount, '\
-              '    block_num=EXCLUDED.block_num'
-        self.logger.info('store %d utxos in db', len(utxos))
+        # utxo ids are derived from the tx hash, so an existing row is the same
+        # output stored before and must not be counted in the balance again.
+        sql = 'WITH new_utxos AS ('\
+              '  INSERT INTO utxos '\
+              '  (utxo_id, tx_hash, tx_index, receiver, amount, block_num) values %s '\
+              '  ON CONFLICT (utxo_id) DO NOTHING RETURNING receiver, amount'\
+              ') '\
+              'INSERT INTO address_balances (address, balance, utxo_count) '\
+              '  SELECT receiver, SUM(amount), COUNT(*) FROM new_utxos GROUP BY receiver '\
+              'ON CONFLICT (address) DO UPDATE '\
+              'SET balance=address_balances.balance + EXCLUDED.balance, '\
+              '    utxo_count=address_balances.utxo_count + EXCLUDED.utxo_count'
+        self.logger.debug('store %d utxos in db', len(utxos))
         with self.conn as cursor:
             execute_values(cursor, sql, utxos, "(%(utxo_id)s, %(tx_hash)s, %(tx_index)s, %(receiver)s, %(amount)s, %(block_num)s)")
 
@@ -77,7 +201,7 @@ class DB:
         }
 
     async def update_best_block_num(self, best_block_num: int):
-        self.logger.info('update best block num in db to: %d', best_block_num)
+        self.sampled_logger.info('update best block num in db to: %d', best_block_num)
         with self.conn as cursor:
             cursor.execute('UPDATE bestblock SET best_block_num=%s', (best_block_num, ))
 
@@ -85,18 +209,46 @@ class DB:
 
     async def rollback_txs_from_height(self, block_height: int):
         self.logger.info('rollback  transactions from block height: %s', block_height)
-        sql = 'UPDATE txs '\
+        sql = 'UPDATE tx_records '\
               'SET tx_state=%s, block_num=%s, time=%s, last_update=%s '\
-              'WHERE block_num > %s'
+              'WHERE block_num > %s '\
+              'RETURNING hash'
         with self.conn as cursor:
-            data = TX_PENDING_STATUS, None, None, None, datetime.now(), block_height
+            data = TX_PENDING_STATUS, None, None, datetime.now(), block_height
             cursor.execute(sql, data)
-
-        return True
+            rows = cursor.fetchall()
+            # Inputs and outputs in the shape of parsed txs, so they can go
+            # back into the mempool.
+            txs = {row['hash']: {'id': row['hash'], 'inputs': [], 'outputs': [], 'addresses': set()} for row in rows}
+            sql = 'SELECT i.tx_hash, i.src_tx, i.src_idx, a.address '\
+                  'FROM tx_inputs i LEFT JOIN addresses a ON a.id = i.address_id '\
+                  'WHERE i.tx_hash = ANY(%s) ORDER BY i.tx_hash, i.idx'
+            cursor.execute(sql, (list(txs), ))
+            for row in cursor.fetchall():
+                tx = txs[row['tx_hash']]
+                tx['inputs'].append({'txId': row['src_tx'], 'idx': row['src_idx']})
+                if row['address']:
+                    tx['addresses'].add(row['address'])
+            sql = 'SELECT o.tx_hash, a.address, o.amount '\
+                  'FROM tx_outputs o JOIN addresses a ON a.id = o.address_id '\
+                  'WHERE o.tx_hash = ANY(%s) ORDER BY o.tx_hash, o.idx'
+            cursor.execute(sql, (list(txs), ))
+            for row in cursor.fetchall():
+                tx = txs[row['tx_hash']]
+                tx['outputs'].append({'address': row['address'], 'value': row['amount']})
+                tx['addresses'].add(row['address'])
+
+        return [dict(tx, addresses=list(tx['addresses'])) for tx in txs.values()]
 
     async def delete_invalid_utxos_and_backup(self, block_height: int):
         self.logger.info('delete invalid utxos from block height: %s', block_height)
-        sql = 'DELETE FROM utxos WHERE block_num > %s'
+        sql = 'WITH deleted_utxos AS (DELETE FROM utxos WHERE block_num > %s RETURNING receiver, amount) '\
+              'UPDATE address_balances '\
+              'SET balance=address_balances.balance - deleted.balance, '\
+              '    utxo_count=address_balances.utxo_count - deleted.utxo_count '\
+              'FROM (SELECT receiver, SUM(amount) AS balance, COUNT(*) AS utxo_count '\
+              '      FROM deleted_utxos GROUP BY receiver) deleted '\
+              'WHERE address_balances.address = deleted.receiver'
         with self.conn as cursor:
             cursor.execute(sql, (block_height, ))
 
@@ -110,13 +262,22 @@ class DB:
         self.logger.info('rollback utxo_backup to block height: %s', block_height)
         await self.delete_invalid_utxos_and_backup(block_height)
 
+        # Outputs created after the height are gone at this point, so every
+        # backup spent after it becomes unspent again.
         sql = 'WITH moved_utxos AS ('\
               '  DELETE FROM utxos_backup '\
-              '  WHERE block_num < %s AND delete_block_num > %s RETURNING *'\
+              '  WHERE deleted_block_num > %s RETURNING *'\
+              '), restored_utxos AS ('\
+              '  INSERT INTO utxos (utxo_id, tx_hash, tx_index, receiver, amount, block_num) '\
+              '  SELECT utxo_id, tx_hash, tx_index, receiver, amount, block_num FROM moved_utxos'\
               ') '\
-              'INSERT INTO utxos SELECT * FROM moved_utxos'
+              'INSERT INTO address_balances (address, balance, utxo_count) '\
+              '  SELECT receiver, SUM(amount), COUNT(*) FROM moved_utxos GROUP BY receiver '\
+              'ON CONFLICT (address) DO UPDATE '\
+              'SET balance=address_balances.balance + EXCLUDED.balance, '\
+              '    utxo_count=address_balances.utxo_count + EXCLUDED.utxo_count'
         with self.conn as cursor:
-            cursor.execute(sql, (block_height, block_height))
+            cursor.execute(sql, (block_height, ))
 
         return True
 
@@ -132,11 +293,11 @@ class DB:
         if not block:
             return False
 
-        sql = 'INSERT INTO blocks (block_hash, block_height, epoch, slot) VALUES '\
-              '(%(block_hash)s, %(block_height)s, %(epoch)s, %(slot)s)'
+        sql = 'INSERT INTO blocks (block_hash, prev_hash, block_height, epoch, slot) VALUES '\
+              '(%(block_hash)s, %(prev_hash)s, %(block_height)s, %(epoch)s, %(slot)s)'
         try:
             with self.conn as cursor:
-                cursor.execute(sql, vars(block))
+                cursor.execute(sql, block.serialize())
         except Exception as e:
             self.logger.exception('error on save block: %s', block)
             return False
@@ -147,14 +308,14 @@ class DB:
         if not blocks:
             return False
 
-        sql = 'INSERT INTO blocks (block_hash, block_height, epoch, slot) VALUES %s'
+        sql = 'INSERT INTO blocks (block_hash, prev_hash, block_height, epoch, slot) VALUES %s'
         try:
             with self.conn as cursor:
                 execute_values(
                     cursor, 
                     sql, 
                     blocks, 
-                    "(%(block_hash)s, %(block_height)s, %(epoch)s, %(slot)s)"
+                    "(%(block_hash)s, %(prev_hash)s, %(block_height)s, %(epoch)s, %(slot)s)"
                 )
         except Exception as e:
             self.logger.exception('error on save %s blocks', len(blocks))
@@ -162,36 +323,48 @@ class DB:
 
         return True
 
-    async def save_tx_addresses(self, tx_id: str, addresses: list):
-        db_fields = [{
-          'tx_hash': tx_id,
-          'address': utils.fix_long_address(address),
-        } for address in addresses]
-
-        query = 'INSERT INTO tx_addresses (tx_hash, address) VALUES %s '\
-                'ON CONFLICT (tx_hash, address) DO UPDATE '\
-                'SET tx_hash=EXCLUDED.tx_hash, address=EXCLUDED.address'
-        try:
-            with self.conn as cursor:
-                execute_values(cursor, query, db_fields, "(%(tx_hash)s, %(address)s)")
-        except Exception as e:
-            self.logger.exception('addresses for %s already stored', tx_id)
+    async def remove_and_backup_utxos(self, spent: dict, spent_outputs: list=None):
+        """
+        Moves the spent utxos, {utxo_id: deleted block num}, to utxos_backup
+        along with outputs created and spent in the same batch, which were
+        never stored in utxos. One statement for the whole batch.
+        """
+        spent_outputs = spent_outputs or []
+        if not spent and not spent_outputs:
             return False
 
-        return True
-
-    async def remove_and_backup_utxos(self, utxo_ids: list, deleted_block_num: int):
-        if not utxo_ids:
-            return False
-        
-        sql = 'WITH moved_utxos AS (DELETE FROM utxos WHERE utxo_id IN (%s) RETURNING *) '\
+        sql = 'WITH spent AS ('\
+              '  SELECT * FROM unnest(%(ids)s::text[], %(deleted_block_nums)s::integer[]) AS s(utxo_id, deleted_block_num)'\
+              '), moved_utxos AS ('\
+              '  DELETE FROM utxos u USING spent s WHERE u.utxo_id = s.utxo_id '\
+              '  RETURNING u.utxo_id, u.tx_hash, u.tx_index, u.receiver, u.amount, u.block_num, s.deleted_block_num'\
+              '), backup_utxos AS ('\
               '  INSERT INTO utxos_backup '\
               '  (utxo_id, tx_hash, tx_index, receiver, amount, block_num, deleted_block_num) '\
-              '  (SELECT utxo_id, tx_hash, tx_index, receiver, amount, block_num, %s AS deleted_block_num FROM moved_utxos)'
-        str_ids = ', '.join(utxo_ids)
+              '  SELECT * FROM moved_utxos '\
+              '  UNION ALL '\
+              '  SELECT * FROM unnest(%(output_ids)s::text[], %(tx_hashes)s::text[], %(tx_indexes)s::integer[], '\
+              '    %(receivers)s::text[], %(amounts)s::bigint[], %(block_nums)s::integer[], %(output_deleted_block_nums)s::integer[])'\
+              ') '\
+              'UPDATE address_balances '\
+              'SET balance=address_balances.balance - spent.balance, '\
+              '    utxo_count=address_balances.utxo_count - spent.utxo_count '\
+              'FROM (SELECT receiver, SUM(amount) AS balance, COUNT(*) AS utxo_count '\
+              '      FROM moved_utxos GROUP BY receiver) spent '\
+              'WHERE address_balances.address = spent.receiver'
         with self.conn as cursor:
-            cursor.execute(sql, (str_ids, deleted_block_num))
-            self.logger.info('backup and remove utxos: %s', str_ids)
+            cursor.execute(sql, {
+                'ids': list(spent.keys()),
+                'deleted_block_nums': list(spent.values()),
+                'output_ids': [utxo['utxo_id'] for utxo in spent_outputs],
+                'tx_hashes': [utxo['tx_hash'] for utxo in spent_outputs],
+                'tx_indexes': [utxo['tx_index'] for utxo in spent_outputs],
+                'receivers': [utxo['receiver'] for utxo in spent_outputs],
+                'amounts': [utxo['amount'] for utxo in spent_outputs],
+                'block_nums': [utxo['block_num'] for utxo in spent_outputs],
+                'output_deleted_block_nums': [utxo['deleted_block_num'] for utxo in spent_outputs],
+            })
+            self.logger.debug('backup and remove %d utxos, %d spent in the same batch', len(spent), len(spent_outputs))
 
         return True
 
@@ -199,9 +372,9 @@ class DB:
         if not utxo_ids:
             return []
 
-        sql = 'SELECT * FROM utxos WHERE utxo_id IN (\'{}\')'
+        sql = 'SELECT * FROM utxos WHERE utxo_id = ANY(%s)'
         with self.conn as cursor:
-            cursor.execute(sql.format('\', \''.join(utxo_ids)))
+            cursor.execute(sql, (list(utxo_ids), ))
             rows = cursor.fetchall()
 
         return [{
@@ -216,49 +389,49 @@ class DB:
         if not tx_hashes:
             return {}
 
-        sql = 'SELECT * FROM txs where hash in (\'{}\')'
+        sql = 'SELECT o.tx_hash, a.address, o.amount FROM tx_outputs o JOIN addresses a ON a.id = o.address_id '\
+              'WHERE o.tx_hash = ANY(%s) ORDER BY o.tx_hash, o.idx'
         with self.conn as cursor:
-            cursor.execute(sql.format('\', \''.join(tx_hashes)))
+            cursor.execute(sql, (tx_hashes, ))
             rows = cursor.fetchall()
 
         res = {}
         for row in rows:
-            res[row['hash']] = (row['address'], row['amount'])
+            res.setdefault(row['tx_hash'], []).append((row['address'], row['amount']))
 
         return res
 
     async def is_genesis_loaded(self):
-        # Check whether utxo and blocks tables are empty.
-        query = 'SELECT (SELECT count(*) FROM utxos) + (SELECT count(*) FROM blocks) as cnt'
+        # Check whether utxo and blocks tables are empty, without counting rows.
+        query = 'SELECT EXISTS (SELECT 1 FROM utxos) OR EXISTS (SELECT 1 FROM blocks) AS loaded'
         with self.conn as cursor:
             cursor.execute(query)
-            count = cursor.fetchone()
+            row = cursor.fetchone()
 
-        return count['cnt'] > 0
+        return row['loaded']
 
-    async def convert_txs(self, tx: dict, tx_utxos: dict):
+    async def get_blocks_from_height(self, block_height: int):
+        sql = 'SELECT block_hash, block_height, epoch, slot FROM blocks WHERE block_height > %s ORDER BY block_height'
+        with self.conn as cursor:
+            cursor.execute(sql, (block_height, ))
+            return cursor.fetchall()
+
+    def convert_txs(self, tx: dict, utxo_map: dict):
+        """
+        Returns the tx_records row of the tx, its inputs as (idx, src_tx,
+        src_idx, address, amount) and its outputs as (idx, address, amount).
+        Inputs missing in utxo_map have no address and amount.
+        """
         inputs, outputs, tx_id, block_num, block_hash = tx['inputs'], tx['outputs'], tx['id'], tx['blockNum'], tx['block_hash']
-        self.logger.info('store tx: %s', tx_utxos)
-        if not tx_utxos:
-            input_utxo_ids = []
-            for inp in inputs:
-                input_utxo_ids.append(utils.get_utxo_id(inp))
-
-            input_utxos = await self.get_utxos_by_ids(input_utxo_ids)
-        else:
-            input_utxos = tx_utxos
-
-        input_addresses = [inp['address'] for inp in input_utxos]
-        output_addresses = [utils.fix_long_address(out['address']) for out in outputs]
-        input_ammounts = [int(item['amount']) for item in input_utxos]
-        output_ammounts = [int(item['value']) for item in outputs]
+        input_rows = []
+        for idx, inp in enumerate(inputs):
+            utxo = utxo_map.get(utils.get_utxo_id(inp))
+            input_rows.append((
+                idx, inp['txId'], inp['idx'], utxo['address'] if utxo else None, int(utxo['amount']) if utxo else None
+            ))
+        output_rows = [(idx, utils.fix_long_address(out['address']), int(out['value'])) for idx, out in enumerate(outputs)]
         return {
             'hash': tx_id,
-            'inputs': json.dumps(input_utxos),
-            'inputs_address': input_addresses,
-            'inputs_amount': input_ammounts,
-            'outputs_address': output_addresses,
-            'outputs_amount': output_ammounts,
             'block_num': block_num,
             'block_hash': block_hash,
             'tx_state': tx['status'] if tx.get('status') else TX_SUCCESS_STATUS,
@@ -266,27 +439,486 @@ class DB:
             'tx_ordinal': tx['txOrdinal'],
             'time': tx['txTime'],
             'last_update': datetime.now()
-        }
+        }, input_rows, output_rows
 
-    async def save_txs(self, tx: dict, tx_utxos: dict):
-        tx_db_fields = await self.convert_txs(tx, tx_utxos)
-
-        sql = 'INSERT INTO txs ({}) VALUES ({}) '\
-              'ON CONFLICT (hash) DO UPDATE '\
-              'SET block_num=EXCLUDED.block_num, '\
-              '    block_hash=EXCLUDED.block_hash, '\
-              '    time=EXCLUDED.time, '\
-              '    tx_state=EXCLUDED.tx_state, '\
-              '    last_update=EXCLUDED.last_update, '\
-              '    tx_ordinal=EXCLUDED.tx_ordinal'
-        sql = sql.format(
-            ', '.join(tx_db_fields.keys()), 
-            ', '.join(['%s'] * len(tx_db_fields))
+    async def save_txs(self, tx: dict, tx_utxos: dict=None):
+        return await self.save_many_txs([tx], {tx['id']: tx_utxos} if tx_utxos else None)
+
+    async def save_many_txs(self, txs: list, txs_utxos: dict=None):
+        if not txs:
+            return False
+
+        # Inputs not resolved by the caller, e.g. of pending txs, are looked
+        # up with a single query for all txs.
+        utxo_map = {utxo['id']: utxo for utxos in (txs_utxos or {}).values() for utxo in utxos}
+        missing = [utils.get_utxo_id(inp) for tx in txs for inp in tx['inputs'] if utils.get_utxo_id(inp) not in utxo_map]
+        if missing:
+            utxo_map.update((utxo['id'], utxo) for utxo in await self.get_utxos_by_ids(missing))
+
+        rows, inputs, outputs = [], [], []
+        for tx in txs:
+            row, input_rows, output_rows = self.convert_txs(tx, utxo_map)
+            rows.append(row)
+            inputs += [(row['hash'], ) + input_row for input_row in input_rows]
+            outputs += [(row['hash'], ) + output_row for output_row in output_rows]
+        columns = list(rows[0].keys())
+
+        # Partitioned tables have no unique key on hash alone, a tx stored
+        # before, e.g. as pending, is replaced instead of upserted. Its rows
+        # may move to another partition with the block_num. A tx inserted
+        # twice fails on tx_hashes, kept by triggers on tx_records.
+        hashes = [row['hash'] for row in rows]
+        self.logger.debug('insert %d txs', len(rows))
+        with self.transaction():
+            with self.conn as cursor:
+                address_ids = self.get_address_ids(cursor, set(row[4] for row in inputs if row[4]) | set(row[2] for row in outputs))
+                cursor.execute('DELETE FROM tx_inputs WHERE tx_hash = ANY(%s)', (hashes, ))
+                cursor.execute('DELETE FROM tx_outputs WHERE tx_hash = ANY(%s)', (hashes, ))
+                cursor.execute('DELETE FROM tx_records WHERE hash = ANY(%s)', (hashes, ))
+                execute_values(
+                    cursor,
+                    'INSERT INTO tx_records ({}) VALUES %s'.format(', '.join(columns)),
+                    [tuple(row[column] for column in columns) for row in rows]
+                )
+                execute_values(
+                    cursor,
+                    'INSERT INTO tx_inputs (tx_hash, idx, src_tx, src_idx, address_id, amount) VALUES %s',
+                    [(tx_hash, idx, src_tx, src_idx, address_ids.get(address), amount)
+                     for tx_hash, idx, src_tx, src_idx, address, amount in inputs]
+                )
+                execute_values(
+                    cursor,
+                    'INSERT INTO tx_outputs (tx_hash, idx, address_id, amount) VALUES %s',
+                    [(tx_hash, idx, address_ids[address], amount) for tx_hash, idx, address, amount in outputs]
+                )
+
+        return True
+
+    def get_address_ids(self, cursor, addresses: set):
+        # Only missing addresses are inserted, a conflict would still use up
+        # an id. Sorted, so concurrent writers lock them in the same order.
+        addresses = sorted(addresses)
+        cursor.execute(
+            'INSERT INTO addresses (address) '
+            'SELECT candidate.address FROM unnest(%s::text[]) candidate(address) '
+            'WHERE NOT EXISTS (SELECT 1 FROM addresses WHERE addresses.address = candidate.address) '
+            'ON CONFLICT (address) DO NOTHING',
+            (addresses, )
         )
+        cursor.execute('SELECT id, address FROM addresses WHERE address = ANY(%s)', (addresses, ))
+        return {row['address']: row['id'] for row in cursor.fetchall()}
 
-        self.logger.info('insert into txs: %s', sql)
+    async def reset_address_id_sequence(self):
+        # Address ids are copied in as they are, e.g. by a snapshot restore.
         with self.conn as cursor:
-            cursor.execute(sql, tuple(tx_db_fields.values()))
+            cursor.execute("SELECT setval(pg_get_serial_sequence('addresses', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM addresses")
+
+        return True
 
-        addresses = list(set(input_addresses + output_addresses))
-        await self.save_tx_addresses(tx_id, addresses)
+    async def get_watched_addresses(self):
+        with self.conn as cursor:
+            cursor.execute('SELECT address FROM watched_addresses')
+            rows = cursor.fetchall()
+
+        return [row['address'] for row in rows]
+
+    async def add_watched_addresses(self, addresses: list):
+        if not addresses:
+            return False
+
+        sql = 'INSERT INTO watched_addresses (address) VALUES %s ON CONFLICT (address) DO NOTHING'
+        with self.conn as cursor:
+            execute_values(cursor, sql, [(address, ) for address in addresses])
+
+        return True
+
+    async def get_unbackfilled_watched_addresses(self):
+        with self.conn as cursor:
+            cursor.execute('SELECT address FROM watched_addresses WHERE NOT backfilled')
+            rows = cursor.fetchall()
+
+        return [row['address'] for row in rows]
+
+    async def mark_watched_addresses_backfilled(self, addresses: list):
+        with self.conn as cursor:
+            cursor.execute('UPDATE watched_addresses SET backfilled=true WHERE address = ANY(%s)', (addresses, ))
+
+        return True
+
+    async def get_address_activity_heights(self, addresses: list, max_height: int):
+        # Outputs received by the addresses are in utxos or utxos_backup, the
+        # blocks spending them are recorded as deleted_block_num.
+        sql = 'SELECT block_num AS height FROM utxos WHERE receiver = ANY(%(addresses)s) '\
+              'UNION SELECT block_num FROM utxos_backup WHERE receiver = ANY(%(addresses)s) '\
+              'UNION SELECT deleted_block_num FROM utxos_backup WHERE receiver = ANY(%(addresses)s)'
+        with self.conn as cursor:
+            cursor.execute(sql, {'addresses': addresses})
+            rows = cursor.fetchall()
+
+        return sorted(row['height'] for row in rows if row['height'] and row['height'] <= max_height)
+
+    async def get_utxos_with_backup_by_ids(self, utxo_ids: list):
+        if not utxo_ids:
+            return []
+
+        sql = 'SELECT utxo_id, tx_hash, tx_index, receiver, amount FROM utxos WHERE utxo_id = ANY(%(ids)s) '\
+              'UNION ALL '\
+              'SELECT utxo_id, tx_hash, tx_index, receiver, amount FROM utxos_backup WHERE utxo_id = ANY(%(ids)s)'
+        with self.conn as cursor:
+            cursor.execute(sql, {'ids': utxo_ids})
+            rows = cursor.fetchall()
+
+        return [{
+          'address': row['receiver'],
+          'amount': row['amount'],
+          'id': row['utxo_id'],
+          'index': row['tx_index'],
+          'txHash': row['tx_hash'],
+        } for row in rows]
+
+    async def iter_rows(self, sql: str, params, batch_size=STREAM_BATCH_SIZE):
+        # Server side cursor, so large results are streamed in batches instead
+        # of being loaded at once. It lives in a transaction of its own: WITH
+        # HOLD would let it run in autocommit mode, but only by materializing
+        # the whole result on the server first. The transaction stays open
+        # while the rows are consumed, the connection is not shared meanwhile.
+        # Its snapshot holds back vacuum, so a consumer that stalls between
+        # two batches gets the session ended by the server.
+        with self.transaction():
+            with self.conn as cursor:
+                cursor.execute('SET LOCAL idle_in_transaction_session_timeout = %s', (STREAM_IDLE_TIMEOUT_SECONDS * 1000, ))
+            cursor = self.connect.cursor(name=f'stream_{uuid4().hex}', cursor_factory=RealDictCursor)
+            try:
+                cursor.itersize = batch_size
+                cursor.execute(sql, params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+
+                    yield rows
+            finally:
+                cursor.close()
+
+    def iter_utxos_by_addresses(self, addresses: list):
+        sql = 'SELECT utxo_id, tx_hash, tx_index, receiver, amount, block_num FROM utxos '\
+              'WHERE receiver = ANY(%s) ORDER BY block_num, utxo_id'
+        return self.iter_rows(sql, (addresses, ))
+
+    def iter_txs_by_hashes(self, tx_hashes: list):
+        sql = 'SELECT hash, inputs_address, inputs_amount, outputs_address, outputs_amount, '\
+              '       block_num, block_hash, time, tx_state, tx_ordinal, last_update '\
+              'FROM txs WHERE hash = ANY(%s)'
+        return self.iter_rows(sql, (tx_hashes, ))
+
+    async def get_txs_history_by_addresses(self, addresses: list, limit: int, after: dict=None):
+        # Keyset pagination on (block_num, tx_ordinal), newest first. Pending
+        # txs have no position in the chain yet and are not part of history.
+        sql = 'SELECT hash, inputs_address, inputs_amount, outputs_address, outputs_amount, '\
+              '       block_num, block_hash, time, tx_state, tx_ordinal, last_update '\
+              'FROM txs '\
+              'WHERE hash IN (SELECT tx_hash FROM tx_addresses '\
+              '               WHERE address = ANY(%(addresses)s) AND block_num IS NOT NULL) '\
+              '  AND block_num IS NOT NULL {} '\
+              'ORDER BY block_num DESC, tx_ordinal DESC LIMIT %(limit)s'
+        params = {'addresses': addresses, 'limit': limit}
+        if after:
+            sql = sql.format('AND (block_num, tx_ordinal) < (%(block_num)s, %(tx_ordinal)s)')
+            params.update(after)
+        else:
+            sql = sql.format('')
+
+        with self.conn as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+
+        return rows
+
+    async def get_balances(self, addresses: list):
+        sql = 'SELECT address, balance, utxo_count FROM address_balances WHERE address = ANY(%s)'
+        with self.conn as cursor:
+            cursor.execute(sql, (addresses, ))
+            rows = cursor.fetchall()
+
+        return {row['address']: row for row in rows}
+
+    def iter_address_balances_drift(self):
+        sql = 'SELECT COALESCE(actual.address, stored.address) AS address, '\
+              '       actual.balance AS actual_balance, stored.balance AS stored_balance, '\
+              '       actual.utxo_count AS actual_utxo_count, stored.utxo_count AS stored_utxo_count '\
+              'FROM (SELECT receiver AS address, SUM(amount) AS balance, COUNT(*) AS utxo_count '\
+              '      FROM utxos GROUP BY receiver) actual '\
+              'FULL OUTER JOIN (SELECT * FROM address_balances WHERE balance <> 0 OR utxo_count <> 0) stored '\
+              '  ON stored.address = actual.address '\
+              'WHERE actual.balance IS DISTINCT FROM stored.balance '\
+              '   OR actual.utxo_count IS DISTINCT FROM stored.utxo_count'
+        return self.iter_rows(sql, None)
+
+    async def rebuild_address_balances(self):
+        self.logger.info('rebuild address balances from utxos')
+        with self.transaction():
+            with self.conn as cursor:
+                # Keep the importer from spending utxos while they are summed up.
+                cursor.execute('LOCK TABLE utxos IN SHARE MODE')
+                cursor.execute('TRUNCATE address_balances')
+                cursor.execute(
+                    'INSERT INTO address_balances (address, balance, utxo_count) '
+                    'SELECT receiver, SUM(amount), COUNT(*) FROM utxos GROUP BY receiver'
+                )
+
+        return True
+
+    def iter_utxos_at_height(self, addresses: list, block_height: int):
+        # Unspent outputs created up to the height, plus spent outputs whose
+        # [block_num, deleted_block_num) range covers it.
+        sql = 'SELECT utxo_id, tx_hash, tx_index, receiver, amount, block_num, NULL AS deleted_block_num '\
+              'FROM utxos WHERE receiver = ANY(%(addresses)s) AND block_num <= %(height)s '\
+              'UNION ALL '\
+              'SELECT utxo_id, tx_hash, tx_index, receiver, amount, block_num, deleted_block_num '\
+              'FROM utxos_backup WHERE receiver = ANY(%(addresses)s) '\
+              '  AND int8range(block_num, deleted_block_num) @> %(height)s::int8'
+        return self.iter_rows(sql, {'addresses': addresses, 'height': block_height})
+
+    async def prune_utxos_backup(self, block_height: int):
+        self.logger.info('prune utxo history spent before block height: %s', block_height)
+        with self.conn as cursor:
+            cursor.execute('DELETE FROM utxos_backup WHERE deleted_block_num < %s', (block_height, ))
+
+        return True
+
+    def begin_snapshot(self, snapshot_id: str=None):
+        # Without an id a new snapshot is taken and exported, other connections
+        # join it to read the very same state in parallel.
+        with self.conn as cursor:
+            cursor.execute('BEGIN ISOLATION LEVEL REPEATABLE READ READ ONLY')
+            if snapshot_id:
+                cursor.execute('SET TRANSACTION SNAPSHOT %s', (snapshot_id, ))
+                return snapshot_id
+
+            cursor.execute('SELECT pg_export_snapshot() AS snapshot_id')
+            return cursor.fetchone()['snapshot_id']
+
+    def end_snapshot(self):
+        with self.conn as cursor:
+            cursor.execute('COMMIT')
+
+    def get_last_epoch_boundary(self):
+        # Last block of the newest epoch that is complete in the database.
+        sql = 'SELECT block_hash, block_height, epoch, slot FROM blocks '\
+              'WHERE epoch < (SELECT epoch FROM blocks ORDER BY block_height DESC LIMIT 1) '\
+              'ORDER BY block_height DESC LIMIT 1'
+        with self.conn as cursor:
+            cursor.execute(sql)
+            return cursor.fetchone()
+
+    def copy_to(self, query: str, params: dict, f):
+        with self.conn as cursor:
+            sql = cursor.mogrify(query, params).decode()
+            cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH (FORMAT csv)', f)
+            return cursor.rowcount
+
+    def copy_from(self, table: str, columns: list, f):
+        with self.conn as cursor:
+            cursor.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', f)
+            return cursor.rowcount
+
+    def drop_secondary_indexes(self, tables: list):
+        # Indexes backing primary keys and unique constraints are kept, rows
+        # are checked against them while they are loaded.
+        sql = 'SELECT i.indexrelid::regclass::text AS name, pg_get_indexdef(i.indexrelid) AS definition '\
+              'FROM pg_index i JOIN pg_class c ON c.oid = i.indrelid '\
+              'WHERE c.relname = ANY(%s) '\
+              '  AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid)'
+        with self.conn as cursor:
+            cursor.execute(sql, (tables, ))
+            indexes = cursor.fetchall()
+            for index in indexes:
+                cursor.execute(f'DROP INDEX {index["name"]}')
+
+        # Definitions of partitioned indexes are reported ON ONLY the parent,
+        # rebuilt that way they would not cover the partitions.
+        return [index['definition'].replace(' ON ONLY ', ' ON ') for index in indexes]
+
+    def create_index(self, definition: str):
+        with self.conn as cursor:
+            cursor.execute(definition)
+
+    def analyze(self, tables: list):
+        with self.conn as cursor:
+            for table in tables:
+                cursor.execute(f'ANALYZE {table}')
+
+    def check_blocks_chain(self, low: int, high: int):
+        # Blocks whose prev_hash is not the hash of the block one below, or
+        # that have no block below at all.
+        sql = 'SELECT b.block_height, b.block_hash, b.prev_hash, b.epoch, '\
+              '       p.block_hash AS expected_prev_hash, p.epoch AS prev_epoch '\
+              'FROM blocks b LEFT JOIN blocks p ON p.block_height = b.block_height - 1 '\
+              'WHERE b.block_height BETWEEN %(low)s AND %(high)s AND b.block_height > 1 '\
+              '  AND b.prev_hash IS DISTINCT FROM p.block_hash '\
+              'ORDER BY b.block_height'
+        with self.conn as cursor:
+            cursor.execute(sql, {'low': low, 'high': high})
+            return cursor.fetchall()
+
+    def check_txs_amounts(self, low: int, high: int):
+        # Per block: outputs of the txs against the utxos created, inputs of
+        # the txs against the utxos spent.
+        sql = 'WITH txs_amounts AS ('\
+              '  SELECT block_num, '\
+              '         SUM((SELECT COALESCE(SUM(amount), 0) FROM tx_inputs WHERE tx_hash = hash)) AS inputs, '\
+              '         SUM((SELECT COALESCE(SUM(amount), 0) FROM tx_outputs WHERE tx_hash = hash)) AS outputs '\
+              '  FROM tx_records WHERE block_num BETWEEN %(low)s AND %(high)s GROUP BY block_num'\
+              '), created AS ('\
+              '  SELECT block_num, SUM(amount) AS amount FROM ('\
+              '    SELECT block_num, amount FROM utxos WHERE block_num BETWEEN %(low)s AND %(high)s '\
+              '    UNION ALL '\
+              '    SELECT block_num, amount FROM utxos_backup WHERE block_num BETWEEN %(low)s AND %(high)s'\
+              '  ) outputs WHERE block_num > 0 GROUP BY block_num'\
+              '), spent AS ('\
+              '  SELECT deleted_block_num AS block_num, SUM(amount) AS amount FROM utxos_backup '\
+              '  WHERE deleted_block_num BETWEEN %(low)s AND %(high)s GROUP BY deleted_block_num'\
+              ') '\
+              'SELECT COALESCE(t.block_num, c.block_num, s.block_num) AS block_num, '\
+              '       t.inputs, t.outputs, c.amount AS created, s.amount AS spent '\
+              'FROM txs_amounts t '\
+              'FULL JOIN created c ON c.block_num = t.block_num '\
+              'FULL JOIN spent s ON s.block_num = COALESCE(t.block_num, c.block_num) '\
+              'ORDER BY 1'
+        with self.conn as cursor:
+            cursor.execute(sql, {'low': low, 'high': high})
+            return cursor.fetchall()
+
+    def check_txs_inputs(self, low: int, high: int):
+        # Inputs of stored txs that were not moved to utxos_backup by the
+        # block spending them.
+        sql = 'SELECT t.block_num, t.hash, i.src_tx || i.src_idx AS utxo_id '\
+              'FROM tx_records t JOIN tx_inputs i ON i.tx_hash = t.hash '\
+              'WHERE t.block_num BETWEEN %(low)s AND %(high)s '\
+              '  AND NOT EXISTS (SELECT 1 FROM utxos_backup b '\
+              '                  WHERE b.utxo_id = i.src_tx || i.src_idx AND b.deleted_block_num = t.block_num) '\
+              'ORDER BY t.block_num'
+        with self.conn as cursor:
+            cursor.execute(sql, {'low': low, 'high': high})
+            return cursor.fetchall()
+
+    def get_supply(self):
+        # Genesis outputs are stored at block 0, spent ones in utxos_backup.
+        sql = 'SELECT (SELECT COALESCE(SUM(amount), 0) FROM utxos) AS unspent, '\
+              '       (SELECT COALESCE(SUM(amount), 0) FROM utxos WHERE block_num = 0) '\
+              '     + (SELECT COALESCE(SUM(amount), 0) FROM utxos_backup WHERE block_num = 0) AS genesis'
+        with self.conn as cursor:
+            cursor.execute(sql)
+            return cursor.fetchone()
+
+    def get_epoch_blocks(self, epoch: int):
+        sql = 'SELECT block_hash, prev_hash, block_height, slot FROM blocks WHERE epoch = %s ORDER BY block_height'
+        with self.conn as cursor:
+            cursor.execute(sql, (epoch, ))
+            return cursor.fetchall()
+
+    def get_txs_by_heights(self, low: int, high: int):
+        sql = 'SELECT hash, block_num, tx_ordinal, time, inputs, outputs_address, outputs_amount '\
+              'FROM txs WHERE block_num BETWEEN %s AND %s ORDER BY block_num, tx_ordinal'
+        with self.conn as cursor:
+            cursor.execute(sql, (low, high))
+            return cursor.fetchall()
+
+    async def save_block_stats(self, rows: list):
+        if not rows:
+            return False
+
+        columns = list(rows[0].keys())
+        # Blocks cached but not stored before a crash are imported again.
+        sql = 'INSERT INTO block_stats ({}) VALUES %s ON CONFLICT (block_height) DO UPDATE SET {}'.format(
+            ', '.join(columns), ', '.join(f'{column}=EXCLUDED.{column}' for column in columns if column != 'block_height')
+        )
+        with self.conn as cursor:
+            execute_values(cursor, sql, [tuple(row[column] for column in columns) for row in rows])
+
+        return True
+
+    async def update_epoch_stats(self, epoch: int, unique_addresses: int=None):
+        sql = 'INSERT INTO epoch_stats (epoch, block_count, first_block_height, last_block_height, tx_count, '\
+              '  input_count, output_count, output_total, fee_total, tx_bytes, max_block_tx_bytes, '\
+              '  largest_tx_hash, largest_tx_output, unique_addresses, updated_at) '\
+              'SELECT epoch, COUNT(*), MIN(block_height), MAX(block_height), SUM(tx_count), '\
+              '       SUM(input_count), SUM(output_count), SUM(output_total), SUM(fee_total), SUM(tx_bytes), MAX(tx_bytes), '\
+              '       (ARRAY_AGG(largest_tx_hash ORDER BY largest_tx_output DESC NULLS LAST))[1], MAX(largest_tx_output), '\
+              '       %(unique_addresses)s, now() '\
+              'FROM block_stats WHERE epoch = %(epoch)s GROUP BY epoch '\
+              'ON CONFLICT (epoch) DO UPDATE SET '\
+              '  block_count=EXCLUDED.block_count, first_block_height=EXCLUDED.first_block_height, '\
+              '  last_block_height=EXCLUDED.last_block_height, tx_count=EXCLUDED.tx_count, '\
+              '  input_count=EXCLUDED.input_count, output_count=EXCLUDED.output_count, '\
+              '  output_total=EXCLUDED.output_total, fee_total=EXCLUDED.fee_total, tx_bytes=EXCLUDED.tx_bytes, '\
+              '  max_block_tx_bytes=EXCLUDED.max_block_tx_bytes, largest_tx_hash=EXCLUDED.largest_tx_hash, '\
+              '  largest_tx_output=EXCLUDED.largest_tx_output, unique_addresses=EXCLUDED.unique_addresses, '\
+              '  updated_at=EXCLUDED.updated_at'
+        with self.conn as cursor:
+            cursor.execute(sql, {'epoch': epoch, 'unique_addresses': unique_addresses})
+
+        return True
+
+    async def rollback_chain_stats(self, block_height: int):
+        self.logger.info('rollback block and epoch stats to block height: %s', block_height)
+        with self.conn as cursor:
+            cursor.execute('DELETE FROM block_stats WHERE block_height > %s', (block_height, ))
+            cursor.execute('DELETE FROM epoch_stats WHERE last_block_height > %s', (block_height, ))
+
+        return True
+
+    async def get_epoch_address_heights(self, epoch: int, block_height: int):
+        # First height each address of the epoch was seen at, up to block_height.
+        sql = 'SELECT address, MIN(block_num) AS block_num FROM tx_addresses '\
+              'WHERE block_num BETWEEN (SELECT MIN(block_height) FROM blocks WHERE epoch = %s) AND %s '\
+              'GROUP BY address'
+        with self.conn as cursor:
+            cursor.execute(sql, (epoch, block_height))
+            return {row['address']: row['block_num'] for row in cursor.fetchall()}
+
+
+class DBPool:
+    """
+    Idle connections of the API handlers, reused across requests. A handler
+    takes one for the whole request, streamed responses keep a transaction
+    open on it. Up to max_idle are kept, others are closed on release.
+    """
+
+    def __init__(self, max_idle: int):
+        self.max_idle = max_idle
+        self.idle = []
+
+    def acquire(self):
+        return self.idle.pop() if self.idle else DB()
+
+    def release(self, db: DB):
+        if len(self.idle) < self.max_idle and db.is_reusable():
+            self.idle.append(db)
+        else:
+            db.close()
+
+
+class WorkerDBs:
+    """
+    One connection per worker thread of an executor, all closed together once
+    the executor is done.
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.databases = []
+
+    def get(self):
+        if not hasattr(self.local, 'database'):
+            self.local.database = DB()
+            with self.lock:
+                self.databases.append(self.local.database)
+
+        return self.local.database
+
+    def close(self):
+        for database in self.databases:
+            database.close()
+        self.databases = []
@@ -0,0 +1,89 @@
+"""
+   * Byron address codec shared by the importer and the API.
+   * An address is base58(cbor([tag24(payload), crc32(payload)])) where payload
+   * is cbor([address_root, attributes, address_type]). The same hot addresses
+   * come by over and over again, so results are kept in LRU caches.
+"""
+import base58
+import base64
+import binascii
+from lib.cbor_codec import codec
+from functools import lru_cache
+from hashlib import blake2b, sha3_256
+from constants.address import ADDRESS_CACHE_SIZE
+
+
+def normalize(address):
+    return address.decode() if isinstance(address, bytes) else address
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def encode_raw(payload: bytes, crc: int):
+    return base58.b58encode(codec.dumps([codec.Tag(24, payload), crc])).decode()
+
+
+def encode_address(address: list):
+    # `address` is the decoded [tag24(payload), crc] structure of a tx output,
+    # the payload bytes are the cache key, so it is not re-encoded when cached.
+    tagged, crc = address
+    return encode_raw(tagged.value, crc)
+
+
+def encode_addresses(addresses: list):
+    return [encode_address(address) for address in addresses]
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def to_raw(address: str):
+    return base58.b58decode(address)
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def decode_raw(raw: bytes):
+    tagged, crc = codec.loads(raw)
+    payload = tagged.value
+    if binascii.crc32(payload) != crc:
+        raise ValueError('invalid address checksum')
+
+    address_root, addr_attr, address_type = codec.loads(payload)
+    return {
+        'address_root': address_root,
+        'addr_attr': addr_attr,
+        'address_type': address_type,
+    }
+
+
+def decode_address(address):
+    # The result is shared through the cache and must not be modified.
+    return decode_raw(to_raw(normalize(address)))
+
+
+def decode_addresses(addresses: list):
+    return [decode_address(address) for address in addresses]
+
+
+def validate_address(address):
+    try:
+        decode_address(address)
+        return True
+    except Exception:
+        return False
+
+
+def validate_addresses(addresses: list):
+    return [validate_address(address) for address in addresses]
+
+
+def address_hash(address):
+    return blake2b(to_raw(normalize(address)), digest_size=32).hexdigest()
+
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def redeem_key_to_address(public_redeem_key: str):
+    pk = base64.urlsafe_b64decode(public_redeem_key)
+
+    addr = [2, [2, pk], {}]
+    addr_hash = blake2b(sha3_256(codec.dumps(addr, canonical=True)).digest(), digest_size=28).digest()
+    payload = codec.dumps([addr_hash, {}, 2], canonical=True)
+
+    return encode_raw(payload, binascii.crc32(payload))
@@ -0,0 +1,148 @@
+import asyncio
+from collections import deque, defaultdict
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class AdmissionController:
+    """
+    Bounded number of requests in flight with a short FIFO wait queue behind
+    it. Requests waiting longer than max_wait are shed, as are requests over
+    the per client quotas: requests in flight, and txs in flight, where a
+    batch counts every tx it carries.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, max_wait: float, per_key_limit: int,
+                 per_key_tx_limit: int, api_keys=None):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.per_key_limit = per_key_limit
+        self.per_key_tx_limit = per_key_tx_limit
+        self.api_keys = set(api_keys or [])
+        self.in_flight = 0
+        self.waiters = deque()
+        self.key_counts = defaultdict(int)
+        self.key_txs = defaultdict(int)
+        self.admitted = 0
+        self.shed = defaultdict(int)
+
+    def stats(self):
+        return {
+            'in_flight': self.in_flight,
+            'queue_depth': sum(1 for waiter in self.waiters if not waiter.done()),
+            'admitted': self.admitted,
+            'shed': dict(self.shed),
+            'limits': {
+                'max_in_flight': self.max_in_flight,
+                'max_queue': self.max_queue,
+                'max_wait': self.max_wait,
+                'per_key_limit': self.per_key_limit,
+                'per_key_tx_limit': self.per_key_tx_limit,
+            },
+        }
+
+    def client_key(self, api_key, remote_ip: str):
+        """
+        Quota key of a request: a configured API key, or the client address
+        when none is sent. Unknown keys are refused, made up keys would get a
+        fresh quota each.
+        """
+        if api_key is None:
+            return f'ip:{remote_ip}'
+
+        if api_key not in self.api_keys:
+            self.shed['unknown_key'] += 1
+            raise AdmissionRejected(403, 'unknown api key')
+
+        return f'key:{api_key}'
+
+    async def wait_for_slot(self):
+        if self.in_flight < self.max_in_flight and not self.waiters:
+            self.in_flight += 1
+            return
+
+        if len(self.waiters) >= self.max_queue:
+            self.shed['queue_full'] += 1
+            raise AdmissionRejected(503, 'server is overloaded, retry later')
+
+        waiter = asyncio.get_event_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            # The slot is handed over by release() without touching in_flight.
+            await asyncio.wait_for(waiter, self.max_wait)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # Handed over right before the deadline or a cancellation,
+                # the slot goes on to the next waiter.
+                self.release_slot()
+            elif waiter in self.waiters:
+                self.waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed['deadline'] += 1
+                raise AdmissionRejected(503, 'server is overloaded, retry later')
+            raise
+
+    async def acquire(self, key=None, txs=1):
+        if txs > self.per_key_tx_limit:
+            self.shed['too_large'] += 1
+            raise AdmissionRejected(413, f'request exceeds the limit of {self.per_key_tx_limit} txs')
+
+        if key is not None:
+            if self.key_counts[key] >= self.per_key_limit:
+                self.shed['key_quota'] += 1
+                raise AdmissionRejected(429, 'too many concurrent requests for this client')
+
+            if self.key_txs[key] + txs > self.per_key_tx_limit:
+                self.shed['key_tx_quota'] += 1
+                raise AdmissionRejected(429, 'too many txs in flight for this client')
+
+            self.key_counts[key] += 1
+            self.key_txs[key] += txs
+
+        try:
+            await self.wait_for_slot()
+        except BaseException:
+            # Shed, or the request was cancelled while waiting.
+            self.release_key(key, txs)
+            raise
+
+        self.admitted += 1
+
+    def release_key(self, key, txs=1):
+        if key is None:
+            return
+
+        self.key_counts[key] -= 1
+        self.key_txs[key] -= txs
+        if not self.key_counts[key]:
+            del self.key_counts[key]
+            del self.key_txs[key]
+
+    def release_slot(self):
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+
+        self.in_flight -= 1
+
+    def release(self, key=None, txs=1):
+        self.release_key(key, txs)
+        self.release_slot()
+
+    @asynccontextmanager
+    async def admit(self, key=None, txs=1):
+        await self.acquire(key, txs)
+        try:
+            yield
+        finally:
+            self.release(key, txs)
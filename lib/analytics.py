@@ -0,0 +1,129 @@
+import os
+import shutil
+from bisect import bisect_right
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Columns of every exported table. Rows of all tables carry the block
+# height, so a partially rolled back epoch is cut at the same place. The
+# epoch itself is in the directory name.
+ANALYTICS_TABLES = {
+    'blocks': ['block_hash', 'prev_hash', 'block_height', 'slot', 'tx_count'],
+    'txs': ['hash', 'block_height', 'tx_ordinal', 'time', 'input_count', 'output_count',
+            'input_total', 'output_total', 'fee'],
+    'inputs': ['tx_hash', 'block_height', 'input_index', 'utxo_tx_hash', 'utxo_index', 'address', 'amount'],
+    'outputs': ['tx_hash', 'block_height', 'output_index', 'address', 'amount'],
+}
+# Addresses repeat a lot within an epoch, they are stored once per file.
+DICTIONARY_COLUMNS = {'address'}
+COLUMN_TYPES = {
+    'block_height': 'int64', 'slot': 'int32', 'tx_count': 'int32',
+    'tx_ordinal': 'int32', 'input_count': 'int32', 'output_count': 'int32', 'input_index': 'int32',
+    'utxo_index': 'int32', 'output_index': 'int32', 'input_total': 'int64', 'output_total': 'int64',
+    'fee': 'int64', 'amount': 'int64',
+}
+
+
+def is_available():
+    return pa is not None
+
+
+def epoch_dir_name(epoch: int):
+    # Hive style, pyarrow.dataset reads the epoch back as a partition column.
+    return f'epoch={epoch}'
+
+
+def exported_epochs(directory: str):
+    if not os.path.isdir(directory):
+        return set()
+
+    return {
+        int(name.split('=', 1)[1]) for name in os.listdir(directory)
+        if name.startswith('epoch=') and name.split('=', 1)[1].isdigit()
+    }
+
+
+class EpochRows:
+    """Column lists of the tables of one epoch, filled block by block."""
+
+    def __init__(self, epoch: int, is_complete: bool):
+        self.epoch = epoch
+        # False when the rows do not start at the first block of the epoch.
+        self.is_complete = is_complete
+        self.columns = {table: {column: [] for column in columns} for table, columns in ANALYTICS_TABLES.items()}
+
+    @property
+    def last_height(self):
+        heights = self.columns['blocks']['block_height']
+        return heights[-1] if heights else None
+
+    def add_block(self, block_hash: str, prev_hash: str, height: int, slot: int, txs: list):
+        """
+        `txs` are dicts with the id, txOrdinal and txTime of parsed txs, their
+        resolved input utxos and their outputs as (address, amount).
+        """
+        self.append('blocks', block_hash, prev_hash, height, slot, len(txs))
+        for tx in txs:
+            input_total = sum(int(utxo['amount']) for utxo in tx['inputs'])
+            output_total = sum(amount for _, amount in tx['outputs'])
+            self.append(
+                'txs', tx['id'], height, tx['txOrdinal'], tx['txTime'], len(tx['inputs']), len(tx['outputs']),
+                input_total, output_total, input_total - output_total
+            )
+            for index, utxo in enumerate(tx['inputs']):
+                self.append('inputs', tx['id'], height, index, utxo['txHash'], utxo['index'], utxo['address'], int(utxo['amount']))
+            for index, (address, amount) in enumerate(tx['outputs']):
+                self.append('outputs', tx['id'], height, index, address, amount)
+
+    def append(self, table: str, *values):
+        for column, value in zip(ANALYTICS_TABLES[table], values):
+            self.columns[table][column].append(value)
+
+    def truncate(self, height: int):
+        """Drops the rows of blocks above `height`."""
+        for columns in self.columns.values():
+            cut = bisect_right(columns['block_height'], height)
+            for values in columns.values():
+                del values[cut:]
+
+
+def table_to_arrow(table: str, columns: dict):
+    arrays, names = [], []
+    for column in ANALYTICS_TABLES[table]:
+        values = columns[column]
+        if column == 'time':
+            array = pa.array(values, pa.timestamp('s'))
+        elif column in DICTIONARY_COLUMNS:
+            array = pa.array(values, pa.string()).dictionary_encode()
+        else:
+            array = pa.array(values, pa.type_for_alias(COLUMN_TYPES.get(column, 'string')))
+        arrays.append(array)
+        names.append(column)
+
+    return pa.Table.from_arrays(arrays, names=names)
+
+
+def write_epoch(directory: str, rows: EpochRows):
+    """
+    Writes one parquet file per table of the epoch. Files go to a temporary
+    directory first, readers never see half an epoch.
+    """
+    path = os.path.join(directory, epoch_dir_name(rows.epoch))
+    # pyarrow.dataset skips names starting with an underscore. The importer
+    # and the backfill command may write at the same time.
+    tmp_path = os.path.join(directory, f'_{epoch_dir_name(rows.epoch)}.{os.getpid()}.tmp')
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for table, columns in rows.columns.items():
+        pq.write_table(
+            table_to_arrow(table, columns), os.path.join(tmp_path, f'{table}.parquet'),
+            compression='zstd', use_dictionary=list(DICTIONARY_COLUMNS)
+        )
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,29 @@
+import math
+from hashlib import blake2b
+
+
+class BloomFilter:
+
+    def __init__(self, capacity: int, error_rate=0.001):
+        capacity = max(capacity, 1)
+        # Past capacity the error rate grows, the owner rebuilds it larger.
+        self.capacity = capacity
+        self.count = 0
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item: str):
+        # Double hashing: two 64 bit halves of one digest give all k positions.
+        digest = blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:], 'big')
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str):
+        self.count += 1
+        for pos in self.positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(item))
@@ -0,0 +1,35 @@
+from time import monotonic
+from collections import OrderedDict
+
+
+class TTLCache:
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.items = OrderedDict()
+
+    def get(self, key, default=None):
+        item = self.items.get(key)
+        if not item:
+            return default
+
+        value, expires_at = item
+        if expires_at < monotonic():
+            del self.items[key]
+            return default
+
+        self.items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self.items[key] = (value, monotonic() + self.ttl)
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def delete(self, key):
+        self.items.pop(key, None)
+
+    def clear(self):
+        self.items.clear()
@@ -0,0 +1,81 @@
+"""
+   * CBOR codec shared by the importer and the API. The backend is set by
+   * cbor.backend in the config: "cbor", the pure python package, or "cbor2"
+   * with its C implementation. Both decode to the same values: lists, dicts,
+   * bytes, str, ints and tags with .tag and .value. Canonical map ordering
+   * and the indefinite-length arrays of txs are done here, not by a backend.
+"""
+from config import config
+from cbor import cbor
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+TAG_TYPES = (cbor.Tag, cbor2.CBORTag) if cbor2 else (cbor.Tag, )
+BACKENDS = ['cbor', 'cbor2']
+INDEFINITE_ARRAY_START = b'\x9f'
+BREAK = b'\xff'
+MAJOR_ARRAY = 4
+
+
+def encode_head(major: int, length: int):
+    if length < 24:
+        return bytes([major << 5 | length])
+
+    for info, size in ((24, 1), (25, 2), (26, 4), (27, 8)):
+        if length < 1 << (8 * size):
+            return bytes([major << 5 | info]) + length.to_bytes(size, 'big')
+
+    raise ValueError(f'cbor length out of range: {length}')
+
+
+class CborCodec:
+
+    def __init__(self, backend: str):
+        self.set_backend(backend)
+
+    def set_backend(self, backend: str):
+        if backend == 'cbor':
+            self.Tag, self.load_bytes, self.dump_bytes = cbor.Tag, cbor.loads, cbor.dumps
+        elif backend == 'cbor2':
+            if cbor2 is None:
+                raise Exception('cbor backend cbor2 is not installed')
+            self.Tag, self.load_bytes, self.dump_bytes = cbor2.CBORTag, cbor2.loads, cbor2.dumps
+        else:
+            raise Exception(f'unknown cbor backend: {backend}, expected one of: {BACKENDS}')
+
+        self.backend = backend
+
+    def loads(self, data: bytes):
+        return self.load_bytes(data)
+
+    def dumps(self, obj, canonical=False):
+        return self.dump_bytes(self.canonical(obj) if canonical else obj)
+
+    def canonical(self, obj):
+        """Map keys sorted by their encoding: shorter first, then bytewise."""
+        if isinstance(obj, dict):
+            items = []
+            for key, value in obj.items():
+                encoded_key = self.dump_bytes(key)
+                items.append((len(encoded_key), encoded_key, key, self.canonical(value)))
+            items.sort(key=lambda item: item[:2])
+            return {key: value for _, _, key, value in items}
+        if isinstance(obj, list):
+            return [self.canonical(item) for item in obj]
+        if isinstance(obj, TAG_TYPES):
+            return self.Tag(obj.tag, self.canonical(obj.value))
+
+        return obj
+
+    def dumps_array(self, encoded_items: list):
+        """Definite-length array of already encoded items."""
+        return encode_head(MAJOR_ARRAY, len(encoded_items)) + b''.join(encoded_items)
+
+    def dumps_indefinite_array(self, items: list):
+        return INDEFINITE_ARRAY_START + b''.join(self.dump_bytes(item) for item in items) + BREAK
+
+
+codec = CborCodec(config.get('cbor', {}).get('backend', 'cbor'))
@@ -0,0 +1,95 @@
+import asyncio
+from lib.logger import get_logger
+from constants.events import *
+
+
+class Subscription:
+
+    def __init__(self, addresses=None, tx_hashes=None, buffer_size=SUBSCRIBER_BUFFER_SIZE):
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self.dropped_rollback = None
+        self.set_filters(addresses, tx_hashes)
+
+    def set_filters(self, addresses=None, tx_hashes=None):
+        self.addresses = set(addresses or [])
+        self.tx_hashes = set(tx_hashes or [])
+
+    def matches(self, event: dict):
+        if not self.addresses and not self.tx_hashes:
+            return True
+
+        # Rollbacks change what every client has seen, so they always go out.
+        if event['type'] == EVENT_ROLLBACK:
+            return True
+
+        return bool(self.addresses.intersection(event.get('addresses', [])) or
+                    self.tx_hashes.intersection(event.get('txHashes', [])))
+
+    def push(self, event: dict):
+        if not self.matches(event):
+            return
+
+        # Slow consumers lose the oldest events instead of growing the buffer.
+        if self.queue.full():
+            dropped = self.queue.get_nowait()
+            self.dropped += 1
+            # A lost rollback would leave the client on a fork. The deepest one
+            # is kept and goes out right after the overflow notice.
+            if dropped['type'] == EVENT_ROLLBACK and (
+                not self.dropped_rollback or dropped['height'] < self.dropped_rollback['height']
+            ):
+                self.dropped_rollback = dropped
+
+        self.queue.put_nowait(event)
+
+    async def get(self):
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            return {'type': EVENT_OVERFLOW, 'dropped': dropped}
+
+        if self.dropped_rollback:
+            event, self.dropped_rollback = self.dropped_rollback, None
+            return event
+
+        return await self.queue.get()
+
+
+class EventBus:
+
+    def __init__(self):
+        self.logger = get_logger('event-bus')
+        self.subscriptions = set()
+        self.listeners = []
+
+    def add_listener(self, listener):
+        # In-process callbacks, run synchronously for every event.
+        self.listeners.append(listener)
+
+    def subscribe(self, addresses=None, tx_hashes=None):
+        subscription = Subscription(addresses, tx_hashes)
+        self.subscriptions.add(subscription)
+        self.logger.info('new subscription, total: %d', len(self.subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+        self.logger.info('subscription closed, total: %d', len(self.subscriptions))
+
+    def emit(self, event_type: str, payload: dict):
+        if not self.subscriptions and not self.listeners:
+            return
+
+        event = {'type': event_type}
+        event.update(payload)
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception:
+                self.logger.exception('event listener failed on: %s', event_type)
+
+        for subscription in list(self.subscriptions):
+            subscription.push(event)
+
+
+event_bus = EventBus()
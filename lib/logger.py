@@ -1,19 +1,136 @@
 import sys
+import queue
+import atexit
 import logging
+from time import monotonic
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
+from config import config
+
+_log_queue = queue.Queue(-1)
+_listener = None
+_ring_buffer = None
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the latest records from its level on, without formatting them.
+    They are written out only when dumped on an error.
+    """
+
+    def __init__(self, capacity: int, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def dump(self, target: logging.Handler):
+        records = list(self.records)
+        self.records.clear()
+        for record in records:
+            target.handle(record)
+
+
+class RateLimitedLogger:
+    """
+    For hot paths: every message format is written at most once per interval,
+    with the number of suppressed calls appended.
+    """
+
+    def __init__(self, logger: logging.Logger, interval=10):
+        self.logger = logger
+        self.interval = interval
+        self.last_logged = {}
+        self.suppressed = {}
+
+    def log(self, level: int, msg: str, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+
+        now = monotonic()
+        if now - self.last_logged.get(msg, -self.interval) < self.interval:
+            self.suppressed[msg] = self.suppressed.get(msg, 0) + 1
+            return
+
+        suppressed = self.suppressed.pop(msg, 0)
+        self.last_logged[msg] = now
+        if suppressed:
+            msg = f'{msg} (+{suppressed} suppressed)'
+        self.logger.log(level, msg, *args, stacklevel=3)
+
+    def debug(self, msg: str, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg: str, *args):
+        self.log(logging.WARNING, msg, *args)
+
+
+def _parse_level(level):
+    return logging.getLevelName(level.upper()) if isinstance(level, str) else level
+
+
+def _stream_handler():
+    fmt = logging.Formatter(
+        fmt="%(asctime)-11s %(name)s:%(lineno)d %(levelname)s: %(message)s",
+        datefmt="[%Y/%m/%d-%H:%M:%S]"
+    )
+    stream_handler = logging.StreamHandler(stream=sys.stdout)
+    stream_handler.setFormatter(fmt)
+    return stream_handler
+
+
+def _start_listener():
+    # Records are written to stdout by a single background thread, callers
+    # only put them on a queue.
+    global _listener, _ring_buffer
+    if _listener:
+        return
+
+    _listener = QueueListener(_log_queue, _stream_handler(), respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    options = config.get('logging', {})
+    if options.get('ringBuffer'):
+        # Without a level of its own it keeps what the loggers let through.
+        _ring_buffer = RingBufferHandler(options['ringBuffer'], _parse_level(options.get('ringBufferLevel')) or logging.NOTSET)
+
+
+def dump_recent_logs():
+    if not _ring_buffer:
+        return
+
+    handler = QueueHandler(_log_queue)
+    header = logging.LogRecord('logger', logging.ERROR, __file__, 0, '--- recent log records ---', None, None)
+    handler.handle(header)
+    _ring_buffer.dump(handler)
+
 
 def get_logger(logger_name, log_level=logging.INFO):
     logger = logging.getLogger(logger_name)
+    options = config.get('logging', {})
+    level = _parse_level(options.get('levels', {}).get(logger_name) or options.get('level') or log_level)
 
-    if not logger.hasHandlers():
-        fmt = logging.Formatter(
-            fmt="%(asctime)-11s %(name)s:%(lineno)d %(levelname)s: %(message)s", 
-            datefmt="[%Y/%m/%d-%H:%M:%S]"
-        )
-        stream_handler = logging.StreamHandler(stream=sys.stdout)
-        stream_handler.setFormatter(fmt)
+    if not logger.handlers:
+        _start_listener()
+        queue_handler = QueueHandler(_log_queue)
+        queue_handler.setLevel(level)
+        logger.addHandler(queue_handler)
+        if _ring_buffer:
+            logger.addHandler(_ring_buffer)
+        # Root handlers, such as tornado's, would write synchronously again.
+        logger.propagate = False
 
-        logger.addHandler(stream_handler)
-
-    logger.setLevel(log_level)
+    # Records below the configured level are only created for a ring buffer
+    # with a lower level, the queue handler still filters on the configured one.
+    logger.setLevel(min(level, _ring_buffer.level) if _ring_buffer and _ring_buffer.level else level)
 
     return logger
+
+
+def get_rate_limited_logger(logger_name, interval=10):
+    return RateLimitedLogger(get_logger(logger_name), interval)
@@ -0,0 +1,106 @@
+import os
+import gzip
+import json
+import hashlib
+
+MANIFEST_FILE = 'manifest.json'
+
+# Columns and the query of every exported table at a cut height. Outputs
+# spent after the cut are unspent at it, so they go back into utxos.
+SNAPSHOT_TABLES = {
+    'blocks': (
+        ['block_hash', 'prev_hash', 'block_height', 'epoch', 'slot'],
+        'SELECT block_hash, prev_hash, block_height, epoch, slot FROM blocks '
+        'WHERE block_height BETWEEN %(low)s AND %(high)s'
+    ),
+    'tx_records': (
+        ['hash', 'block_num', 'block_hash', 'time', 'tx_state', 'tx_ordinal', 'last_update', 'tx_body'],
+        'SELECT hash, block_num, block_hash, time, tx_state, tx_ordinal, last_update, tx_body '
+        'FROM tx_records WHERE block_num BETWEEN %(low)s AND %(high)s'
+    ),
+    'tx_inputs': (
+        ['tx_hash', 'idx', 'src_tx', 'src_idx', 'address_id', 'amount'],
+        'SELECT i.tx_hash, i.idx, i.src_tx, i.src_idx, i.address_id, i.amount '
+        'FROM tx_inputs i JOIN tx_records t ON t.hash = i.tx_hash '
+        'WHERE t.block_num BETWEEN %(low)s AND %(high)s'
+    ),
+    'tx_outputs': (
+        ['tx_hash', 'idx', 'address_id', 'amount'],
+        'SELECT o.tx_hash, o.idx, o.address_id, o.amount '
+        'FROM tx_outputs o JOIN tx_records t ON t.hash = o.tx_hash '
+        'WHERE t.block_num BETWEEN %(low)s AND %(high)s'
+    ),
+    # Not kept by height, the whole table goes into the first chunk.
+    'addresses': (
+        ['id', 'address'],
+        'SELECT id, address FROM addresses WHERE %(low)s = 0'
+    ),
+    'utxos': (
+        ['utxo_id', 'tx_hash', 'tx_index', 'receiver', 'amount', 'block_num'],
+        'SELECT utxo_id, tx_hash, tx_index, receiver, amount, block_num FROM utxos '
+        'WHERE block_num BETWEEN %(low)s AND %(high)s '
+        'UNION ALL '
+        'SELECT utxo_id, tx_hash, tx_index, receiver, amount, block_num FROM utxos_backup '
+        'WHERE block_num BETWEEN %(low)s AND %(high)s AND deleted_block_num > %(height)s'
+    ),
+    'utxos_backup': (
+        ['utxo_id', 'tx_hash', 'tx_index', 'receiver', 'amount', 'block_num', 'deleted_block_num'],
+        'SELECT utxo_id, tx_hash, tx_index, receiver, amount, block_num, deleted_block_num FROM utxos_backup '
+        'WHERE block_num BETWEEN %(low)s AND %(high)s AND deleted_block_num <= %(height)s'
+    ),
+}
+
+
+class HashingWriter:
+    """File wrapper computing the sha256 of what is written through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+
+def chunk_ranges(height: int, chunk_blocks: int):
+    # Genesis utxos are stored at block 0, so ranges start there.
+    return [(low, min(low + chunk_blocks - 1, height)) for low in range(0, height + 1, chunk_blocks)]
+
+
+def chunk_file_name(table: str, index: int):
+    return f'{table}-{index:05d}.csv.gz'
+
+
+def write_chunk(path: str, copy):
+    """Gzips what `copy` writes into the file, returns its size and sha256."""
+    with open(path, 'wb') as raw:
+        writer = HashingWriter(raw)
+        with gzip.GzipFile(fileobj=writer, mode='wb', compresslevel=6) as f:
+            copy(f)
+
+    return writer.size, writer.sha256.hexdigest()
+
+
+def file_sha256(path: str):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
+def write_manifest(directory: str, manifest: dict):
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def read_manifest(directory: str):
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        return json.load(f)
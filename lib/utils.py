@@ -1,14 +1,11 @@
-import base58
-import base64
-import binascii
-from cbor import cbor
+from lib.cbor_codec import codec
+from lib import address as address_codec
 from operator import itemgetter
-from hashlib import blake2b, sha3_256
+from hashlib import blake2b
 
 
 def generate_utxo_hash(address):
-    data = base58.b58decode(address)
-    return blake2b(data, digest_size=32).hexdigest()
+    return address_codec.address_hash(address)
 
 
 def get_utxo_id(input):
@@ -74,28 +71,18 @@ def decoded_tx_to_base(decoded_tx):
     raise Exception('invalid decoded tx structure: %s' % decoded_tx)
 
 
-class CborIndefiniteLengthArray:
-
-    def __call__(self, elements):
-        ret = [bytes([0x9f])]
-        for e in elements:
-            ret.append(cbor.dumps(e))
-        ret.append(bytes([0xff]))
-
-        return ret
-
-
 def pack_raw_txid_and_body(decoded_tx_body):
     if not decoded_tx_body:
         raise Exception('can not decode empty tx!')
 
     try:
         inputs, outputs, attributes = decoded_tx_to_base(decoded_tx_body)
-        cbor_indef_array = CborIndefiniteLengthArray()
-        enc = cbor.dumps([
-            cbor_indef_array(inputs),
-            cbor_indef_array(outputs),
-            attributes,
+        # Inputs and outputs are indefinite-length arrays on chain, the tx id
+        # is the hash of exactly these bytes.
+        enc = codec.dumps_array([
+            codec.dumps_indefinite_array(inputs),
+            codec.dumps_indefinite_array(outputs),
+            codec.dumps(attributes),
         ])
         tx_id = blake2b(enc, digest_size=32).hexdigest()
         tx_body = enc.hex()
@@ -111,16 +98,16 @@ def convert_raw_tx_to_obj(tx: list, extraData: dict):
     inputs, outputs, witnesses = [], [], []
     for inp in tx_inputs:
         types, tagged = inp
-        input_tx_id, idx = cbor.loads(tagged.value)
+        input_tx_id, idx = codec.loads(tagged.value)
         inputs.append({'type': types, 'txId': input_tx_id.hex(), 'idx': idx})
 
-    for out in tx_outputs:
-        address, value = out
-        outputs.append({'address': base58.b58encode(cbor.dumps(address)), 'value': value})
+    addresses = address_codec.encode_addresses([out[0] for out in tx_outputs])
+    for address, out in zip(addresses, tx_outputs):
+        outputs.append({'address': address, 'value': out[1]})
 
     for wit in tx_witnesses:
         types, tagged = wit
-        witnesses.append({'type': types, 'sign': cbor.loads(tagged.value)})
+        witnesses.append({'type': types, 'sign': codec.loads(tagged.value)})
 
     ret = {
         'id': tx_id,
@@ -135,21 +122,6 @@ def convert_raw_tx_to_obj(tx: list, extraData: dict):
 
 
 def header_to_id(header, tx_type: int):
-    header_data = cbor.dumps([tx_type, header])
+    header_data = codec.dumps([tx_type, header])
     return blake2b(header_data, digest_size=32).hexdigest()
 
-
-def redeem_key_to_address(public_redeem_key):
-    pk = base64.urlsafe_b64decode(public_redeem_key)
-
-    addr = [2, [2, pk], {}]
-    addr_hash = blake2b(sha3_256(cbor.dumps(addr, sort_keys=True)).digest(), digest_size=28).digest()
-
-    tag = cbor.dumps([addr_hash, {}, 2], sort_keys=True)
-
-    address = cbor.dumps([
-        cbor.Tag(24, tag),
-        binascii.crc32(tag)
-    ])
-
-    return base58.b58encode(address).decode()
@@ -0,0 +1,49 @@
+from lib.cbor_codec import codec
+from hashlib import blake2b, sha3_256
+from nacl.signing import VerifyKey
+from nacl.exceptions import BadSignatureError
+
+# Witness and address types of Byron: public key, script and redeem.
+PK_WITNESS = 0
+REDEEM_WITNESS = 2
+# Signatures cover a tag of what is signed, the protocol magic and the tx id.
+SIGN_TAGS = {PK_WITNESS: b'\x01', REDEEM_WITNESS: b'\x02'}
+
+
+class InvalidWitness(Exception):
+    """The tx can not be valid on chain, it is rejected without asking the bridge."""
+
+
+def address_root(address_type: int, public_key: bytes, addr_attr):
+    # Canonical cbor: map keys of the attributes sorted.
+    spending_data = codec.dumps([address_type, [address_type, public_key], addr_attr], canonical=True)
+    return blake2b(sha3_256(spending_data).digest(), digest_size=28).digest()
+
+
+def sign_data(witness_type: int, protocol_magic: int, tx_id: str):
+    return SIGN_TAGS[witness_type] + codec.dumps(protocol_magic) + codec.dumps(bytes.fromhex(tx_id))
+
+
+def check_address_root(index: int, witness_type: int, public_key: bytes, decoded_address: dict):
+    address_type = decoded_address['address_type']
+    if address_type != witness_type:
+        raise InvalidWitness(f'witness {index} of type {witness_type} can not spend an address of type {address_type}')
+
+    expected_root = address_root(address_type, public_key, decoded_address['addr_attr'])
+    if decoded_address['address_root'] != expected_root:
+        raise InvalidWitness(
+            f'witness {index} does not match the address: {decoded_address["address_root"].hex()} != {expected_root.hex()}'
+        )
+
+
+def verify_signatures(signatures: list):
+    """
+    Verifies (index, public_key, data, signature) tuples and raises on the
+    first bad one. Run in a worker thread, PyNaCl releases the GIL.
+    """
+    for index, public_key, data, signature in signatures:
+        try:
+            # Extended public keys carry the chain code after the key.
+            VerifyKey(public_key[:32]).verify(data, signature)
+        except (BadSignatureError, ValueError, TypeError):
+            raise InvalidWitness(f'witness {index} signature is invalid')
@@ -0,0 +1,83 @@
+from config import config
+from lib import analytics, utils
+from lib.logger import get_logger
+from constants.scheduler import ROLLBACK_BLOCKS_COUNT
+from tornado.ioloop import IOLoop
+
+
+class AnalyticsExport:
+    """
+    Collects the blocks, txs, inputs and outputs processed by the importer
+    per epoch, and writes each epoch to parquet files once it can no longer
+    be rolled back. Analytics then run off these files instead of the
+    database serving the importer and the api.
+    """
+
+    def __init__(self):
+        self.logger = get_logger('analytics-export')
+        if not analytics.is_available():
+            raise Exception('analytics export requires pyarrow')
+
+        self.dir = config['analyticsExport']['dir']
+        self.epochs = {}
+        # Epoch of the last processed block, the next epoch is only complete
+        # when its first block comes after it.
+        self.last_epoch = None
+        self.pending_write = None
+
+    @staticmethod
+    def is_enabled():
+        return bool(config.get('analyticsExport', {}).get('dir'))
+
+    def add_block(self, block, txs_inputs: dict):
+        if block.is_EBB:
+            return
+
+        rows = self.epochs.get(block.epoch)
+        if rows is None:
+            is_complete = block.height == 1 or (self.last_epoch is not None and self.last_epoch < block.epoch)
+            rows = self.epochs[block.epoch] = analytics.EpochRows(block.epoch, is_complete)
+
+        self.last_epoch = block.epoch
+        rows.add_block(block.hash, block.prev_hash, block.height, block.slot, [{
+            'id': tx['id'],
+            'txOrdinal': tx['txOrdinal'],
+            'txTime': tx['txTime'],
+            'inputs': txs_inputs[tx['id']],
+            'outputs': [(utils.fix_long_address(out['address']), out['value']) for out in tx['outputs']],
+        } for tx in block.txs or []])
+
+    def rollback(self, height: int, epoch: int):
+        for rows_epoch, rows in list(self.epochs.items()):
+            rows.truncate(height)
+            if rows.last_height is None:
+                del self.epochs[rows_epoch]
+        self.last_epoch = epoch
+
+    async def flush(self, stored_height: int):
+        """Writes the epochs that ended more than the rollback window below the stored tip."""
+        final_epochs = [
+            epoch for epoch, rows in self.epochs.items()
+            if epoch < self.last_epoch and rows.last_height <= stored_height - ROLLBACK_BLOCKS_COUNT
+        ]
+        for epoch in sorted(final_epochs):
+            rows = self.epochs.pop(epoch)
+            if not rows.is_complete:
+                self.logger.warning('epoch %d was imported across a restart, export it with commands.analytics_backfill', epoch)
+                continue
+
+            # One epoch is written at a time in the background, the importer
+            # only waits when the previous one is not done yet.
+            await self.wait()
+            self.pending_write = (epoch, IOLoop.current().run_in_executor(None, analytics.write_epoch, self.dir, rows))
+
+    async def wait(self):
+        if not self.pending_write:
+            return
+
+        (epoch, future), self.pending_write = self.pending_write, None
+        try:
+            path = await future
+            self.logger.info('epoch %d exported to %s', epoch, path)
+        except Exception:
+            self.logger.exception('failed to export epoch %d, export it with commands.analytics_backfill', epoch)
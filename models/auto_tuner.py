@@ -0,0 +1,161 @@
+import math
+from time import time
+from collections import deque
+from config import config
+from lib.logger import get_logger
+from models.block import SLOTS_IN_EPOCH
+from constants.scheduler import *
+
+# Tuned values and their static defaults.
+TUNED_DEFAULTS = {
+    'blocksCacheSize': BLOCKS_CACHE_SIZE,
+    'maxBlocksPerLoop': MAX_BLOCKS_PER_LOOP,
+    'epochDownloadThreshold': EPOCH_DOWNLOAD_THRESHOLD,
+    'checkTipSeconds': CHECK_TIP_SECONDS,
+}
+
+
+class AutoTuner:
+    """
+    Batch sizes and intervals of the importer, moved within their bounds
+    after the measured flush latency, sync rates and database write rates.
+    Every change keeps its reason. Values overridden over the admin
+    endpoint stay within the same bounds and are used until the override
+    is cleared.
+    """
+
+    def __init__(self):
+        self.logger = get_logger('auto-tuner')
+        options = config.get('autoTune', {})
+        self.is_enabled = options.get('enabled', False)
+        bounds = options.get('bounds', {})
+        self.settings = {}
+        for name, default in TUNED_DEFAULTS.items():
+            low, high = bounds.get(name, AUTO_TUNE_BOUNDS[name])
+            self.settings[name] = {
+                'value': default,
+                'min': low,
+                'max': high,
+                'override': None,
+                'reason': 'default',
+            }
+        # Moving averages, None until measured.
+        self.metrics = {
+            'flush_seconds': None,
+            'block_write_rate': None,
+            'tx_write_rate': None,
+            'epoch_sync_rate': None,
+            'block_sync_rate': None,
+        }
+        self.changes = deque(maxlen=AUTO_TUNE_HISTORY_SIZE)
+
+    def get(self, name: str):
+        setting = self.settings[name]
+        return setting['value'] if setting['override'] is None else setting['override']
+
+    def stats(self):
+        return {
+            'enabled': self.is_enabled,
+            'values': {name: self.get(name) for name in self.settings},
+            'settings': self.settings,
+            'metrics': self.metrics,
+            'changes': list(self.changes),
+        }
+
+    def measure(self, metric: str, value: float):
+        average = self.metrics[metric]
+        self.metrics[metric] = value if average is None else average + AUTO_TUNE_EWMA_ALPHA * (value - average)
+
+    def clamp(self, name: str, value):
+        setting = self.settings[name]
+        return min(max(type(setting['value'])(value), setting['min']), setting['max'])
+
+    def set_value(self, name: str, value, reason: str):
+        setting = self.settings[name]
+        value = self.clamp(name, value)
+        old_value = setting['value']
+        # Small moves are noise of the measurements.
+        if value == old_value or abs(value - old_value) < AUTO_TUNE_MIN_CHANGE * max(abs(old_value), 1):
+            return
+
+        setting['value'], setting['reason'] = value, reason
+        self.changes.append({'time': time(), 'name': name, 'old': old_value, 'new': value, 'reason': reason})
+        self.logger.info('%s: %s -> %s, %s', name, old_value, value, reason)
+
+    def override(self, values: dict):
+        """
+        Applies {name: value} overrides clamped to the bounds, a None value
+        clears the override. Nothing is applied if any value is invalid.
+        """
+        overrides = {}
+        for name, value in values.items():
+            if name not in self.settings:
+                raise ValueError(f'unknown setting: {name}')
+            if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)):
+                raise ValueError(f'{name} must be a finite number or null')
+
+            overrides[name] = None if value is None else self.clamp(name, value)
+
+        for name, value in overrides.items():
+            setting = self.settings[name]
+            old_value = self.get(name)
+            setting['override'] = value
+            reason = 'override cleared' if value is None else 'overridden over the admin endpoint'
+            self.changes.append({'time': time(), 'name': name, 'old': old_value, 'new': self.get(name), 'reason': reason})
+            self.logger.info('%s: %s -> %s, %s', name, old_value, self.get(name), reason)
+
+    def record_flush(self, blocks: int, txs: int, seconds: float):
+        """A commit of cached blocks, and the txs of the last one."""
+        seconds = max(seconds, 1e-6)
+        self.measure('flush_seconds', seconds)
+        if txs:
+            self.measure('tx_write_rate', txs / seconds)
+            return
+        # A single block is mostly the cost of the commit.
+        if blocks < 2:
+            return
+
+        self.measure('block_write_rate', blocks / seconds)
+        if self.is_enabled:
+            rate = self.metrics['block_write_rate']
+            self.set_value(
+                'blocksCacheSize', rate * AUTO_TUNE_FLUSH_SECONDS,
+                f'empty blocks are written at {rate:.0f} blocks/s, a flush is sized to {AUTO_TUNE_FLUSH_SECONDS}s'
+            )
+
+    def record_sync(self, is_epochs: bool, blocks: int, seconds: float):
+        """Blocks imported by the epoch pipeline or one by one, and the time it took."""
+        if blocks <= 0:
+            return
+
+        self.measure('epoch_sync_rate' if is_epochs else 'block_sync_rate', blocks / max(seconds, 1e-6))
+        if not self.is_enabled:
+            return
+
+        block_rate, epoch_rate = self.metrics['block_sync_rate'], self.metrics['epoch_sync_rate']
+        if not is_epochs:
+            self.set_value(
+                'maxBlocksPerLoop', block_rate * AUTO_TUNE_LOOP_SECONDS,
+                f'blocks are synced at {block_rate:.1f} blocks/s, a loop is sized to {AUTO_TUNE_LOOP_SECONDS}s'
+            )
+        if block_rate and epoch_rate:
+            # A whole epoch pays off while it imports faster than the blocks
+            # left in it one by one: slot < slots * (1 - block rate / epoch rate).
+            self.set_value(
+                'epochDownloadThreshold', SLOTS_IN_EPOCH * (1 - block_rate / epoch_rate),
+                f'epochs are synced at {epoch_rate:.1f} blocks/s, single blocks at {block_rate:.1f} blocks/s'
+            )
+
+    def record_loop(self, blocks: int, is_caught_up: bool):
+        """New blocks found by a sync loop that reached the node tip."""
+        if not self.is_enabled or not is_caught_up:
+            return
+
+        interval = self.settings['checkTipSeconds']['value']
+        if blocks > 1:
+            self.set_value('checkTipSeconds', interval / 2, f'{blocks} new blocks in one loop at the tip')
+        elif not blocks:
+            self.set_value('checkTipSeconds', interval * 1.5, 'no new block in the last loop')
+
+
+auto_tuner = AutoTuner()
@@ -0,0 +1,43 @@
+from lib.cache import TTLCache
+from lib.event_bus import event_bus
+from constants.api import BALANCE_CACHE_SIZE, BALANCE_CACHE_TTL
+from constants.events import EVENT_BLOCK_APPLIED, EVENT_ROLLBACK, EVENT_TX_STATE
+
+
+class Balances:
+
+    def __init__(self):
+        self.cache = TTLCache(BALANCE_CACHE_SIZE, BALANCE_CACHE_TTL)
+        event_bus.add_listener(self.on_event)
+
+    def on_event(self, event: dict):
+        if event['type'] == EVENT_ROLLBACK:
+            self.cache.clear()
+        elif event['type'] in (EVENT_BLOCK_APPLIED, EVENT_TX_STATE):
+            for address in event.get('addresses', []):
+                self.cache.delete(address)
+
+    async def get(self, db, addresses: list):
+        ret, missing = {}, []
+        for address in addresses:
+            balance = self.cache.get(address)
+            if balance is None:
+                missing.append(address)
+            else:
+                ret[address] = balance
+
+        if missing:
+            rows = await db.get_balances(missing)
+            for address in missing:
+                row = rows.get(address)
+                balance = {
+                    'balance': row['balance'] if row else 0,
+                    'utxo_count': row['utxo_count'] if row else 0,
+                }
+                self.cache.set(address, balance)
+                ret[address] = balance
+
+        return ret
+
+
+balances = Balances()
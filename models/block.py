@@ -1,5 +1,5 @@
 from lib import utils
-from cbor import cbor
+from lib.cbor_codec import codec
 from datetime import datetime
 
 SLOTS_IN_EPOCH = 21600
@@ -18,6 +18,7 @@ class Block:
     def serialize(self):
         return {
           'block_hash': self.hash,
+          'prev_hash': self.prev_hash,
           'epoch': self.epoch,
           'slot': self.slot,
           'block_height': self.height,
@@ -59,7 +60,7 @@ class Block:
 
     @staticmethod 
     def parse_block(blob: bytes, handle_regular_block: int):
-        block_type, _ = cbor.loads(blob)
+        block_type, _ = codec.loads(blob)
         header, body, attrib = _
         hashs = utils.header_to_id(header, block_type)
         common = {
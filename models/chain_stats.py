@@ -0,0 +1,169 @@
+from array import array
+from bisect import bisect_right
+from config import config
+from lib import utils
+from lib.logger import get_logger
+from models.watched_addresses import WatchedAddresses
+from constants.scheduler import CHAIN_STATS_BATCH_BLOCKS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Per tx columns summed up per block.
+TX_SUM_COLUMNS = ['input_count', 'output_count', 'input_total', 'output_total', 'tx_bytes']
+
+
+def aggregate_blocks(block_count: int, tx_block, columns: dict):
+    """
+    Sums the tx columns per block and finds the tx with the largest output
+    total of each block. `tx_block` is the sorted block index of every tx.
+    Returns the per block columns, plus tx_count and largest, the index of
+    the largest tx or -1 for blocks without txs.
+    """
+    if np is None:
+        result = {column: [0] * block_count for column in TX_SUM_COLUMNS + ['tx_count']}
+        result['largest'] = [-1] * block_count
+        for index, block in enumerate(tx_block):
+            result['tx_count'][block] += 1
+            for column in TX_SUM_COLUMNS:
+                result[column][block] += columns[column][index]
+            largest = result['largest'][block]
+            if largest < 0 or columns['output_total'][index] >= columns['output_total'][largest]:
+                result['largest'][block] = index
+        return result
+
+    tx_block = np.frombuffer(tx_block, dtype=np.int64)
+    result = {column: np.zeros(block_count, dtype=np.int64) for column in TX_SUM_COLUMNS + ['tx_count']}
+    result['largest'] = np.full(block_count, -1, dtype=np.int64)
+    if len(tx_block):
+        # Txs come in block order, every block with txs is one segment.
+        starts = np.flatnonzero(np.diff(tx_block, prepend=-1))
+        blocks = tx_block[starts]
+        result['tx_count'][blocks] = np.diff(np.append(starts, len(tx_block)))
+        for column in TX_SUM_COLUMNS:
+            result[column][blocks] = np.add.reduceat(np.frombuffer(columns[column], dtype=np.int64), starts)
+        # Sorted by block, then output total: the last tx of a segment is the largest.
+        order = np.lexsort((np.frombuffer(columns['output_total'], dtype=np.int64), tx_block))
+        result['largest'][blocks] = order[np.append(starts[1:], len(tx_block)) - 1]
+
+    return {column: values.tolist() for column, values in result.items()}
+
+
+class ChainStats:
+    """
+    Collects the numbers of the processed txs into array buffers and writes
+    block_stats and epoch_stats from them in batches: every
+    CHAIN_STATS_BATCH_BLOCKS blocks, at the end of an epoch and at the end of
+    every sync loop.
+    """
+
+    def __init__(self, db):
+        self.logger = get_logger('chain-stats')
+        self.db = db
+        self.reset()
+        self.epoch = None
+        # First height of every address seen in the epoch, rollbacks drop the
+        # addresses first seen above the rollback height.
+        self.addresses = {}
+        self.is_addresses_complete = False
+
+    @staticmethod
+    def is_enabled():
+        return config.get('chainStats', {}).get('enabled', False)
+
+    def reset(self):
+        self.blocks = {column: array('q') for column in ['block_height', 'slot']}
+        self.block_hashes = []
+        self.tx_block = array('q')
+        self.txs = {column: array('q') for column in TX_SUM_COLUMNS}
+        self.tx_hashes = []
+
+    async def load_addresses(self, epoch: int, block_height: int):
+        self.epoch = epoch
+        # In filter mode tx_addresses only has the txs of watched addresses.
+        self.is_addresses_complete = not WatchedAddresses.is_enabled()
+        self.addresses = await self.db.get_epoch_address_heights(epoch, block_height) if self.is_addresses_complete else {}
+
+    async def resume(self, best_block_num: dict):
+        if best_block_num['hash']:
+            await self.load_addresses(best_block_num['epoch'], best_block_num['height'])
+
+    async def add_block(self, block, txs_inputs: dict):
+        if block.is_EBB:
+            return
+
+        if block.epoch != self.epoch:
+            await self.flush()
+            self.is_addresses_complete = block.height == 1 or (self.epoch is not None and self.epoch < block.epoch)
+            self.epoch, self.addresses = block.epoch, {}
+
+        block_index = len(self.block_hashes)
+        self.blocks['block_height'].append(block.height)
+        self.blocks['slot'].append(block.slot)
+        self.block_hashes.append(block.hash)
+        for tx in block.txs or []:
+            inputs = txs_inputs[tx['id']]
+            outputs = [(utils.fix_long_address(out['address']), int(out['value'])) for out in tx['outputs']]
+            self.tx_block.append(block_index)
+            self.tx_hashes.append(tx['id'])
+            self.txs['input_count'].append(len(inputs))
+            self.txs['output_count'].append(len(outputs))
+            self.txs['input_total'].append(sum(int(utxo['amount']) for utxo in inputs))
+            self.txs['output_total'].append(sum(amount for _, amount in outputs))
+            self.txs['tx_bytes'].append(len(tx['txBody']) // 2)
+            for address in [utxo['address'] for utxo in inputs] + [address for address, _ in outputs]:
+                self.addresses.setdefault(address, block.height)
+
+        if len(self.block_hashes) >= CHAIN_STATS_BATCH_BLOCKS:
+            await self.flush()
+
+    def block_stats(self):
+        block_count = len(self.block_hashes)
+        stats = aggregate_blocks(block_count, self.tx_block, self.txs)
+        rows = []
+        for index in range(block_count):
+            largest = stats['largest'][index]
+            rows.append({
+                'block_height': self.blocks['block_height'][index],
+                'epoch': self.epoch,
+                'slot': self.blocks['slot'][index],
+                'tx_count': stats['tx_count'][index],
+                'input_count': stats['input_count'][index],
+                'output_count': stats['output_count'][index],
+                'output_total': stats['output_total'][index],
+                'fee_total': stats['input_total'][index] - stats['output_total'][index],
+                'tx_bytes': stats['tx_bytes'][index],
+                'largest_tx_hash': self.tx_hashes[largest] if largest >= 0 else None,
+                'largest_tx_output': self.txs['output_total'][largest] if largest >= 0 else None,
+            })
+        return rows
+
+    async def flush(self):
+        if self.epoch is None:
+            return
+
+        rows = self.block_stats()
+        with self.db.transaction():
+            await self.db.save_block_stats(rows)
+            await self.db.update_epoch_stats(self.epoch, len(self.addresses) if self.is_addresses_complete else None)
+        self.reset()
+        self.logger.debug('stats of %d blocks in epoch %d saved', len(rows), self.epoch)
+
+    async def rollback(self, block_height: int, epoch: int):
+        """Drops what was collected above the height, rows in the database are deleted by the scheduler."""
+        block_cut = bisect_right(self.blocks['block_height'], block_height)
+        tx_cut = bisect_right(self.tx_block, block_cut - 1)
+        for values in self.blocks.values():
+            del values[block_cut:]
+        del self.block_hashes[block_cut:]
+        for values in list(self.txs.values()) + [self.tx_block]:
+            del values[tx_cut:]
+        del self.tx_hashes[tx_cut:]
+
+        if epoch == self.epoch:
+            self.addresses = {address: height for address, height in self.addresses.items() if height <= block_height}
+        else:
+            await self.load_addresses(epoch, block_height)
+        await self.flush()
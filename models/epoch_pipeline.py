@@ -0,0 +1,134 @@
+import asyncio
+from config import config
+from lib.logger import get_logger
+from models.parser import parse_epoch_blocks
+from models.auto_tuner import auto_tuner
+from concurrent.futures import ProcessPoolExecutor
+from constants.scheduler import *
+
+
+class MemoryBudget:
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, size: int):
+        async with self.condition:
+            # An epoch bigger than the whole budget is still let through once
+            # nothing else is held, otherwise the pipeline would dead lock.
+            await self.condition.wait_for(lambda: not self.used or self.used + size <= self.limit)
+            self.used += size
+
+    async def resize(self, held: int, size: int):
+        """Changes a held amount, a larger one waits like acquire()."""
+        async with self.condition:
+            await self.condition.wait_for(
+                lambda: size <= held or self.used == held or self.used - held + size <= self.limit
+            )
+            self.used += size - held
+            self.condition.notify_all()
+
+    async def release(self, size: int):
+        async with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+class EpochPipeline:
+    """
+    Catch-up over stable epochs: epoch N + 2 is downloaded while N + 1 is parsed
+    in worker processes and N is written to the database. Epochs are always
+    handed to the writer in strict order.
+    """
+
+    def __init__(self, http_bridge, process_blocks):
+        self.logger = get_logger('epoch-pipeline')
+        self.http_bridge = http_bridge
+        self.process_blocks = process_blocks
+        options = config.get('epochPipeline', {})
+        self.queue_size = options.get('queueSize', EPOCH_PIPELINE_QUEUE_SIZE)
+        self.parse_workers = options.get('parseWorkers', EPOCH_PIPELINE_PARSE_WORKERS)
+        self.budget = MemoryBudget(options.get('memoryBudget', EPOCH_PIPELINE_MEMORY_BUDGET))
+
+    async def download(self, epoch_ids, downloaded: asyncio.Queue):
+        # Raw bytes plus the estimated size of the parsed blocks. The download
+        # itself is held in memory, so an estimate is taken from the budget
+        # before it and corrected once the real size is known.
+        estimate = EPOCH_SIZE_ESTIMATE * (1 + PARSED_EPOCH_MEMORY_FACTOR)
+        for epoch_id in epoch_ids:
+            await self.budget.acquire(estimate)
+            try:
+                data = await self.http_bridge.get_raw_epoch_by_id(epoch_id)
+                size = len(data) * (1 + PARSED_EPOCH_MEMORY_FACTOR)
+                await self.budget.resize(estimate, size)
+            except BaseException:
+                await self.budget.release(estimate)
+                raise
+
+            estimate = size
+            self.logger.info('epoch %s downloaded: %d bytes', epoch_id, len(data))
+            await downloaded.put((epoch_id, data, size))
+
+        await downloaded.put(None)
+
+    async def parse(self, executor, downloaded: asyncio.Queue, parsed: asyncio.Queue):
+        loop = asyncio.get_event_loop()
+        while True:
+            item = await downloaded.get()
+            if item is None:
+                break
+
+            epoch_id, data, size = item
+            future = loop.run_in_executor(executor, parse_epoch_blocks, data, {'omitEbb': True})
+            # Futures are queued in epoch order, so parallel workers can not
+            # reorder what the writer sees.
+            await parsed.put((epoch_id, future, size))
+
+        await parsed.put(None)
+
+    async def write(self, parsed: asyncio.Queue, height: int):
+        while True:
+            item = await parsed.get()
+            if item is None:
+                return STATUS_BLOCK_PROCESSED
+
+            epoch_id, future, size = item
+            try:
+                blocks = await future
+                self.logger.info(f'process epoch of: {epoch_id} in height: {height}')
+                blocks = [block for block in blocks if block.height > height]
+                # Runs of blocks are written in one transaction each, their
+                # inputs resolved at once.
+                batch_blocks = max(auto_tuner.get('blocksCacheSize'), 1)
+                for start in range(0, len(blocks), batch_blocks):
+                    status = await self.process_blocks(blocks[start:start + batch_blocks])
+                    if status == STATUS_ROLLBACK_REQUIRED:
+                        return status
+            finally:
+                await self.budget.release(size)
+
+    async def run(self, epoch_ids, height: int):
+        downloaded = asyncio.Queue(maxsize=self.queue_size)
+        parsed = asyncio.Queue(maxsize=self.queue_size)
+        with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+            tasks = [
+                asyncio.ensure_future(self.download(epoch_ids, downloaded)),
+                asyncio.ensure_future(self.parse(executor, downloaded, parsed)),
+            ]
+            writer = asyncio.ensure_future(self.write(parsed, height))
+            try:
+                pending = set(tasks + [writer])
+                # The writer may stop early on a rollback while upstream stages
+                # still wait on full queues, so only the writer is awaited to the end.
+                while writer in pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception():
+                            raise task.exception()
+
+                return writer.result()
+            finally:
+                for task in tasks + [writer]:
+                    task.cancel()
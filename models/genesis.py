@@ -5,7 +5,7 @@ from lib import utils
 from models.network import Network
 # from models.http_bridge import HttpBridge
 from lib.logger import get_logger
-from lib.utils import redeem_key_to_address
+from lib.address import redeem_key_to_address
 
 
 class Genesis:
@@ -17,8 +17,7 @@ class Genesis:
     def non_avvm_balances_to_utxos(self, non_avvm_balances):
         self.logger.info('convert non avvm balances to utxos.')
         ret = []
-        for non_avvm in non_avvm_balances:
-            amount, receiver_addr = non_avvm
+        for receiver_addr, amount in non_avvm_balances.items():
             utxo_hash = utils.generate_utxo_hash(receiver_addr)
             utxo = utils.struct_utxo(receiver_addr, amount, utxo_hash)
             ret.append(utxo)
@@ -2,7 +2,7 @@ import json
 from urllib.parse import urljoin
 from models.network import Network
 from models.parser import Parser
-from lib.logger import get_logger
+from lib.logger import get_logger, get_rate_limited_logger
 from tornado.httpclient import AsyncHTTPClient, HTTPClientError
 
 
@@ -13,10 +13,11 @@ class HttpBridge:
         self.parser = Parser()
         self.client = AsyncHTTPClient()
         self.logger = get_logger('http-bridge')
+        self.sampled_logger = get_rate_limited_logger('http-bridge')
 
     async def get(self, path: str, params={}):
         endpoint_url = urljoin(self.network_url, path)
-        self.logger.info('GET %s params: %s', endpoint_url, params)
+        self.sampled_logger.info('GET %s', endpoint_url)
         try:
             resp = await self.client.fetch(endpoint_url, method='GET')
             return resp
@@ -28,7 +29,7 @@ class HttpBridge:
 
     async def post(self, path: str, data: str):
         endpoint_url = urljoin(self.network_url, path)
-        self.logger.info('POST %s data: %s', endpoint_url, data)
+        self.logger.debug('POST %s data: %d bytes', endpoint_url, len(data))
         try:
             resp = await self.client.fetch(endpoint_url, method='POST', body=data)
             return resp
@@ -59,8 +60,8 @@ class HttpBridge:
         return resp
 
     async def get_block(self, id: str): 
-        resp = await self.get_json(f'block/{id}')
-        return resp
+        resp = await self.get(f'block/{id}')
+        return self.parser.parse_block(resp.body)
 
     async def get_genesis(self, hash: str): 
         return await self.get_json(f'genesis/{hash}')
@@ -73,6 +74,10 @@ class HttpBridge:
         resp = await self.get(f'height/{height}')
         return self.parser.parse_block(resp.body)
 
+    async def get_raw_epoch_by_id(self, epoch_id: int):
+        resp = await self.get(f'epoch/{epoch_id}')
+        return resp.body
+
     async def get_parsed_epoch_by_id(self, epoch_id: int, is_omit_ebb=False):
         resp = await self.get(f'epoch/{epoch_id}')
         blocks_iterator = self.parser.parse_epoch(resp.body, {'omitEbb': is_omit_ebb})
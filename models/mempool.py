@@ -0,0 +1,142 @@
+from time import monotonic
+from lib import utils
+from lib.logger import get_logger
+from constants.transaction import PENDING_TX_TTL
+
+
+class Mempool:
+    """
+    In-memory view of the txs accepted by the API but not yet in a block:
+    which utxos they spend and which outputs they create. Conflicting
+    submissions are rejected here, and chained spends of pending outputs can
+    be validated, without going to the database or the bridge.
+    """
+
+    def __init__(self, ttl=PENDING_TX_TTL):
+        self.logger = get_logger('mempool')
+        self.ttl = ttl
+        self.txs = {}
+        self.spent_inputs = {}
+        self.outputs = {}
+
+    def __len__(self):
+        return len(self.txs)
+
+    def __contains__(self, tx_id: str):
+        return tx_id in self.txs
+
+    def find_conflict(self, tx: dict):
+        for inp in tx['inputs']:
+            tx_id = self.spent_inputs.get(utils.get_utxo_id(inp))
+            if tx_id and tx_id != tx['id']:
+                return tx_id
+
+        return None
+
+    def add(self, tx: dict):
+        if tx['id'] in self.txs:
+            return
+
+        input_ids = [utils.get_utxo_id(inp) for inp in tx['inputs']]
+        output_ids = []
+        for index, out in enumerate(tx['outputs']):
+            utxo_id = f'{tx["id"]}{index}'
+            self.outputs[utxo_id] = {
+                'id': utxo_id,
+                'address': utils.fix_long_address(out['address']),
+                'amount': out['value'],
+                'txHash': tx['id'],
+                'index': index,
+            }
+            output_ids.append(utxo_id)
+
+        for utxo_id in input_ids:
+            self.spent_inputs[utxo_id] = tx['id']
+
+        self.txs[tx['id']] = {
+            'inputs': input_ids,
+            'outputs': output_ids,
+            'expires_at': monotonic() + self.ttl,
+        }
+
+    def remove(self, tx_id: str):
+        entry = self.txs.pop(tx_id, None)
+        if not entry:
+            return
+
+        for utxo_id in entry['inputs']:
+            if self.spent_inputs.get(utxo_id) == tx_id:
+                del self.spent_inputs[utxo_id]
+
+        for utxo_id in entry['outputs']:
+            self.outputs.pop(utxo_id, None)
+
+    def get_utxos(self, utxo_ids: list):
+        return {utxo_id: self.outputs[utxo_id] for utxo_id in utxo_ids if utxo_id in self.outputs}
+
+    def get_txs_outputs(self, tx_hashes: list):
+        # Same shape as DB.get_txs_by_hashes.
+        ret = {}
+        for tx_hash in tx_hashes:
+            entry = self.txs.get(tx_hash)
+            if entry:
+                ret[tx_hash] = [
+                    (self.outputs[utxo_id]['address'], self.outputs[utxo_id]['amount'])
+                    for utxo_id in entry['outputs']
+                ]
+
+        return ret
+
+    def confirm(self, tx_ids: list, spent_utxo_ids: list):
+        for tx_id in tx_ids:
+            self.remove(tx_id)
+
+        # Pending txs spending the same utxos as a confirmed tx can never
+        # make it into a block any more.
+        for utxo_id in spent_utxo_ids:
+            tx_id = self.spent_inputs.get(utxo_id)
+            if tx_id:
+                self.logger.info('evict double spent pending tx: %s', tx_id)
+                self.remove(tx_id)
+
+    def dump(self):
+        # Remaining lifetimes instead of monotonic deadlines, which do not
+        # survive a restart.
+        now = monotonic()
+        return [{
+            'id': tx_id,
+            'inputs': entry['inputs'],
+            'outputs': [self.outputs[utxo_id] for utxo_id in entry['outputs']],
+            'ttl': entry['expires_at'] - now,
+        } for tx_id, entry in self.txs.items()]
+
+    def restore(self, entries: list):
+        now = monotonic()
+        for entry in entries:
+            if entry['ttl'] <= 0 or entry['id'] in self.txs:
+                continue
+
+            for utxo_id in entry['inputs']:
+                self.spent_inputs[utxo_id] = entry['id']
+            for output in entry['outputs']:
+                self.outputs[output['id']] = output
+
+            self.txs[entry['id']] = {
+                'inputs': entry['inputs'],
+                'outputs': [output['id'] for output in entry['outputs']],
+                'expires_at': now + entry['ttl'],
+            }
+
+        self.logger.info('restored %d pending txs', len(self.txs))
+
+    def expire(self):
+        now = monotonic()
+        expired = [tx_id for tx_id, entry in self.txs.items() if entry['expires_at'] < now]
+        for tx_id in expired:
+            self.remove(tx_id)
+
+        if expired:
+            self.logger.info('expired %d pending txs', len(expired))
+
+
+mempool = Mempool()
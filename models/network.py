@@ -10,3 +10,4 @@ class Network:
         self.genesis_hash = network['genesis']
         self.start_time = network['startTime']
         self.network_magic = network['networkMagic']
+        self.protocol_magic = network['protocolMagic']
@@ -16,3 +16,9 @@ class Parser:
     def parse_epoch(self, data: bytes, options={}):
         epoch = Epoch.from_CBOR(data, self.network_start_time)
         return epoch.get_blocks_iterator(options)
+
+
+def parse_epoch_blocks(data: bytes, options={}):
+    # Entry point for worker processes: the blocks iterator is a generator and
+    # can not be sent back to the parent, so the epoch is materialized here.
+    return list(Parser().parse_epoch(data, options))
@@ -1,11 +1,24 @@
 import asyncio
 from time import time
+from collections import deque
 from db import DB
+from config import config
 from lib import utils
 from operator import itemgetter
-from lib.logger import get_logger
+from lib.logger import get_logger, dump_recent_logs
+from lib.event_bus import event_bus
 from models.http_bridge import HttpBridge
+from models.epoch_pipeline import EpochPipeline
+from models.watched_addresses import WatchedAddresses
+from models.state_manifest import StateManifest
+from models.analytics_export import AnalyticsExport
+from models.chain_stats import ChainStats
+from models.utxo_batch import UtxoBatch
+from models.mempool import mempool
+from models.auto_tuner import auto_tuner
 from constants.scheduler import *
+from constants.events import *
+from constants.transaction import TX_SUCCESS_STATUS, TX_PENDING_STATUS
 
 
 class Scheduler:
@@ -25,9 +38,17 @@ class Scheduler:
         self.logger = get_logger('scheduler')
         self.db = DB()
         self.http_bridge = HttpBridge()
-        self.logger.info('check tip in every %d seconds. rollback count set to: %d blocks', CHECK_TIP_SECONDS, ROLLBACK_BLOCKS_COUNT)
+        self.logger.info('check tip in every %d seconds. rollback count set to: %d blocks', auto_tuner.get('checkTipSeconds'), ROLLBACK_BLOCKS_COUNT)
         self.blocks_to_store = []
         self.last_block = {}
+        self.watched_addresses = WatchedAddresses(self.db) if WatchedAddresses.is_enabled() else None
+        self.last_prune_time = 0
+        # Headers of the stored blocks in the rollback window, newest last.
+        self.recent_blocks = deque(maxlen=ROLLBACK_BLOCKS_COUNT)
+        self.state_manifest = StateManifest(self.db) if StateManifest.is_enabled() else None
+        self.last_checkpoint_time = time()
+        self.analytics_export = AnalyticsExport() if AnalyticsExport.is_enabled() else None
+        self.chain_stats = ChainStats(self.db) if ChainStats.is_enabled() else None
 
     async def rollback(self, at_block_height: int):
         self.logger.info(f'rollback at height {at_block_height} to {ROLLBACK_BLOCKS_COUNT} blocks back.')
@@ -39,109 +60,293 @@ class Scheduler:
             height = best_block_num['height']
             roll_back_to_height = height - ROLLBACK_BLOCKS_COUNT
             self.logger.info(f'current DB height at rollback time: {height}. rollback to: {roll_back_to_height}')
-            await self.db.rollback_txs_from_height(roll_back_to_height)
-            await self.db.rollback_utxos_backup(roll_back_to_height)
-            await self.db.rollback_blocks_from_height(roll_back_to_height)
-            await self.db.update_best_block_num(roll_back_to_height)
+            with self.db.transaction():
+                rolled_back_txs = await self.db.rollback_txs_from_height(roll_back_to_height)
+                await self.db.rollback_utxos_backup(roll_back_to_height)
+                await self.db.rollback_blocks_from_height(roll_back_to_height)
+                await self.db.rollback_chain_stats(roll_back_to_height)
+                await self.db.update_best_block_num(roll_back_to_height)
             best_block_num = await self.db.get_best_block_num()
             epoch, block_hash = itemgetter('epoch', 'hash')(best_block_num)
             self.last_block = {'epoch': epoch, 'hash': block_hash}
+            self.recent_blocks = deque(
+                [block for block in self.recent_blocks if block['block_height'] <= roll_back_to_height],
+                maxlen=ROLLBACK_BLOCKS_COUNT
+            )
+            if self.analytics_export:
+                self.analytics_export.rollback(roll_back_to_height, epoch)
+            if self.chain_stats:
+                await self.chain_stats.rollback(roll_back_to_height, epoch)
+            event_bus.emit(EVENT_ROLLBACK, {'height': roll_back_to_height, 'hash': block_hash, 'epoch': epoch})
+            for tx in rolled_back_txs:
+                # Pending again: their inputs stay reserved against conflicting
+                # submissions until they are in a block again or expire.
+                mempool.add(tx)
+                event_bus.emit(EVENT_TX_STATE, {
+                    'txHashes': [tx['id']],
+                    'addresses': tx['addresses'],
+                    'state': TX_PENDING_STATUS,
+                    'blockNum': None,
+                })
         except Exception as e:
             raise
 
-    async def process_epoch(self, epoch_id: int, height: int):
-        self.logger.info(f'process epoch of: {epoch_id} in height: {height}')
-
-        blocks = await self.http_bridge.get_parsed_epoch_by_id(epoch_id, True)
-        for block in blocks:
-            if block.height > height:
-                await self.process_block(block)
+    async def process_epochs(self, epoch_ids, height: int):
+        pipeline = EpochPipeline(self.http_bridge, self.process_blocks)
+        return await pipeline.run(epoch_ids, height)
 
     async def process_block_height(self, height: int):
         block = await self.http_bridge.get_block_by_height(height)
-        return self.process_block(block, True)
+        return await self.process_block(block, True)
 
     async def process_block(self, block, is_flush_cache=False):
-        if self.last_block:
-            if block.epoch == self.last_block['epoch'] and block.prev_hash != self.last_block['hash']:
-                self.logger.info(f'block prev hash: {block.prev_hash} mismatch {self.last_block["hash"]}.  need rollback!')
-                return STATUS_ROLLBACK_REQUIRED
-
-        self.last_block = {
-            'epoch': block.epoch,
-            'hash': block.hash
-        }
-
-        self.blocks_to_store.append({
-            'block_hash': block.hash,
-            'block_height': block.height,
-            'epoch': block.epoch,
-            'slot': block.slot
-        })
+        return await self.process_blocks([block], is_flush_cache)
+
+    async def process_blocks(self, blocks: list, is_flush_cache=False):
+        """
+        Applies a run of blocks in one transaction. Blocks after a prev hash
+        mismatch are not applied and a rollback is requested.
+        """
+        status, run = STATUS_BLOCK_PROCESSED, []
+        for block in blocks:
+            if self.last_block:
+                if block.epoch == self.last_block['epoch'] and block.prev_hash != self.last_block['hash']:
+                    self.logger.info(f'block prev hash: {block.prev_hash} mismatch {self.last_block["hash"]}.  need rollback!')
+                    status = STATUS_ROLLBACK_REQUIRED
+                    break
+
+            self.last_block = {
+                'epoch': block.epoch,
+                'hash': block.hash
+            }
+            run.append(block)
 
+        if run:
+            await self.apply_blocks(run, is_flush_cache)
+
+        return status
+
+    async def apply_blocks(self, blocks: list, is_flush_cache=False):
+        for block in blocks:
+            self.blocks_to_store.append({
+                'block_hash': block.hash,
+                'prev_hash': block.prev_hash,
+                'block_height': block.height,
+                'epoch': block.epoch,
+                'slot': block.slot
+            })
+
+        txs = [tx for block in blocks for tx in block.txs or []]
+        txs_inputs = {}
+        stored_blocks = None
         try:
-            if block.txs:
-                block_dict = vars(block)
-                block_hash, epoch, slot, txs = itemgetter('hash', 'epoch', 'slot', 'txs')(block_dict)
-                self.logger.info('store txs for block height: %s', block_dict['height'])
-                txs_utxos = utils.get_txs_utxos(txs)
-                block_utxos, required_utxo_ids = [], []
-                for tx in txs:
-                    for inp in tx['inputs']:
-                        utxo_id = utils.get_utxo_id(inp)
-                        local_utxo = txs_utxos.get(utxo_id)
-                        if local_utxo:
-                            block_utxos.append({
-                                'id': local_utxo['utxo_id'],
-                                'address': local_utxo['receiver'],
-                                'amount': local_utxo['amount'],
-                                'txHash': local_utxo['tx_hash'],
-                                'index': local_utxo['tx_index'],
-                            })
-                            del txs_utxos[utxo_id]
-                        else:
-                            required_utxo_ids.append(utxo_id)
-
-                self.logger.info('store block txs required utxo: %s', required_utxo_ids)
-                available_utxos = await self.db.get_utxos_by_ids(required_utxo_ids)
-                all_utxo_map = {}
-                for utxo in available_utxos + block_utxos:
-                    all_utxo_map[utxo['id']] = utxo
-
-                for index, tx in enumerate(txs):
-                    utxos = []
-                    for inp in tx['inputs']:
-                        utxo_id = utils.get_utxo_id(inp)
-                        utxo = all_utxo_map.get(utxo_id)
-                        if utxo:
-                            utxos.append(utxo)
-
-                    if len(utxos) != len(tx['inputs']):
-                        raise Exception(f'failed to query input utxos for tx: {tx["id"]} in db or block.')
-
-                    self.logger.info('store block txs: %s', tx['id'])
-                    await self.db.save_txs(tx, utxos)
-
-                await self.db.save_utxos(list(txs_utxos.values()))
-                await self.db.remove_and_backup_utxos(required_utxo_ids, block_dict['height'])
-
-            if len(self.blocks_to_store) > BLOCKS_CACHE_SIZE or block_have_txs or is_flush_cache:
-                await self.db.save_blocks(self.blocks_to_store)
-                await self.db.update_best_block_num(block.height)
-                self.blocks_to_store = []
+            flush_start = time()
+            # Txs, utxos, balances and blocks of the run are one unit of work.
+            with self.db.transaction():
+                if txs:
+                    self.logger.debug('store %d txs of blocks up to height: %s', len(txs), blocks[-1].height)
+                    batch = UtxoBatch(txs)
+                    self.logger.debug('store block txs required %d utxos', len(batch.required))
+                    txs_inputs = batch.resolve(await self.db.get_utxos_by_ids(list(batch.required)))
+                    # In filter mode the utxo set is still kept complete, only
+                    # txs of watched addresses are stored.
+                    txs_to_store = [
+                        tx for tx in txs
+                        if not self.watched_addresses or self.watched_addresses.touches(tx, txs_inputs[tx['id']])
+                    ]
+                    # All txs of the run in one bulk insert.
+                    self.logger.debug('store %d block txs', len(txs_to_store))
+                    await self.db.save_many_txs(txs_to_store, {tx['id']: txs_inputs[tx['id']] for tx in txs_to_store})
+                    await self.db.save_utxos(batch.unspent())
+                    await self.db.remove_and_backup_utxos(batch.required, batch.spent_outputs())
+
+                if len(self.blocks_to_store) > auto_tuner.get('blocksCacheSize') or txs or is_flush_cache:
+                    await self.db.save_blocks(self.blocks_to_store)
+                    await self.db.update_best_block_num(blocks[-1].height)
+                    stored_blocks, self.blocks_to_store = self.blocks_to_store, []
+
+            if stored_blocks:
+                auto_tuner.record_flush(len(stored_blocks), len(txs), time() - flush_start)
+            for block in blocks:
+                block_inputs = {tx['id']: txs_inputs[tx['id']] for tx in block.txs or []}
+                if self.analytics_export:
+                    self.analytics_export.add_block(block, block_inputs)
+                if self.chain_stats:
+                    await self.chain_stats.add_block(block, block_inputs)
+
+            # Events go out only once the data is visible in the database.
+            if stored_blocks:
+                self.recent_blocks.extend(stored_blocks)
+                self.emit_stored_blocks(stored_blocks, txs, txs_inputs)
+                if self.analytics_export:
+                    await self.analytics_export.flush(blocks[-1].height)
+
+            if txs:
+                mempool.confirm(
+                    [tx['id'] for tx in txs],
+                    [utils.get_utxo_id(inp) for tx in txs for inp in tx['inputs']]
+                )
         except Exception as e:
             raise
         finally:
-            if is_flush_cache or (block.height % LOG_BLOCK_PARSED_THRESHOLD == 0):
-                self.logger.info(f'block parsed => hash: {block.hash} epoch: {block.epoch} slot: {block.slot} height: {block.height}')
+            for block in blocks:
+                if (is_flush_cache and block is blocks[-1]) or (block.height % LOG_BLOCK_PARSED_THRESHOLD == 0):
+                    self.logger.info(f'block parsed => hash: {block.hash} epoch: {block.epoch} slot: {block.slot} height: {block.height}')
+
+    async def flush_blocks(self):
+        # Empty blocks at the end of an epoch are still cached, later ones
+        # come by height and would leave a gap in the stored best block.
+        if not self.blocks_to_store:
+            return
+
+        flush_start = time()
+        with self.db.transaction():
+            await self.db.save_blocks(self.blocks_to_store)
+            await self.db.update_best_block_num(self.blocks_to_store[-1]['block_height'])
+        stored_blocks, self.blocks_to_store = self.blocks_to_store, []
+        auto_tuner.record_flush(len(stored_blocks), 0, time() - flush_start)
+        self.recent_blocks.extend(stored_blocks)
+        self.emit_stored_blocks(stored_blocks, None, {})
+        if self.analytics_export:
+            await self.analytics_export.flush(stored_blocks[-1]['block_height'])
+
+    def emit_stored_blocks(self, blocks: list, txs: list, txs_inputs: dict):
+        tx_events, block_tx_events = [], {}
+        for tx in txs or []:
+            addresses = [inp['address'] for inp in txs_inputs.get(tx['id'], [])]
+            addresses += [utils.fix_long_address(out['address']) for out in tx['outputs']]
+            event = {
+                'txHashes': [tx['id']],
+                'addresses': list(set(addresses)),
+                'state': TX_SUCCESS_STATUS,
+                'blockNum': tx['blockNum'],
+            }
+            tx_events.append(event)
+            block_tx_events.setdefault(tx['blockNum'], []).append(event)
+
+        for stored_block in blocks:
+            events = block_tx_events.get(stored_block['block_height'], [])
+            event_bus.emit(EVENT_BLOCK_APPLIED, {
+                'hash': stored_block['block_hash'],
+                'height': stored_block['block_height'],
+                'epoch': stored_block['epoch'],
+                'slot': stored_block['slot'],
+                'txHashes': [event['txHashes'][0] for event in events],
+                'addresses': list(set(addr for event in events for addr in event['addresses'])),
+            })
+
+        for event in tx_events:
+            event_bus.emit(EVENT_TX_STATE, event)
+
+    async def backfill_watched_addresses(self, height: int):
+        await self.watched_addresses.sync_file()
+        addresses = await self.db.get_unbackfilled_watched_addresses()
+        if not addresses:
+            return
 
-        return STATUS_BLOCK_PROCESSED
+        await self.watched_addresses.add(addresses)
+        heights = await self.db.get_address_activity_heights(addresses, height)
+        # Inputs spent before the horizon are pruned, those txs can not be
+        # resolved any more.
+        horizon = self.utxo_history_horizon(height)
+        pruned_heights = [block_height for block_height in heights if block_height < horizon]
+        if pruned_heights:
+            self.logger.warning(
+                'backfill skips %d blocks from height %d to %d, older than the retained utxo history',
+                len(pruned_heights), pruned_heights[0], pruned_heights[-1]
+            )
+            heights = heights[len(pruned_heights):]
+
+        self.logger.info('backfill %d watched addresses from %d blocks', len(addresses), len(heights))
+        for block_height in heights:
+            block = await self.http_bridge.get_block_by_height(block_height)
+            txs = block.txs or []
+            # Outputs spent inside the block are in utxos_backup as well.
+            utxo_ids = [utils.get_utxo_id(inp) for tx in txs for inp in tx['inputs']]
+            utxo_map = {utxo['id']: utxo for utxo in await self.db.get_utxos_with_backup_by_ids(utxo_ids)}
+            txs_to_store, txs_to_store_utxos = [], {}
+            for tx in txs:
+                utxos = [utxo_map[utils.get_utxo_id(inp)] for inp in tx['inputs'] if utils.get_utxo_id(inp) in utxo_map]
+                if len(utxos) != len(tx['inputs']):
+                    raise Exception(f'failed to query input utxos for tx: {tx["id"]} in db.')
+
+                if self.watched_addresses.touches(tx, utxos):
+                    txs_to_store.append(tx)
+                    txs_to_store_utxos[tx['id']] = utxos
+
+            await self.db.save_many_txs(txs_to_store, txs_to_store_utxos)
+
+        await self.db.mark_watched_addresses_backfilled(addresses)
+        self.logger.info('backfill of %d watched addresses finished', len(addresses))
+
+    @staticmethod
+    def utxo_history_horizon(height: int):
+        """Utxos spent before this height are pruned from utxos_backup, 0 if none are."""
+        retention = config.get('utxoHistoryRetention')
+        if retention is None:
+            return 0
+
+        # Spent utxos inside the rollback window are needed to undo blocks.
+        return height - max(retention, ROLLBACK_BLOCKS_COUNT)
+
+    async def prune_utxo_history(self):
+        if config.get('utxoHistoryRetention') is None or time() - self.last_prune_time < PRUNE_UTXO_HISTORY_SECONDS:
+            return
+
+        self.last_prune_time = time()
+        best_block_num = await self.db.get_best_block_num()
+        await self.db.prune_utxos_backup(self.utxo_history_horizon(best_block_num['height']))
+
+    async def load_state(self):
+        """
+        Resumes from the state manifest when it matches the database, returns
+        it or None on a cold start.
+        """
+        manifest = await self.state_manifest.load() if self.state_manifest else None
+        if manifest:
+            self.recent_blocks.extend(manifest['headers'])
+            self.last_block = {'epoch': manifest['tip']['epoch'], 'hash': manifest['tip']['hash']}
+            mempool.restore(manifest['mempool'])
+            if self.analytics_export:
+                self.analytics_export.last_epoch = manifest['tip']['epoch']
+            if self.chain_stats:
+                await self.chain_stats.resume(manifest['tip'])
+            return manifest
+
+        best_block_num = await self.db.get_best_block_num()
+        if self.analytics_export:
+            self.analytics_export.last_epoch = best_block_num['epoch']
+        if self.chain_stats:
+            await self.chain_stats.resume(best_block_num)
+        self.recent_blocks.extend(await self.db.get_blocks_from_height(best_block_num['height'] - ROLLBACK_BLOCKS_COUNT))
+        return None
+
+    def save_state(self):
+        if not self.state_manifest:
+            return
+
+        self.last_checkpoint_time = time()
+        tip = self.recent_blocks[-1] if self.recent_blocks else None
+        self.state_manifest.save(tip and {
+            'hash': tip['block_hash'],
+            'height': tip['block_height'],
+            'epoch': tip['epoch'],
+            'slot': tip['slot'],
+        }, list(self.recent_blocks), mempool)
+
+    def checkpoint(self):
+        interval = config.get('stateManifest', {}).get('checkpointSeconds', STATE_CHECKPOINT_SECONDS)
+        if self.state_manifest and time() - self.last_checkpoint_time >= interval:
+            self.save_state()
 
     async def check_tip(self):
         self.logger.info('checking for new blocks.')
         best_block_num = await self.db.get_best_block_num()
         height, epoch, slot = itemgetter('height', 'epoch', 'slot')(best_block_num)
 
+        if self.watched_addresses:
+            await self.backfill_watched_addresses(height)
+
         node_status = await self.http_bridge.get_status()
         packed_epochs, node_tip = itemgetter('packedEpochs', 'tip')(node_status)
         local_status = node_tip['local']
@@ -151,6 +356,7 @@ class Scheduler:
             return
 
         self.logger.info(f'last imported block height: {height}. Node status => local: {local_status["slot"]}, remote: {remote_status["slot"]}, packed epochs: {packed_epochs}')
+        await self.db.ensure_tx_partitions(local_status['height'])
 
         remote_epoch, remote_slot = remote_status['slot']
         if epoch < remote_epoch:
@@ -158,23 +364,31 @@ class Scheduler:
             # Calculate latest stable remote epoch
             last_remote_stable_epoch = remote_epoch - (1 if remote_slot > 2160 else 2)
             is_more_stable_epoch = epoch < last_remote_stable_epoch
-            is_many_stable_slots = (epoch == last_remote_stable_epoch) and (slot < EPOCH_DOWNLOAD_THRESHOLD)
+            is_many_stable_slots = (epoch == last_remote_stable_epoch) and ((slot or 0) < auto_tuner.get('epochDownloadThreshold'))
             # Check if there's any point to bother with whole epochs
             if is_more_stable_epoch or is_many_stable_slots:
                 if packed_epochs > epoch:
-                    for epoch_id in range(epoch, packed_epochs):
-                        epoch_start_height = (height if epoch_id == epoch else 0)
-                        await self.process_epoch(epoch_id, height)
+                    sync_start = time()
+                    status = await self.process_epochs(range(epoch, packed_epochs), height)
+                    if status == STATUS_ROLLBACK_REQUIRED:
+                        self.logger.info('rollback required.')
+                        await self.rollback(height)
+                    else:
+                        await self.flush_blocks()
+                        # Nothing may have been stored, recent_blocks can be empty.
+                        stored_height = (await self.db.get_best_block_num())['height']
+                        auto_tuner.record_sync(True, stored_height - height, time() - sync_start)
                 else:
                     self.logger.info(f'cardano-http-brdige has not yet packed stable epoch: {epoch}. last remote stable epoch is: {last_remote_stable_epoch}')
                 return
 
         i = 0
         block_height = height + 1
+        sync_start = time()
+        max_blocks = auto_tuner.get('maxBlocksPerLoop')
         while True:
-            if block_height <= local_status['height']:
-                if i < MAX_BLOCKS_PER_LOOP:
-                    break
+            if block_height > local_status['height'] or i >= max_blocks:
+                break
 
             status = await self.process_block_height(block_height)
             if status == STATUS_ROLLBACK_REQUIRED:
@@ -185,13 +399,24 @@ class Scheduler:
             i += 1
             block_height += 1
 
+        auto_tuner.record_sync(False, i, time() - sync_start)
+        auto_tuner.record_loop(i, block_height > local_status['height'])
+
     async def start(self):
         self.logger.info('start chain syncing.')
+        if self.watched_addresses:
+            await self.watched_addresses.load()
+
         while True:
             time_start = time()
             error_sleep = 0
             try:
                 await self.check_tip()
+                mempool.expire()
+                if self.chain_stats:
+                    await self.chain_stats.flush()
+                await self.prune_utxo_history()
+                self.checkpoint()
             except Exception as e:
                 meta = None
                 if hasattr(e, 'code'):
@@ -200,13 +425,15 @@ class Scheduler:
                     error_sleep = meta['sleep']
                     self.logger.warn(f'Scheduler async: failed to check tip :: {meta["msg"]}. Sleeping and retrying (err_sleep={error_sleep})')
                 else:
+                    self.logger.exception('chain sync failed')
+                    dump_recent_logs()
                     raise
 
             time_end = time()
             time_passed = time_end - time_start
             self.logger.info('chain sync loop finished in %d seconds', time_passed)
 
-            time_sleep = error_sleep or (CHECK_TIP_SECONDS - time_passed)
+            time_sleep = error_sleep or (auto_tuner.get('checkTipSeconds') - time_passed)
             if time_sleep > 0:
                 self.logger.info('sync loop sleep for %d seconds', time_sleep)
                 await asyncio.sleep(time_sleep)
@@ -0,0 +1,74 @@
+import os
+import json
+from time import time
+from config import config
+from lib.logger import get_logger
+from constants.scheduler import STATE_MANIFEST_VERSION
+
+
+class StateManifest:
+    """
+    Small json file with what the importer would otherwise rebuild with full
+    table scans on start: the stored tip, the headers of the rollback window
+    and, optionally, the pending txs of the mempool. It is written on clean
+    shutdown and at checkpoints, and only trusted on start when its tip is
+    still the best stored block.
+    """
+
+    def __init__(self, db):
+        self.logger = get_logger('state-manifest')
+        self.db = db
+        options = config.get('stateManifest', {})
+        self.file = options.get('file')
+        self.include_mempool = options.get('mempool', False)
+
+    @staticmethod
+    def is_enabled():
+        return bool(config.get('stateManifest', {}).get('file'))
+
+    def read(self):
+        try:
+            with open(self.file) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning('unreadable state manifest %s: %s', self.file, e)
+            return None
+
+        if manifest.get('version') != STATE_MANIFEST_VERSION:
+            self.logger.info('ignore state manifest of version: %s', manifest.get('version'))
+            return None
+
+        return manifest
+
+    async def load(self):
+        manifest = self.read()
+        if not manifest:
+            return None
+
+        # Blocks may have been rolled back, or stored after the last write of
+        # the manifest, e.g. on a crash.
+        tip = manifest['tip']
+        best_block_num = await self.db.get_best_block_num()
+        if not tip or tip['hash'] != best_block_num['hash']:
+            self.logger.info('state manifest tip is not the stored tip: %s, start cold', best_block_num['height'])
+            return None
+
+        self.logger.info('state manifest loaded, tip height: %s', tip['height'])
+        return manifest
+
+    def save(self, tip: dict, headers: list, mempool=None):
+        manifest = {
+            'version': STATE_MANIFEST_VERSION,
+            'savedAt': time(),
+            'tip': tip,
+            'headers': headers,
+            'mempool': mempool.dump() if mempool and self.include_mempool else [],
+        }
+        # Written to a temporary file first, a crash never leaves half a manifest.
+        tmp_file = f'{self.file}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_file, self.file)
+        self.logger.debug('state manifest saved, tip height: %s', tip['height'] if tip else None)
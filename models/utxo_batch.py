@@ -0,0 +1,57 @@
+from lib import utils
+
+
+class UtxoBatch:
+    """
+    Utxo changes of the txs of a run of blocks. Outputs spent inside the run
+    are resolved in memory and never stored in utxos, all other inputs are
+    resolved with one query and moved to utxos_backup with one statement.
+    """
+
+    def __init__(self, txs: list):
+        self.txs = txs
+        self.created = utils.get_txs_utxos(txs)
+        # utxo id -> height of the block spending it.
+        self.spent_in_batch = {}
+        self.required = {}
+        for tx in txs:
+            for inp in tx['inputs']:
+                utxo_id = utils.get_utxo_id(inp)
+                if utxo_id in self.created:
+                    self.spent_in_batch[utxo_id] = tx['blockNum']
+                else:
+                    self.required[utxo_id] = tx['blockNum']
+
+    @staticmethod
+    def to_input(utxo: dict):
+        return {
+            'id': utxo['utxo_id'],
+            'address': utxo['receiver'],
+            'amount': utxo['amount'],
+            'txHash': utxo['tx_hash'],
+            'index': utxo['tx_index'],
+        }
+
+    def resolve(self, db_utxos: list):
+        """Input utxos of every tx by tx id, from the database rows and the run itself."""
+        utxo_map = {utxo['id']: utxo for utxo in db_utxos}
+        for utxo_id in self.spent_in_batch:
+            utxo_map[utxo_id] = self.to_input(self.created[utxo_id])
+
+        txs_inputs = {}
+        for tx in self.txs:
+            utxo_ids = [utils.get_utxo_id(inp) for inp in tx['inputs']]
+            utxos = [utxo_map[utxo_id] for utxo_id in utxo_ids if utxo_id in utxo_map]
+            if len(utxos) != len(tx['inputs']):
+                raise Exception(f'failed to query input utxos for tx: {tx["id"]} in db or block.')
+
+            txs_inputs[tx['id']] = utxos
+
+        return txs_inputs
+
+    def unspent(self):
+        return [utxo for utxo_id, utxo in self.created.items() if utxo_id not in self.spent_in_batch]
+
+    def spent_outputs(self):
+        """Outputs created and spent inside the run, as utxos_backup rows."""
+        return [dict(self.created[utxo_id], deleted_block_num=height) for utxo_id, height in self.spent_in_batch.items()]
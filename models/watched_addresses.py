@@ -0,0 +1,81 @@
+import os
+from config import config
+from lib import utils
+from lib.bloom import BloomFilter
+from lib.logger import get_logger
+
+
+class WatchedAddresses:
+    """
+    Address filter for lightweight deployments. The watched_addresses table is
+    the source of truth, an optional file is synced into it. Lookups go to an
+    in-memory set, or a Bloom filter when configured: false positives only
+    store a few extra txs.
+    """
+
+    def __init__(self, db):
+        self.logger = get_logger('watched-addresses')
+        self.db = db
+        options = config.get('watchedAddresses', {})
+        self.file = options.get('file')
+        self.use_bloom = options.get('bloom', False)
+        self.error_rate = options.get('errorRate', 0.001)
+        # Room for addresses added after the load before a rebuild.
+        self.bloom_headroom = options.get('bloomHeadroom', 2)
+        self.file_mtime = None
+        self.addresses = set()
+
+    @staticmethod
+    def is_enabled():
+        return config.get('watchedAddresses', {}).get('enabled', False)
+
+    def read_file(self):
+        with open(self.file) as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+    async def sync_file(self):
+        if not self.file:
+            return
+
+        mtime = os.path.getmtime(self.file)
+        if mtime == self.file_mtime:
+            return
+
+        addresses = self.read_file()
+        self.logger.info('sync %d watched addresses from file: %s', len(addresses), self.file)
+        await self.db.add_watched_addresses(addresses)
+        self.file_mtime = mtime
+
+    async def load(self):
+        await self.sync_file()
+        addresses = await self.db.get_watched_addresses()
+        if self.use_bloom:
+            self.addresses = BloomFilter(int(len(addresses) * self.bloom_headroom), self.error_rate)
+            for address in addresses:
+                self.addresses.add(address)
+        else:
+            self.addresses = set(addresses)
+
+        self.logger.info('loaded %d watched addresses', len(addresses))
+
+    async def add(self, addresses: list):
+        # A Bloom filter can not grow, a full one is rebuilt from the table,
+        # which has the new addresses already.
+        if self.use_bloom and self.addresses.count + len(addresses) > self.addresses.capacity:
+            self.logger.info('bloom filter of %d addresses is full, rebuild it', self.addresses.capacity)
+            await self.load()
+            return
+
+        for address in addresses:
+            self.addresses.add(address)
+
+    def touches(self, tx: dict, input_utxos: list):
+        for utxo in input_utxos:
+            if utxo['address'] in self.addresses:
+                return True
+
+        for out in tx['outputs']:
+            if utils.fix_long_address(out['address']) in self.addresses:
+                return True
+
+        return False
@@ -15,25 +15,70 @@
 # import utils from '../blockchain/utils'
 # import { TX_STATUS, TxType } from '../blockchain'
 import json
-import base58
 import base64
-from db import DB
-from cbor import cbor
+import asyncio
+from time import monotonic
+from db import DB, DBPool
+from config import config
 from constants.transaction import *
 from datetime import datetime
+from operator import itemgetter
 from lib import utils
-from hashlib import blake2b, sha3_256
+from lib import address as address_codec
+from lib import witness
+from lib.cbor_codec import codec
 from lib.logger import get_logger
+from lib.event_bus import event_bus
+from lib.admission import AdmissionController, AdmissionRejected
+from lib.witness import InvalidWitness
+from constants.events import EVENT_TX_STATE, MAX_SUBSCRIPTION_FILTERS
+from constants.api import *
 from tornado.web import RequestHandler
+from tornado.ioloop import IOLoop
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+from tornado.httpclient import HTTPClientError
+from tornado.iostream import StreamClosedError
 from models.network import Network
 from models.http_bridge import HttpBridge
+from models.balances import balances
+from models.mempool import mempool
+from models.auto_tuner import auto_tuner
+from concurrent.futures import ThreadPoolExecutor
+
+
+admission_config = config.get('admission', {})
+submit_admission = AdmissionController(
+    max_in_flight=admission_config.get('maxInFlight', SUBMIT_MAX_IN_FLIGHT),
+    max_queue=admission_config.get('maxQueue', SUBMIT_MAX_QUEUE),
+    max_wait=admission_config.get('maxWait', SUBMIT_MAX_WAIT_SECONDS),
+    per_key_limit=admission_config.get('perKeyLimit', SUBMIT_PER_KEY_LIMIT),
+    per_key_tx_limit=admission_config.get('perKeyTxLimit', SUBMIT_PER_KEY_TX_LIMIT),
+    api_keys=admission_config.get('apiKeys'),
+)
+# Ed25519 verification is cpu bound, it runs off the IOLoop.
+witness_executor = ThreadPoolExecutor(max_workers=WITNESS_VERIFY_WORKERS)
+query_pool = DBPool(QUERY_POOL_MAX_IDLE)
 
 
 class Routers:
 
     def __call__(self):
         return [
-            (r'/api/txs/signed', self.SignHandler)
+            (r'/api/txs/signed', self.SignHandler),
+            (r'/api/txs/signed/batch', self.SignBatchHandler),
+            (r'/api/subscribe', self.SubscribeHandler),
+            (r'/api/utxos', self.UtxosHandler),
+            (r'/api/utxos/at-height', self.UtxosAtHeightHandler),
+            (r'/api/balances', self.BalancesHandler),
+            (r'/api/txs/history', self.TxsHistoryHandler),
+            (r'/api/txs', self.TxsHandler),
+        ]
+
+    def admin(self):
+        # Served on the admin listener only, never on the public port.
+        return [
+            (r'/api/admin/admission', self.AdmissionStatsHandler),
+            (r'/api/admin/tuning', self.TuningHandler),
         ]
 
     @classmethod
@@ -44,18 +89,321 @@ class Routers:
     def success(cls, self):
         return self.write(json.dumps({'success': True, 'message': 'OK'}))
 
+    @staticmethod
+    def tx_to_json(row):
+        return {
+            'hash': row['hash'],
+            'inputs_address': row['inputs_address'],
+            'inputs_amount': [str(amount) for amount in row['inputs_amount'] or []],
+            'outputs_address': row['outputs_address'],
+            'outputs_amount': [str(amount) for amount in row['outputs_amount'] or []],
+            'block_num': row['block_num'],
+            'block_hash': row['block_hash'],
+            'time': row['time'],
+            'tx_state': row['tx_state'],
+            'tx_ordinal': row['tx_ordinal'],
+            'last_update': row['last_update'],
+        }
+
+    class QueryHandler(RequestHandler):
+
+        def initialize(self):
+            self.logger = get_logger('routers')
+            self.db = None
+
+        def prepare(self):
+            self.db = query_pool.acquire()
+
+        def on_finish(self):
+            if self.db:
+                query_pool.release(self.db)
+                self.db = None
+
+        def set_default_headers(self):
+            self.set_header("Content-Type", 'application/json')
+
+        def parse_list(self, key: str, max_items: int):
+            try:
+                body = json.loads(self.request.body)
+            except json.decoder.JSONDecodeError:
+                raise ValueError('invalid request')
+
+            if not isinstance(body, dict):
+                raise ValueError('invalid request')
+
+            items = body.get(key)
+            if not items or not isinstance(items, list):
+                raise ValueError(f'request {key} is empty')
+
+            if not all(isinstance(item, str) for item in items):
+                raise ValueError(f'request {key} must be a list of strings')
+
+            if len(items) > max_items:
+                raise ValueError(f'request {key} exceeds the limit of {max_items}')
+
+            return body, list(set(items))
+
+        async def stream_rows(self, key: str, batches, convert):
+            # Rows are written and flushed batch by batch, the response is never
+            # held in memory as a whole. They are read in a transaction, a slow
+            # client must not keep it open: past the deadline the connection is
+            # closed and the response is cut off.
+            deadline = monotonic() + STREAM_MAX_SECONDS
+            self.write('{"success": true, "%s": [' % key)
+            is_first = True
+            try:
+                async for rows in batches:
+                    chunk = ', '.join(json.dumps(convert(row), default=str) for row in rows)
+                    self.write(chunk if is_first else ', ' + chunk)
+                    is_first = False
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+
+                    await asyncio.wait_for(self.flush(), remaining)
+            except asyncio.TimeoutError:
+                self.logger.warning('%s stream cut off after %d seconds', self.request.path, STREAM_MAX_SECONDS)
+                self.request.connection.close()
+                return
+            except StreamClosedError:
+                return
+            finally:
+                await batches.aclose()
+
+            self.write(']}')
+
+    class UtxosHandler(QueryHandler):
+
+        async def post(self):
+            try:
+                _, addresses = self.parse_list('addresses', MAX_ADDRESSES_PER_REQUEST)
+            except ValueError as e:
+                return Routers.fail(self, str(e))
+
+            await self.stream_rows('utxos', self.db.iter_utxos_by_addresses(addresses), lambda row: {
+                'utxo_id': row['utxo_id'],
+                'tx_hash': row['tx_hash'],
+                'tx_index': row['tx_index'],
+                'receiver': row['receiver'],
+                'amount': str(row['amount']),
+                'block_num': row['block_num'],
+            })
+
+    class UtxosAtHeightHandler(QueryHandler):
+
+        async def post(self):
+            try:
+                body, addresses = self.parse_list('addresses', MAX_ADDRESSES_PER_REQUEST)
+            except ValueError as e:
+                return Routers.fail(self, str(e))
+
+            height = body.get('height')
+            if not isinstance(height, int) or height < 0:
+                return Routers.fail(self, 'request height is invalid')
+
+            best_block_num = await self.db.get_best_block_num()
+            if height > best_block_num['height']:
+                return Routers.fail(self, f'height is above the imported tip: {best_block_num["height"]}')
+
+            retention = config.get('utxoHistoryRetention')
+            if retention is not None and height < best_block_num['height'] - retention:
+                return Routers.fail(self, f'height is older than the retained history of {retention} blocks')
+
+            await self.stream_rows('utxos', self.db.iter_utxos_at_height(addresses, height), lambda row: {
+                'utxo_id': row['utxo_id'],
+                'tx_hash': row['tx_hash'],
+                'tx_index': row['tx_index'],
+                'receiver': row['receiver'],
+                'amount': str(row['amount']),
+                'block_num': row['block_num'],
+                'deleted_block_num': row['deleted_block_num'],
+            })
+
+    class BalancesHandler(QueryHandler):
+
+        async def post(self):
+            try:
+                _, addresses = self.parse_list('addresses', MAX_ADDRESSES_PER_REQUEST)
+            except ValueError as e:
+                return Routers.fail(self, str(e))
+
+            ret = await balances.get(self.db, addresses)
+            self.write(json.dumps({
+                'success': True,
+                'balances': {address: {
+                    'balance': str(balance['balance']),
+                    'utxo_count': balance['utxo_count'],
+                } for address, balance in ret.items()},
+            }))
+
+    class TxsHandler(QueryHandler):
+
+        async def post(self):
+            try:
+                _, tx_hashes = self.parse_list('txHashes', MAX_HASHES_PER_REQUEST)
+            except ValueError as e:
+                return Routers.fail(self, str(e))
+
+            await self.stream_rows('txs', self.db.iter_txs_by_hashes(tx_hashes), Routers.tx_to_json)
+
+    class TxsHistoryHandler(QueryHandler):
+
+        async def post(self):
+            try:
+                body, addresses = self.parse_list('addresses', MAX_ADDRESSES_PER_REQUEST)
+            except ValueError as e:
+                return Routers.fail(self, str(e))
+
+            try:
+                limit = int(body.get('limit') or DEFAULT_PAGE_SIZE)
+                after = body.get('after')
+                if after:
+                    after = {'block_num': int(after['blockNum']), 'tx_ordinal': int(after['txOrdinal'])}
+            except (ValueError, TypeError, KeyError):
+                return Routers.fail(self, 'invalid request')
+
+            if not 0 < limit <= MAX_PAGE_SIZE:
+                return Routers.fail(self, f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+            rows = await self.db.get_txs_history_by_addresses(addresses, limit, after)
+            next_page = None
+            if len(rows) == limit:
+                next_page = {'blockNum': rows[-1]['block_num'], 'txOrdinal': rows[-1]['tx_ordinal']}
+
+            self.write(json.dumps({
+                'success': True,
+                'txs': [Routers.tx_to_json(row) for row in rows],
+                'next': next_page,
+            }, default=str))
+
+    class AdmissionStatsHandler(RequestHandler):
+
+        def set_default_headers(self):
+            self.set_header("Content-Type", 'application/json')
+
+        def get(self):
+            self.write(json.dumps({'success': True, 'admission': submit_admission.stats()}))
+
+    class TuningHandler(RequestHandler):
+        """
+        Current values of the auto-tuned importer settings with the reason of
+        every change. POST {name: value} overrides a value within its bounds,
+        null hands it back to the tuner.
+        """
+
+        def set_default_headers(self):
+            self.set_header("Content-Type", 'application/json')
+
+        def get(self):
+            self.write(json.dumps({'success': True, 'tuning': auto_tuner.stats()}))
+
+        def post(self):
+            try:
+                values = json.loads(self.request.body)
+            except json.decoder.JSONDecodeError:
+                return Routers.fail(self, 'invalid request')
+
+            if not isinstance(values, dict):
+                return Routers.fail(self, 'invalid request')
+
+            try:
+                auto_tuner.override(values)
+            except ValueError as e:
+                return Routers.fail(self, str(e))
+
+            self.write(json.dumps({'success': True, 'tuning': auto_tuner.stats()}))
+
+    class SubscribeHandler(WebSocketHandler):
+        """
+        Pushes block_applied, rollback and tx_state events. Filters are taken from
+        the `address` and `tx` query arguments and can be replaced later by
+        sending {"addresses": [...], "txs": [...]}.
+        """
+
+        def initialize(self):
+            self.logger = get_logger('routers')
+            self.subscription = None
+            self.sender = None
+
+        def check_origin(self, origin):
+            if origin in config.get('subscribe', {}).get('allowedOrigins', []):
+                return True
+
+            return super().check_origin(origin)
+
+        def open(self):
+            addresses = self.get_arguments('address')
+            tx_hashes = self.get_arguments('tx')
+            if len(addresses) + len(tx_hashes) > MAX_SUBSCRIPTION_FILTERS:
+                self.close(reason='too many filters')
+                return
+
+            self.subscription = event_bus.subscribe(addresses, tx_hashes)
+            self.sender = asyncio.ensure_future(self.send_events())
+
+        def on_message(self, message):
+            try:
+                body = json.loads(message)
+            except json.decoder.JSONDecodeError:
+                return self.write_message(json.dumps({'success': False, 'message': 'invalid request'}))
+
+            if not isinstance(body, dict):
+                return self.write_message(json.dumps({'success': False, 'message': 'invalid request'}))
+
+            addresses, tx_hashes = body.get('addresses', []), body.get('txs', [])
+            for items in (addresses, tx_hashes):
+                if not isinstance(items, list) or not all(isinstance(item, str) for item in items):
+                    return self.write_message(json.dumps({'success': False, 'message': 'invalid request'}))
+
+            if len(addresses) + len(tx_hashes) > MAX_SUBSCRIPTION_FILTERS:
+                return self.write_message(json.dumps({'success': False, 'message': 'too many filters'}))
+
+            self.subscription.set_filters(addresses, tx_hashes)
+            return self.write_message(json.dumps({'success': True, 'message': 'OK'}))
+
+        async def send_events(self):
+            while True:
+                event = await self.subscription.get()
+                try:
+                    await self.write_message(json.dumps(event, default=str))
+                except WebSocketClosedError:
+                    break
+
+        def on_close(self):
+            if self.subscription:
+                event_bus.unsubscribe(self.subscription)
+            if self.sender:
+                self.sender.cancel()
+
     class SignHandler(RequestHandler):
 
         def initialize(self):
             self.logger = get_logger('routers')
             self.http_bridge = HttpBridge()
             self.db = DB()
-            self.expected_network_magic = Network().network_magic
+            network = Network()
+            self.expected_network_magic = network.network_magic
+            self.protocol_magic = network.protocol_magic
 
         def set_default_headers(self):
             self.set_header("Content-Type", 'application/json')
 
         async def post(self):
+            # Overloaded callers get a fast 429/503 instead of a slow timeout.
+            try:
+                key = submit_admission.client_key(self.request.headers.get('X-Api-Key'), self.request.remote_ip)
+                async with submit_admission.admit(key, self.admission_txs()):
+                    return await self.submit()
+            except AdmissionRejected as e:
+                self.set_status(e.status)
+                if e.status == 503:
+                    self.set_header('Retry-After', '1')
+                return Routers.fail(self, e.message)
+
+        def admission_txs(self):
+            return 1
+
+        async def submit(self):
             try:
                 body = json.loads(self.request.body)
             except json.decoder.JSONDecodeError:
@@ -68,125 +416,266 @@ class Routers:
             if not tx_payload:
                 return Routers.fail(self, 'request signedTx is empty')
 
-            tx_obj = self.parse_raw_tx(tx_payload)
-            validate_error = await self.validate_tx(tx_obj)
+            try:
+                tx_obj = self.parse_raw_tx(tx_payload)
+            except Exception as e:
+                return Routers.fail(self, str(e))
+
+            conflict = mempool.find_conflict(tx_obj)
+            if conflict:
+                return Routers.fail(self, f'inputs are already spent by pending tx: {conflict}')
+
+            try:
+                validate_error = await self.validate_tx(tx_obj)
+            except InvalidWitness as e:
+                # Can never be accepted, the bridge is not asked.
+                return Routers.fail(self, f'Transaction validation error: {e}')
+
             if validate_error:
                 self.logger.error('local tx validation failed: %s', validate_error)
 
-            try:            
-                resp = await self.http_bridge.post_signed_tx(json.dumps(body))
-            except Exception as e:
-                self.logger.exception(e)
-                return Routers.fail(self, 'send tx to bridge error')
+            # Inputs are reserved before the bridge round trip, so a concurrent
+            # double spend is rejected too.
+            is_reserved = tx_obj['id'] not in mempool
+            mempool.add(tx_obj)
+            is_sent, network_error = await self.send_tx(tx_payload)
+            if not is_sent and is_reserved:
+                mempool.remove(tx_obj['id'])
 
-            self.logger.debug('send tx response: %s', resp)
-            try:
-                if resp.status == 200:
-                    await self.store_tx_as_pending(tx_obj)
+            if is_sent:
+                try:
+                    await self.store_txs_as_pending([tx_obj])
                     if validate_error:
                         self.logger.warn('local validation error, but network send succeed!')
-            except Exception as e:
-                self.logger.exception('fail to store tx as pending in DB!');
-                raise Exception('Internal DB fail in the importer!')
+                except Exception as e:
+                    self.logger.exception('fail to store tx as pending in DB!')
+                    raise Exception('Internal DB fail in the importer!')
 
-            status_text, status, resp_body = None, None, None
-            if validate_error and resp.status != 200:
+                return Routers.success(self)
+
+            if validate_error:
                 # We send specific local response with network response attached
-                ret = f'Transaction validation error: {validate_error} (Network response: {resp.data}).'
-                return Routers.fail(self, ret)
-            else:
-                # Locally we have no validation errors - proxy the network response
-                if resp.status == 200:
-                    return Routers.success(self)
+                return Routers.fail(self, f'Transaction validation error: {validate_error} (Network response: {network_error}).')
+
+            return Routers.fail(self, network_error)
+
+        async def send_tx(self, tx_payload: str):
+            try:
+                resp = await self.http_bridge.post_signed_tx(json.dumps({'signedTx': tx_payload}))
+            except HTTPClientError as e:
+                if e.response is not None and e.response.body:
+                    return False, e.response.body.decode(errors='replace')
 
-                return Routers.fail(resp.content)
+                return False, str(e)
+            except Exception as e:
+                self.logger.exception(e)
+                return False, 'send tx to bridge error'
+
+            self.logger.debug('send tx response: %s', resp.code)
+            return True, None
 
         def parse_raw_tx(self, tx_payload: str):
-            self.logger.debug(f'parse raw tx: %s', tx_payload)
+            self.logger.debug('parse raw tx of %d base64 chars', len(tx_payload))
             try:
                 b64_decode = base64.b64decode(tx_payload)
             except Exception as e:
                 raise Exception('invalid base64 signedTx input.')
 
-            tx = cbor.loads(b64_decode)
+            tx = codec.loads(b64_decode)
             tx_obj = utils.convert_raw_tx_to_obj(tx, {
                 'txTime': datetime.utcnow(),
                 'txOrdinal': None,
                 'status': TX_PENDING_STATUS,
                 'blockNum': None,
-                'blockHash': None,
+                'block_hash': None,
             })
             return tx_obj
 
-        async def store_tx_as_pending(self, tx):
-            self.logger.debug('store tx as pending: %s', tx)
-            await self.db.save_txs(tx)
+        async def store_txs_as_pending(self, txs: list):
+            self.logger.debug('store %d txs as pending', len(txs))
+            # Inputs may be outputs of other pending txs, which are not in utxos.
+            utxo_ids = [utils.get_utxo_id(inp) for tx in txs for inp in tx['inputs']]
+            utxo_map = mempool.get_utxos(utxo_ids)
+            db_utxos = await self.db.get_utxos_by_ids([utxo_id for utxo_id in utxo_ids if utxo_id not in utxo_map])
+            utxo_map.update({utxo['id']: utxo for utxo in db_utxos})
+            txs_utxos = {tx['id']: [
+                utxo_map[utils.get_utxo_id(inp)] for inp in tx['inputs'] if utils.get_utxo_id(inp) in utxo_map
+            ] for tx in txs}
+            await self.db.save_many_txs(txs, txs_utxos)
+            for tx in txs:
+                event_bus.emit(EVENT_TX_STATE, {
+                    'txHashes': [tx['id']],
+                    'addresses': list(set(utils.fix_long_address(out['address']) for out in tx['outputs'])),
+                    'state': TX_PENDING_STATUS,
+                    'blockNum': None,
+                })
 
-        async def validate_tx(self, tx_obj):
+        async def get_full_outputs(self, tx_hashes: list):
+            full_outputs = mempool.get_txs_outputs(tx_hashes)
+            full_outputs.update(await self.db.get_txs_by_hashes(
+                [tx_hash for tx_hash in tx_hashes if tx_hash not in full_outputs]
+            ))
+            return full_outputs
+
+        async def validate_tx(self, tx_obj, full_outputs=None):
+            """
+            Returns the validation error, None when the tx is valid. Raises
+            InvalidWitness for txs that are rejected without the bridge.
+            """
             try:
+                if full_outputs is None:
+                    tx_hashes = list(set([inp['txId'] for inp in tx_obj['inputs']]))
+                    full_outputs = await self.get_full_outputs(tx_hashes)
+
                 await self.validate_tx_witnesses(
                     tx_obj['id'], 
                     tx_obj['inputs'], 
-                    tx_obj['witnesses']
+                    tx_obj['witnesses'],
+                    full_outputs
                 )
                 self.validate_destination_network(tx_obj['outputs'])
 
                 return None
+            except InvalidWitness as e:
+                self.logger.info('tx %s rejected locally: %s', tx_obj['id'], e)
+                raise
             except Exception as e:
                 self.logger.exception(e)
                 return str(e)
 
-        async def validate_tx_witnesses(self, tx_id, inputs, witnesses):
+        async def validate_tx_witnesses(self, tx_id, inputs, witnesses, full_outputs: dict):
             self.logger.debug(f'validate witnesses for tx: {tx_id}')
             if len(inputs) != len(witnesses):
-              raise Exception(f'length of inputs: {len(inputs)} not equal length of witnesses: {len(witnesses)}')
+                raise InvalidWitness(f'length of inputs: {len(inputs)} not equal length of witnesses: {len(witnesses)}')
 
-            tx_hashes = list(set([inp['txId'] for inp in inputs]))
-            full_outputs = await self.db.get_txs_by_hashes(tx_hashes)
-            for inp, witness in zip(inputs, witnesses):
-                input_type, input_tx_id, input_idx = inp
-                witnessType, sign = witness
-                if input_type != 0 or witnessType != 0:
-                    self.logger.debug(f'ignore non-regular input/witness types: %s/%s', input_type, witnessType)
+            signatures = []
+            for index, (inp, tx_witness) in enumerate(zip(inputs, witnesses)):
+                input_tx_id, input_idx = inp['txId'], inp['idx']
+                witness_type, sign = tx_witness['type'], tx_witness['sign']
+                if witness_type not in witness.SIGN_TAGS:
+                    self.logger.debug('ignore witness of type: %s', witness_type)
+                    continue
 
                 tx_outputs = full_outputs.get(input_tx_id)
-                if not tx_outputs:
+                if not tx_outputs or input_idx >= len(tx_outputs):
                     raise Exception(f'No UTXO is found for tx {input_tx_id}! Maybe the blockchain is still syncing? If not, something is wrong.')
 
                 input_address, input_amount = tx_outputs[input_idx]
                 self.logger.debug('validate witness for input: %s.%s (%s coin from %s)', input_tx_id, input_idx, input_amount, input_address)
-                address_root, addr_attr, address_type = self.deconstruct_address(input_address)
-                if address_type != 0:
-                    self.logger.debug('Unsupported address type: %s. skip witness validation for this input.', address_type)
-                    return
-
-                address_root_hex = address_root.toString('hex')
-                expected_struct = [0, [0, sign[0]], addr_attr]
-                encoded_struct = cbor.encodeCanonical(expected_struct)
-                bytes_struct = bytes.fromhex(sha3_256(encoded_struct).digest())
-                expected_root_hex = blake2b(bytes_struct, digest_size=28).hexdigest()
-                if address_root_hex != expected_root_hex:
-                    raise Exception('Witness does not match: %s != %s', address_root_hex, expected_root_hex)
+                public_key, signature = sign
+                witness.check_address_root(index, witness_type, public_key, address_codec.decode_address(input_address))
+                signatures.append((index, public_key, witness.sign_data(witness_type, self.protocol_magic, tx_id), signature))
+
+            if signatures:
+                await IOLoop.current().run_in_executor(witness_executor, witness.verify_signatures, signatures)
 
         def validate_destination_network(self, outputs):
             self.logger.debug('validate output network.')
-            for i, out in enumerate(outputs):
-                address = out['address']
-                self.logger.debug('validate network for %s', address)
-                addr_attr = self.deconstruct_address(address)
-                network_attr = addr_attr and addr_attr.get and addr_attr.get(2)
-                network_magic = network_attr and network_attr.readInt32BE(1)
+            decoded = address_codec.decode_addresses([out['address'] for out in outputs])
+            for i, address in enumerate(decoded):
+                addr_attr = address['addr_attr']
+                network_attr = addr_attr.get(2) if isinstance(addr_attr, dict) else None
+                network_magic = codec.loads(network_attr) if network_attr else None
                 if network_magic != self.expected_network_magic:
                     raise Exception('output %s network magic is %s, expected %s' % (i, network_magic, self.expected_network_magic))
 
-        @staticmethod 
-        def deconstruct_address(address: str):
-            address_root, addr_attr, address_type = cbor.loads(
-              cbor.loads(base58.b58decode(address))[0].value
-            )
-
-            return {
-                'address_root': address_root, 
-                'addr_attr': addr_attr, 
-                'address_type': address_type
-            }
+    class SignBatchHandler(SignHandler):
+
+        def admission_txs(self):
+            # Every tx of the batch counts against the quota of the client, an
+            # invalid body is rejected by submit.
+            try:
+                tx_payloads = json.loads(self.request.body).get('signedTxs')
+            except (ValueError, AttributeError):
+                return 1
+
+            return len(tx_payloads) if isinstance(tx_payloads, list) and tx_payloads else 1
+
+        async def submit(self):
+            try:
+                body = json.loads(self.request.body)
+            except json.decoder.JSONDecodeError:
+                return Routers.fail(self, 'invalid request')
+
+            if not isinstance(body, dict):
+                return Routers.fail(self, 'invalid request')
+
+            tx_payloads = body.get('signedTxs')
+            if not tx_payloads or not isinstance(tx_payloads, list):
+                return Routers.fail(self, 'request signedTxs is empty')
+
+            if len(tx_payloads) > MAX_TXS_PER_BATCH:
+                return Routers.fail(self, f'request signedTxs exceeds the limit of {MAX_TXS_PER_BATCH}')
+
+            results = [{'id': None, 'success': False, 'message': None} for _ in tx_payloads]
+            txs, reserved = {}, set()
+            for i, tx_payload in enumerate(tx_payloads):
+                try:
+                    tx = self.parse_raw_tx(tx_payload)
+                except Exception as e:
+                    results[i]['message'] = str(e)
+                    continue
+
+                results[i]['id'] = tx['id']
+                # Earlier txs of the batch are reserved already, so conflicts
+                # inside the batch are caught as well.
+                conflict = mempool.find_conflict(tx)
+                if conflict:
+                    results[i]['message'] = f'inputs are already spent by pending tx: {conflict}'
+                    continue
+
+                if tx['id'] not in mempool:
+                    reserved.add(tx['id'])
+                    mempool.add(tx)
+                txs[i] = tx
+
+            # One lookup for the inputs of every tx in the batch.
+            tx_hashes = list(set(inp['txId'] for tx in txs.values() for inp in tx['inputs']))
+            full_outputs = await self.get_full_outputs(tx_hashes)
+            async def validate(i):
+                try:
+                    return i, await self.validate_tx(txs[i], full_outputs)
+                except InvalidWitness as e:
+                    return i, e
+
+            # Signatures of all txs are verified on the worker pool at once.
+            validate_errors = {}
+            for i, validate_error in await asyncio.gather(*[validate(i) for i in txs]):
+                if isinstance(validate_error, InvalidWitness):
+                    results[i]['message'] = f'Transaction validation error: {validate_error}'
+                    if txs[i]['id'] in reserved:
+                        mempool.remove(txs[i]['id'])
+                    del txs[i]
+                    continue
+
+                validate_errors[i] = validate_error
+
+            semaphore = asyncio.Semaphore(BRIDGE_POST_CONCURRENCY)
+
+            async def send(i):
+                async with semaphore:
+                    return i, await self.send_tx(tx_payloads[i])
+
+            accepted = {}
+            for i, (is_sent, network_error) in await asyncio.gather(*[send(i) for i in txs]):
+                if is_sent:
+                    results[i].update({'success': True, 'message': 'OK'})
+                    accepted[txs[i]['id']] = txs[i]
+                    continue
+
+                if txs[i]['id'] in reserved:
+                    mempool.remove(txs[i]['id'])
+
+                if validate_errors[i]:
+                    results[i]['message'] = f'Transaction validation error: {validate_errors[i]} (Network response: {network_error}).'
+                else:
+                    results[i]['message'] = network_error
+
+            if accepted:
+                try:
+                    await self.store_txs_as_pending(list(accepted.values()))
+                except Exception as e:
+                    self.logger.exception('fail to store %d txs as pending in DB!', len(accepted))
+                    raise Exception('Internal DB fail in the importer!')
+
+            self.write(json.dumps({'success': True, 'results': results}))
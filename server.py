@@ -1,5 +1,8 @@
+import sys
+import signal
 import asyncio
 from db import DB
+from config import config
 from lib.logger import get_logger
 from models.http_bridge import HttpBridge
 from models.genesis import Genesis
@@ -14,9 +17,7 @@ enable_pretty_logging()
 
 logger = get_logger('server')
 
-async def main():
-    database = DB()
-    http_bridge = HttpBridge()
+async def load_genesis(database: DB, http_bridge: HttpBridge):
     is_loaded = await database.is_genesis_loaded()
     if not is_loaded:
         logger.info('start to load genesis.')
@@ -36,7 +37,17 @@ async def main():
     else:
         logger.info('genesis has already loaded.')
 
-    scheduler = Scheduler()
+
+async def main(scheduler: Scheduler):
+    database = DB()
+    http_bridge = HttpBridge()
+    await database.migrate()
+    if await database.has_legacy_tx_encoding():
+        raise Exception('the database has tx ids that do not match the chain, drop its tables and import it again')
+    await scheduler.load_state()
+    # Two EXISTS probes, cheap enough to run on every start.
+    await load_genesis(database, http_bridge)
+
     await scheduler.start()
 
     logger.info('server is running.')
@@ -54,6 +65,19 @@ if __name__ == '__main__':
 
     logger.info('server is listen on port: %d', options.port)
 
+    admin_config = config.get('admin', {})
+    if admin_config.get('port'):
+        admin_address = admin_config.get('address', '127.0.0.1')
+        Application(routers.admin()).listen(admin_config['port'], admin_address)
+        logger.info('admin endpoints listen on %s:%d', admin_address, admin_config['port'])
+
+    # SIGTERM unwinds like ctrl-c, so the state is saved on both.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    scheduler = Scheduler()
     loop = IOLoop.current()
-    loop.run_sync(main)
-    loop.start()
+    try:
+        loop.run_sync(lambda: main(scheduler))
+        loop.start()
+    finally:
+        scheduler.save_state()
+        logger.info('state saved on shutdown.')
@@ -0,0 +1,45 @@
+-- Brings a database created by the loose sql/*-table.sql scripts from before
+-- migrations to the schema of 0001_initial, it is then recorded at that
+-- version. Those scripts had scalar columns for the input and output
+-- addresses and amounts, and no address_balances or watched_addresses.
+
+ALTER TABLE blocks ADD COLUMN IF NOT EXISTS block_height integer;
+
+DO $$
+BEGIN
+    IF (SELECT data_type FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = 'txs' AND column_name = 'inputs_address') <> 'ARRAY' THEN
+        -- A text[] written to the old TEXT columns was stored in its text form.
+        ALTER TABLE txs
+            ALTER COLUMN inputs_address TYPE TEXT[] USING CASE
+                WHEN inputs_address IS NULL THEN NULL
+                WHEN inputs_address LIKE '{%}' THEN inputs_address::TEXT[]
+                ELSE ARRAY[inputs_address] END,
+            ALTER COLUMN outputs_address TYPE TEXT[] USING CASE
+                WHEN outputs_address IS NULL THEN NULL
+                WHEN outputs_address LIKE '{%}' THEN outputs_address::TEXT[]
+                ELSE ARRAY[outputs_address] END,
+            ALTER COLUMN inputs_amount TYPE BIGINT[] USING CASE
+                WHEN inputs_amount IS NULL THEN NULL ELSE ARRAY[inputs_amount] END,
+            ALTER COLUMN outputs_amount TYPE BIGINT[] USING CASE
+                WHEN outputs_amount IS NULL THEN NULL ELSE ARRAY[outputs_amount] END;
+    END IF;
+END
+$$;
+
+CREATE TABLE IF NOT EXISTS address_balances (
+    address TEXT PRIMARY KEY,
+    balance BIGINT NOT NULL DEFAULT 0,
+    utxo_count INTEGER NOT NULL DEFAULT 0
+);
+
+-- Balances are maintained incrementally from here on, start from the utxos.
+INSERT INTO address_balances (address, balance, utxo_count)
+    SELECT receiver, sum(amount), count(*) FROM utxos WHERE receiver IS NOT NULL GROUP BY receiver
+    ON CONFLICT (address) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS watched_addresses (
+    address TEXT PRIMARY KEY,
+    added_at timestamp with time zone DEFAULT now(),
+    backfilled boolean DEFAULT false
+);
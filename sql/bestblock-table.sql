@@ -1,5 +0,0 @@
-CREATE TABLE bestblock ( 
-    best_block_num bigint 
-);
-
-INSERT INTO bestblock (best_block_num) VALUES (-1);
\ No newline at end of file
@@ -0,0 +1,71 @@
+-- Schema of the loose sql/*-table.sql scripts used before migrations, with
+-- array columns and the balance tables. Databases created with those
+-- scripts are adopted at this version by sql/adopt_legacy_schema.sql.
+CREATE TABLE bestblock (
+    best_block_num bigint
+);
+
+INSERT INTO bestblock (best_block_num) VALUES (-1);
+
+CREATE TABLE blocks  (
+  block_hash TEXT PRIMARY KEY,
+  epoch integer,
+  slot integer,
+  block_height integer
+);
+
+CREATE TABLE txs (
+    hash TEXT  PRIMARY KEY,
+    inputs json,
+    inputs_address TEXT[],
+    inputs_amount BIGINT[],
+    outputs_address TEXT[],
+    outputs_amount BIGINT[],
+    block_num BIGINT NULL,
+    block_hash TEXT      NULL,
+    time timestamp with time zone NULL,
+    tx_state TEXT DEFAULT true,
+    tx_ordinal INTEGER,
+    last_update timestamp with time zone,
+    tx_body TEXT      DEFAULT NULL
+);
+
+CREATE INDEX ON txs (hash);
+CREATE INDEX ON txs (hash, last_update);
+
+CREATE TABLE tx_addresses (
+    tx_hash TEXT REFERENCES txs ON DELETE CASCADE,
+    address TEXT,
+    PRIMARY KEY (tx_hash, address)
+);
+
+CREATE INDEX ON tx_addresses (tx_hash);
+CREATE INDEX ON tx_addresses (address);
+
+CREATE TABLE utxos  (
+    utxo_id text PRIMARY KEY,
+    tx_hash text,
+    tx_index integer,
+    receiver text,
+    amount bigint,
+    block_num integer
+);
+
+CREATE INDEX ON utxos (receiver);
+
+CREATE TABLE utxos_backup (
+    like utxos including all,
+    deleted_block_num integer
+);
+
+CREATE TABLE address_balances (
+    address TEXT PRIMARY KEY,
+    balance BIGINT NOT NULL DEFAULT 0,
+    utxo_count INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE watched_addresses (
+    address TEXT PRIMARY KEY,
+    added_at timestamp with time zone DEFAULT now(),
+    backfilled boolean DEFAULT false
+);
@@ -0,0 +1,30 @@
+-- Indexes matching the queries in db.py. Everything is IF [NOT] EXISTS, so
+-- databases created from any revision of the old scripts end up the same.
+
+-- get_best_block_num sorts by height, rollback_blocks_from_height and the
+-- snapshot cut filter on it.
+CREATE INDEX IF NOT EXISTS blocks_block_height_idx ON blocks (block_height);
+
+-- hash is the primary key already, last_update is never filtered on.
+DROP INDEX IF EXISTS txs_hash_idx;
+DROP INDEX IF EXISTS txs_hash_last_update_idx;
+-- Rollbacks filter on block_num, history pages on (block_num, tx_ordinal).
+CREATE INDEX IF NOT EXISTS txs_block_num_tx_ordinal_idx ON txs (block_num, tx_ordinal);
+
+-- tx_hash leads the primary key already. History lookups by address only
+-- need tx_hash, which an (address, tx_hash) index answers by itself.
+DROP INDEX IF EXISTS tx_addresses_tx_hash_idx;
+DROP INDEX IF EXISTS tx_addresses_address_idx;
+CREATE INDEX IF NOT EXISTS tx_addresses_address_tx_hash_idx ON tx_addresses (address, tx_hash);
+
+-- Balances, history and watched address lookups go by receiver. Rows are
+-- appended in block order, rollbacks filter on block_num.
+CREATE INDEX IF NOT EXISTS utxos_receiver_idx ON utxos (receiver);
+CREATE INDEX IF NOT EXISTS utxos_block_num_idx ON utxos USING brin (block_num);
+
+-- Point-in-time lookups: an output is held over [block_num, deleted_block_num).
+-- Rollbacks and pruning filter on deleted_block_num.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+CREATE INDEX IF NOT EXISTS utxos_backup_receiver_int8range_idx ON utxos_backup
+    USING gist (receiver, int8range(block_num, deleted_block_num));
+CREATE INDEX IF NOT EXISTS utxos_backup_deleted_block_num_idx ON utxos_backup USING brin (deleted_block_num);
@@ -0,0 +1,113 @@
+-- txs and tx_addresses are partitioned by block height ranges. Pending txs
+-- have no block_num yet and live in the default partitions. A unique key on
+-- a partitioned table has to include block_num, so the hashes are kept
+-- unique in tx_hashes, maintained by triggers on txs: a second row with the
+-- same hash fails as it did with the primary key.
+
+CREATE OR REPLACE FUNCTION create_tx_partitions(max_block_num bigint, partition_blocks bigint)
+RETURNS void AS $$
+DECLARE
+    low bigint := 0;
+BEGIN
+    WHILE low <= max_block_num LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF txs FOR VALUES FROM (%s) TO (%s)',
+            'txs_' || low / partition_blocks, low, low + partition_blocks
+        );
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF tx_addresses FOR VALUES FROM (%s) TO (%s)',
+            'tx_addresses_' || low / partition_blocks, low, low + partition_blocks
+        );
+        low := low + partition_blocks;
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE txs RENAME TO txs_unpartitioned;
+ALTER TABLE tx_addresses RENAME TO tx_addresses_unpartitioned;
+
+CREATE TABLE txs (
+    hash TEXT NOT NULL,
+    inputs json,
+    inputs_address TEXT[],
+    inputs_amount BIGINT[],
+    outputs_address TEXT[],
+    outputs_amount BIGINT[],
+    block_num BIGINT NULL,
+    block_hash TEXT      NULL,
+    time timestamp with time zone NULL,
+    tx_state TEXT DEFAULT true,
+    tx_ordinal INTEGER,
+    last_update timestamp with time zone,
+    tx_body TEXT      DEFAULT NULL
+) PARTITION BY RANGE (block_num);
+
+CREATE TABLE txs_pending PARTITION OF txs DEFAULT;
+
+-- block_num tells the partition of a tx without scanning all of them.
+CREATE TABLE tx_hashes (
+    hash TEXT PRIMARY KEY,
+    block_num BIGINT NULL
+);
+
+CREATE OR REPLACE FUNCTION tx_hashes_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO tx_hashes (hash, block_num) SELECT hash, block_num FROM new_rows;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION tx_hashes_update() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM tx_hashes USING old_rows WHERE tx_hashes.hash = old_rows.hash;
+    INSERT INTO tx_hashes (hash, block_num) SELECT hash, block_num FROM new_rows;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION tx_hashes_delete() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM tx_hashes USING old_rows WHERE tx_hashes.hash = old_rows.hash;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+-- Statement triggers see all rows of a statement at once, also of COPY and
+-- of updates moving rows to another partition.
+CREATE TRIGGER txs_hashes_insert AFTER INSERT ON txs
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION tx_hashes_insert();
+CREATE TRIGGER txs_hashes_update AFTER UPDATE ON txs
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION tx_hashes_update();
+CREATE TRIGGER txs_hashes_delete AFTER DELETE ON txs
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION tx_hashes_delete();
+
+-- block_num is copied from txs, so rows are partitioned the same way.
+CREATE TABLE tx_addresses (
+    tx_hash TEXT NOT NULL,
+    address TEXT,
+    block_num BIGINT NULL
+) PARTITION BY RANGE (block_num);
+
+CREATE TABLE tx_addresses_pending PARTITION OF tx_addresses DEFAULT;
+
+SELECT create_tx_partitions(COALESCE((SELECT max(block_num) FROM txs_unpartitioned), 0), 1000000);
+
+INSERT INTO txs (hash, inputs, inputs_address, inputs_amount, outputs_address, outputs_amount, block_num, block_hash, time, tx_state,
+    tx_ordinal, last_update, tx_body)
+    SELECT hash, inputs, inputs_address, inputs_amount, outputs_address, outputs_amount, block_num, block_hash, time, tx_state,
+    tx_ordinal, last_update, tx_body
+    FROM txs_unpartitioned;
+INSERT INTO tx_addresses (tx_hash, address, block_num)
+    SELECT tx_addresses_unpartitioned.tx_hash, tx_addresses_unpartitioned.address, txs_unpartitioned.block_num
+    FROM tx_addresses_unpartitioned JOIN txs_unpartitioned ON txs_unpartitioned.hash = tx_addresses_unpartitioned.tx_hash;
+
+DROP TABLE tx_addresses_unpartitioned;
+DROP TABLE txs_unpartitioned;
+
+-- Built after the copy, and created on every partition.
+CREATE INDEX txs_hash_idx ON txs (hash);
+CREATE INDEX txs_block_num_tx_ordinal_idx ON txs (block_num, tx_ordinal);
+CREATE INDEX txs_block_num_brin_idx ON txs USING brin (block_num);
+CREATE INDEX tx_addresses_tx_hash_idx ON tx_addresses (tx_hash);
+CREATE INDEX tx_addresses_address_tx_hash_idx ON tx_addresses (address, tx_hash);
+CREATE INDEX tx_addresses_block_num_brin_idx ON tx_addresses USING brin (block_num);
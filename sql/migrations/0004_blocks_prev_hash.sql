@@ -0,0 +1,3 @@
+-- Lets the chain of stored blocks be verified after the fact. Blocks stored
+-- before this migration have no prev_hash.
+ALTER TABLE blocks ADD COLUMN IF NOT EXISTS prev_hash TEXT;
@@ -0,0 +1,40 @@
+-- Aggregates written by the importer, so dashboards read one row per block
+-- or epoch instead of scanning txs. Rollbacks delete the rows above the
+-- rollback height, the epoch row is then written again.
+
+CREATE TABLE IF NOT EXISTS block_stats (
+    block_height integer PRIMARY KEY,
+    epoch integer NOT NULL,
+    slot integer,
+    tx_count integer NOT NULL,
+    input_count integer NOT NULL,
+    output_count integer NOT NULL,
+    output_total bigint NOT NULL,
+    fee_total bigint NOT NULL,
+    -- Size of the tx bodies, block fullness against the max block size.
+    tx_bytes integer NOT NULL,
+    largest_tx_hash TEXT,
+    largest_tx_output bigint
+);
+
+CREATE INDEX IF NOT EXISTS block_stats_epoch_idx ON block_stats (epoch);
+
+CREATE TABLE IF NOT EXISTS epoch_stats (
+    epoch integer PRIMARY KEY,
+    block_count integer NOT NULL,
+    first_block_height integer NOT NULL,
+    last_block_height integer NOT NULL,
+    tx_count bigint NOT NULL,
+    input_count bigint NOT NULL,
+    output_count bigint NOT NULL,
+    output_total numeric NOT NULL,
+    fee_total bigint NOT NULL,
+    tx_bytes bigint NOT NULL,
+    max_block_tx_bytes integer NOT NULL,
+    largest_tx_hash TEXT,
+    largest_tx_output bigint,
+    -- NULL when the importer did not see every tx of the epoch, e.g. after
+    -- a restart with watched addresses enabled.
+    unique_addresses integer,
+    updated_at timestamp with time zone DEFAULT now()
+);
@@ -0,0 +1,203 @@
+-- Inputs and outputs of txs get their own rows instead of a json blob plus
+-- four arrays per tx, and addresses are stored once. txs stays as a view of
+-- the old shape for existing readers, and tx_addresses becomes a view of
+-- the addresses of the inputs and outputs.
+
+CREATE TABLE addresses (
+    id bigserial PRIMARY KEY,
+    address TEXT NOT NULL UNIQUE
+);
+
+-- The spent output is kept on the input: its tx is not stored for genesis
+-- outputs, or in filter mode. Inputs that could not be resolved, e.g. of
+-- pending txs, have no address.
+CREATE TABLE tx_inputs (
+    tx_hash TEXT NOT NULL,
+    idx integer NOT NULL,
+    src_tx TEXT NOT NULL,
+    src_idx integer NOT NULL,
+    address_id bigint,
+    amount bigint,
+    PRIMARY KEY (tx_hash, idx)
+);
+
+CREATE TABLE tx_outputs (
+    tx_hash TEXT NOT NULL,
+    idx integer NOT NULL,
+    address_id bigint NOT NULL,
+    amount bigint NOT NULL,
+    PRIMARY KEY (tx_hash, idx)
+);
+
+INSERT INTO addresses (address)
+    SELECT DISTINCT address FROM txs, unnest(inputs_address || outputs_address) address
+    WHERE address IS NOT NULL;
+
+-- The inputs json only had the resolved inputs, in the order they were
+-- looked up. Their position is read from the tx body: inputs as an
+-- indefinite-length array, or as written before, a definite array of byte
+-- strings: 9f, one encoded input each, ff.
+CREATE OR REPLACE FUNCTION pg_temp.cbor_head(body bytea, pos integer, OUT major integer, OUT arg bigint, OUT next integer) AS $$
+DECLARE
+    info integer := get_byte(body, pos) & 31;
+BEGIN
+    major := get_byte(body, pos) >> 5;
+    next := pos + 1;
+    IF info = 31 THEN
+        arg := NULL;
+    ELSIF info < 24 THEN
+        arg := info;
+    ELSE
+        arg := 0;
+        FOR i IN 1 .. 1 << (info - 24) LOOP
+            arg := arg * 256 + get_byte(body, next);
+            next := next + 1;
+        END LOOP;
+    END IF;
+END
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION pg_temp.tx_body_inputs(tx_body text) RETURNS TABLE (idx integer, src_tx text, src_idx integer) AS $$
+DECLARE
+    body bytea;
+    head record;
+    items integer;
+    pos integer;
+    input_pos integer;
+    src_txs text[] := '{}';
+    src_idxs integer[] := '{}';
+BEGIN
+    body := decode(tx_body, 'hex');
+    -- [inputs, outputs, attributes]
+    SELECT * INTO head FROM pg_temp.cbor_head(body, 0);
+    SELECT * INTO head FROM pg_temp.cbor_head(body, head.next);
+    items := head.arg;
+    pos := head.next;
+    LOOP
+        IF items IS NULL THEN
+            EXIT WHEN get_byte(body, pos) = 255;
+            input_pos := pos;
+        ELSE
+            EXIT WHEN items = 0;
+            items := items - 1;
+            SELECT * INTO head FROM pg_temp.cbor_head(body, pos);
+            pos := head.next + head.arg;
+            -- The 9f and ff markers.
+            CONTINUE WHEN head.arg = 1;
+            input_pos := head.next;
+        END IF;
+        -- [0, tag 24 (bytes of [tx id, index])]
+        SELECT * INTO head FROM pg_temp.cbor_head(body, input_pos);
+        SELECT * INTO head FROM pg_temp.cbor_head(body, head.next);
+        SELECT * INTO head FROM pg_temp.cbor_head(body, head.next);
+        SELECT * INTO head FROM pg_temp.cbor_head(body, head.next);
+        IF items IS NULL THEN
+            pos := head.next + head.arg;
+        END IF;
+        SELECT * INTO head FROM pg_temp.cbor_head(body, head.next);
+        SELECT * INTO head FROM pg_temp.cbor_head(body, head.next);
+        src_txs := src_txs || encode(substring(body FROM head.next + 1 FOR head.arg::integer), 'hex');
+        SELECT * INTO head FROM pg_temp.cbor_head(body, head.next + head.arg::integer);
+        src_idxs := src_idxs || head.arg::integer;
+    END LOOP;
+
+    RETURN QUERY SELECT (u.ordinality - 1)::integer, u.src_tx, u.src_idx
+        FROM unnest(src_txs, src_idxs) WITH ORDINALITY u(src_tx, src_idx, ordinality);
+EXCEPTION WHEN others THEN
+    -- Not a body of this shape, its inputs keep the stored order.
+    RETURN;
+END
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+CREATE TEMP TABLE body_inputs ON COMMIT DROP AS
+    SELECT txs.hash, b.idx, b.src_tx, b.src_idx
+    FROM txs, pg_temp.tx_body_inputs(txs.tx_body) b
+    WHERE txs.tx_body IS NOT NULL;
+
+INSERT INTO tx_inputs (tx_hash, idx, src_tx, src_idx, address_id, amount)
+    SELECT b.hash, b.idx, b.src_tx, b.src_idx, a.id, (u.utxo->>'amount')::bigint
+    FROM body_inputs b
+    JOIN txs ON txs.hash = b.hash
+    LEFT JOIN LATERAL (
+        SELECT e.utxo FROM json_array_elements(txs.inputs) e(utxo)
+        WHERE e.utxo->>'txHash' = b.src_tx AND (e.utxo->>'index')::integer = b.src_idx
+        LIMIT 1
+    ) u ON true
+    LEFT JOIN addresses a ON a.address = u.utxo->>'address';
+
+INSERT INTO tx_inputs (tx_hash, idx, src_tx, src_idx, address_id, amount)
+    SELECT txs.hash, i.ordinality - 1, i.utxo->>'txHash', (i.utxo->>'index')::integer, a.id, (i.utxo->>'amount')::bigint
+    FROM txs, json_array_elements(txs.inputs) WITH ORDINALITY i(utxo, ordinality)
+    LEFT JOIN addresses a ON a.address = i.utxo->>'address'
+    WHERE NOT EXISTS (SELECT 1 FROM body_inputs b WHERE b.hash = txs.hash);
+
+INSERT INTO tx_outputs (tx_hash, idx, address_id, amount)
+    SELECT txs.hash, o.ordinality - 1, a.id, o.amount
+    FROM txs, unnest(txs.outputs_address, txs.outputs_amount) WITH ORDINALITY o(address, amount, ordinality)
+    JOIN addresses a ON a.address = o.address;
+
+-- Built after the copy. Spends of an output and outputs of an address.
+CREATE INDEX tx_inputs_src_tx_src_idx_idx ON tx_inputs (src_tx, src_idx);
+CREATE INDEX tx_inputs_address_id_idx ON tx_inputs (address_id);
+CREATE INDEX tx_outputs_address_id_idx ON tx_outputs (address_id);
+
+DROP TABLE tx_addresses;
+
+ALTER TABLE txs RENAME TO tx_records;
+ALTER TABLE tx_records
+    DROP COLUMN inputs,
+    DROP COLUMN inputs_address,
+    DROP COLUMN inputs_amount,
+    DROP COLUMN outputs_address,
+    DROP COLUMN outputs_amount;
+
+CREATE OR REPLACE FUNCTION create_tx_partitions(max_block_num bigint, partition_blocks bigint)
+RETURNS void AS $$
+DECLARE
+    low bigint := 0;
+BEGIN
+    WHILE low <= max_block_num LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF tx_records FOR VALUES FROM (%s) TO (%s)',
+            'txs_' || low / partition_blocks, low, low + partition_blocks
+        );
+        low := low + partition_blocks;
+    END LOOP;
+END
+$$ LANGUAGE plpgsql;
+
+-- Only resolved inputs were stored before, the view keeps it that way.
+CREATE VIEW txs AS
+SELECT t.hash,
+       COALESCE(i.inputs, '[]'::json) AS inputs,
+       COALESCE(i.inputs_address, '{}') AS inputs_address,
+       COALESCE(i.inputs_amount, '{}') AS inputs_amount,
+       COALESCE(o.outputs_address, '{}') AS outputs_address,
+       COALESCE(o.outputs_amount, '{}') AS outputs_amount,
+       t.block_num, t.block_hash, t.time, t.tx_state, t.tx_ordinal, t.last_update, t.tx_body
+FROM tx_records t
+LEFT JOIN LATERAL (
+    SELECT json_agg(json_build_object(
+               'address', a.address, 'amount', i.amount, 'id', i.src_tx || i.src_idx,
+               'index', i.src_idx, 'txHash', i.src_tx
+           ) ORDER BY i.idx) AS inputs,
+           array_agg(a.address ORDER BY i.idx) AS inputs_address,
+           array_agg(i.amount ORDER BY i.idx) AS inputs_amount
+    FROM tx_inputs i JOIN addresses a ON a.id = i.address_id
+    WHERE i.tx_hash = t.hash
+) i ON true
+LEFT JOIN LATERAL (
+    SELECT array_agg(a.address ORDER BY o.idx) AS outputs_address,
+           array_agg(o.amount ORDER BY o.idx) AS outputs_amount
+    FROM tx_outputs o JOIN addresses a ON a.id = o.address_id
+    WHERE o.tx_hash = t.hash
+) o ON true;
+
+-- Filters on address or block_num are pushed into both branches, down to
+-- the address_id indexes and the tx_records partitions.
+CREATE VIEW tx_addresses AS
+SELECT i.tx_hash, a.address, t.block_num
+FROM tx_inputs i JOIN addresses a ON a.id = i.address_id JOIN tx_records t ON t.hash = i.tx_hash
+UNION
+SELECT o.tx_hash, a.address, t.block_num
+FROM tx_outputs o JOIN addresses a ON a.id = o.address_id JOIN tx_records t ON t.hash = o.tx_hash;
@@ -1,4 +0,0 @@
-CREATE TABLE utxos_backup (
-    like utxos including all,
-    deleted_block_num integer
-);
\ No newline at end of file
@@ -0,0 +1,11 @@
+import os
+import sys
+import importlib.util
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# config.py is written per deployment, the example stands in for it.
+if not os.path.exists(os.path.join(ROOT_DIR, 'config.py')):
+    spec = importlib.util.spec_from_file_location('config', os.path.join(ROOT_DIR, 'config.example.py'))
+    sys.modules['config'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['config'])
@@ -0,0 +1,67 @@
+import base58
+import base64
+import binascii
+import pytest
+from lib import address as address_codec
+from lib.cbor_codec import codec
+
+# A regular Byron address and its root, see tests/test_witness.py.
+ADDRESS = 'Ae2tdPwUPEZ18ECT6ywsEv1cBGkrcyhJRaghfJLVwQWWj3nwvaBSaRwrEab'
+ADDRESS_ROOT = '2b4760cae89b7ae856a47dfdfc54e3210e18ebc5b23d030d33e0583f'
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    for func in [address_codec.encode_raw, address_codec.to_raw, address_codec.decode_raw, address_codec.redeem_key_to_address]:
+        func.cache_clear()
+
+
+def with_crc(address: str, crc: int):
+    tagged, _ = codec.loads(base58.b58decode(address))
+    return base58.b58encode(codec.dumps([tagged, crc])).decode()
+
+
+def test_decode_and_encode_round_trip():
+    decoded = address_codec.decode_address(ADDRESS)
+    assert decoded == {'address_root': bytes.fromhex(ADDRESS_ROOT), 'addr_attr': {}, 'address_type': 0}
+    structure = codec.loads(base58.b58decode(ADDRESS))
+    assert address_codec.encode_addresses([structure]) == [ADDRESS]
+    assert address_codec.decode_address(ADDRESS.encode()) is decoded
+
+
+def test_checksum_mismatch_is_rejected():
+    tagged, crc = codec.loads(base58.b58decode(ADDRESS))
+    assert crc == binascii.crc32(tagged.value)
+    broken = with_crc(ADDRESS, crc ^ 1)
+    with pytest.raises(ValueError, match='invalid address checksum'):
+        address_codec.decode_address(broken)
+    assert address_codec.validate_addresses([ADDRESS, broken, 'not base58 0OIl']) == [True, False, False]
+
+
+def test_hot_addresses_are_served_from_the_cache():
+    structure = codec.loads(base58.b58decode(ADDRESS))
+    for _ in range(3):
+        address_codec.encode_address(structure)
+        address_codec.decode_address(ADDRESS)
+
+    assert address_codec.encode_raw.cache_info().hits == 2
+    assert address_codec.decode_raw.cache_info().hits == 2
+
+
+def test_cache_is_bounded():
+    maxsize = address_codec.decode_raw.cache_info().maxsize
+    assert maxsize
+    structure = codec.loads(base58.b58decode(ADDRESS))
+    payload = structure[0].value
+    for i in range(maxsize + 10):
+        address_codec.encode_raw(payload, i)
+    assert address_codec.encode_raw.cache_info().currsize == maxsize
+
+
+def test_redeem_key_gives_a_redeem_address():
+    key = base64.urlsafe_b64encode(bytes(range(32))).decode()
+    address = address_codec.redeem_key_to_address(key)
+    assert address_codec.redeem_key_to_address(key) == address
+    decoded = address_codec.decode_address(address)
+    assert decoded['address_type'] == 2
+    assert decoded['addr_attr'] == {}
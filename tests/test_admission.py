@@ -0,0 +1,164 @@
+import asyncio
+import pytest
+from lib.admission import AdmissionController, AdmissionRejected
+
+
+def controller(**limits):
+    options = {'max_in_flight': 1, 'max_queue': 2, 'max_wait': 1, 'per_key_limit': 2, 'per_key_tx_limit': 10}
+    options.update(limits)
+    return AdmissionController(**options)
+
+
+def test_waiters_are_admitted_in_order():
+    async def run():
+        admission, admitted = controller(), []
+
+        async def request(name):
+            async with admission.admit():
+                admitted.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(request('a'), request('b'), request('c'))
+        return admission, admitted
+
+    admission, admitted = asyncio.run(run())
+    assert admitted == ['a', 'b', 'c']
+    assert admission.in_flight == 0
+    assert admission.admitted == 3
+
+
+def test_full_queue_is_shed():
+    async def run():
+        admission = controller(max_queue=1)
+        await admission.acquire()
+        queued = asyncio.ensure_future(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire()
+        admission.release()
+        await queued
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(run())
+    assert rejected.status == 503
+    assert admission.shed == {'queue_full': 1}
+    assert admission.in_flight == 1
+
+
+def test_waiters_past_the_deadline_are_shed():
+    async def run():
+        admission = controller(max_wait=0.01)
+        await admission.acquire('key')
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire('key')
+        return admission
+
+    admission = asyncio.run(run())
+    assert admission.shed == {'deadline': 1}
+    assert admission.key_counts == {'key': 1}
+    assert not admission.waiters
+
+
+def test_key_quota():
+    async def run():
+        admission = controller(max_in_flight=4, per_key_limit=1)
+        await admission.acquire('key')
+        await admission.acquire('other')
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire('key')
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(run())
+    assert rejected.status == 429
+    assert admission.shed == {'key_quota': 1}
+    assert admission.in_flight == 2
+
+
+def test_cancelled_waiter_releases_its_key():
+    async def run():
+        admission = controller()
+        await admission.acquire()
+        waiting = asyncio.ensure_future(admission.acquire('key'))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        admission.release()
+        return admission
+
+    admission = asyncio.run(run())
+    assert admission.key_counts == {}
+    assert not admission.waiters
+    assert admission.in_flight == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def run():
+        admission = controller()
+        await admission.acquire()
+        waiting = asyncio.ensure_future(admission.acquire('key'))
+        await asyncio.sleep(0)
+        # The slot is handed over, then the waiter is cancelled before it runs.
+        admission.release()
+        waiting.cancel()
+        try:
+            await waiting
+        except asyncio.CancelledError:
+            pass
+        else:
+            admission.release('key')
+        return admission
+
+    admission = asyncio.run(run())
+    assert admission.key_counts == {}
+    assert admission.in_flight == 0
+
+
+def test_client_key_is_a_configured_key_or_the_address():
+    admission = controller(api_keys=['k1'])
+    assert admission.client_key('k1', '10.0.0.1') == 'key:k1'
+    assert admission.client_key(None, '10.0.0.1') == 'ip:10.0.0.1'
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.client_key('made-up', '10.0.0.1')
+    assert rejected.value.status == 403
+    assert admission.shed == {'unknown_key': 1}
+
+
+def test_batch_counts_every_tx_against_the_quota():
+    async def run():
+        admission = controller(max_in_flight=4)
+        await admission.acquire('key', 6)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire('key', 5)
+        await admission.acquire('key', 4)
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(run())
+    assert rejected.status == 429
+    assert admission.shed == {'key_tx_quota': 1}
+    assert admission.key_txs == {'key': 10}
+
+
+def test_batch_over_the_tx_limit_is_refused():
+    async def run():
+        admission = controller()
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire('key', 11)
+        return admission, rejected.value
+
+    admission, rejected = asyncio.run(run())
+    assert rejected.status == 413
+    assert admission.key_counts == {} and admission.key_txs == {}
+    assert admission.in_flight == 0
+
+
+def test_released_batch_gives_its_txs_back():
+    async def run():
+        admission = controller()
+        async with admission.admit('key', 10):
+            pass
+        await admission.acquire('key', 10)
+        return admission
+
+    admission = asyncio.run(run())
+    assert admission.key_txs == {'key': 10}
@@ -0,0 +1,46 @@
+import pytest
+from models.auto_tuner import AutoTuner
+
+
+@pytest.fixture
+def tuner():
+    tuner = AutoTuner()
+    tuner.settings['maxBlocksPerLoop'].update(min=1000, max=50000)
+    tuner.settings['checkTipSeconds'].update(min=5, max=30)
+    return tuner
+
+
+def test_override_is_clamped_to_the_bounds(tuner):
+    tuner.override({'maxBlocksPerLoop': 0, 'checkTipSeconds': 1e12})
+    assert tuner.get('maxBlocksPerLoop') == 1000
+    assert tuner.get('checkTipSeconds') == 30
+
+
+def test_override_keeps_the_type_of_the_setting(tuner):
+    tuner.override({'maxBlocksPerLoop': 2500.7})
+    assert tuner.get('maxBlocksPerLoop') == 2500
+    assert isinstance(tuner.get('maxBlocksPerLoop'), int)
+
+
+@pytest.mark.parametrize('value', [float('inf'), float('-inf'), float('nan'), True, '100', [100]])
+def test_invalid_values_are_rejected(tuner, value):
+    with pytest.raises(ValueError):
+        tuner.override({'maxBlocksPerLoop': value})
+    assert tuner.settings['maxBlocksPerLoop']['override'] is None
+
+
+def test_nothing_is_applied_when_one_value_is_invalid(tuner):
+    with pytest.raises(ValueError):
+        tuner.override({'checkTipSeconds': 10, 'maxBlocksPerLoop': float('inf')})
+    with pytest.raises(ValueError):
+        tuner.override({'checkTipSeconds': 10, 'unknown': 1})
+    assert tuner.settings['checkTipSeconds']['override'] is None
+    assert not tuner.changes
+
+
+def test_null_clears_the_override(tuner):
+    default = tuner.get('checkTipSeconds')
+    tuner.override({'checkTipSeconds': 20})
+    tuner.override({'checkTipSeconds': None})
+    assert tuner.get('checkTipSeconds') == default
+    assert [change['reason'] for change in tuner.changes] == ['overridden over the admin endpoint', 'override cleared']
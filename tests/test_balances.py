@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from lib.event_bus import EventBus
+from models import balances as balances_module
+from models.balances import Balances
+from constants.events import EVENT_BLOCK_APPLIED, EVENT_ROLLBACK, EVENT_TX_STATE
+
+
+class FakeDB:
+
+    def __init__(self, rows: dict):
+        self.rows = rows
+        self.queries = []
+
+    async def get_balances(self, addresses: list):
+        self.queries.append(list(addresses))
+        return {address: self.rows[address] for address in addresses if address in self.rows}
+
+
+@pytest.fixture
+def balances(monkeypatch):
+    monkeypatch.setattr(balances_module, 'event_bus', EventBus())
+    return Balances()
+
+
+@pytest.fixture
+def db():
+    return FakeDB({'addr1': {'balance': 100, 'utxo_count': 2}})
+
+
+def test_unknown_addresses_have_no_balance(balances, db):
+    ret = asyncio.run(balances.get(db, ['addr1', 'addr2']))
+    assert ret == {
+        'addr1': {'balance': 100, 'utxo_count': 2},
+        'addr2': {'balance': 0, 'utxo_count': 0},
+    }
+
+
+def test_cached_balances_are_not_queried_again(balances, db):
+    asyncio.run(balances.get(db, ['addr1']))
+    asyncio.run(balances.get(db, ['addr1', 'addr2']))
+    assert db.queries == [['addr1'], ['addr2']]
+
+
+@pytest.mark.parametrize('event_type', [EVENT_BLOCK_APPLIED, EVENT_TX_STATE])
+def test_events_invalidate_their_addresses(balances, db, event_type):
+    asyncio.run(balances.get(db, ['addr1', 'addr2']))
+    db.rows['addr1'] = {'balance': 40, 'utxo_count': 1}
+    balances.on_event({'type': event_type, 'addresses': ['addr1']})
+
+    assert asyncio.run(balances.get(db, ['addr1', 'addr2']))['addr1'] == {'balance': 40, 'utxo_count': 1}
+    assert db.queries[-1] == ['addr1']
+
+
+def test_rollback_clears_every_balance(balances, db):
+    asyncio.run(balances.get(db, ['addr1', 'addr2']))
+    balances.on_event({'type': EVENT_ROLLBACK})
+
+    asyncio.run(balances.get(db, ['addr1', 'addr2']))
+    assert db.queries[-1] == ['addr1', 'addr2']
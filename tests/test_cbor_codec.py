@@ -0,0 +1,107 @@
+import pytest
+from hashlib import blake2b
+from lib import utils
+from lib.cbor_codec import codec, cbor2, BACKENDS, TAG_TYPES
+from models.block import Block
+from bench.chain_generator import ChainGenerator
+from bench.cbor_speed import epoch_blobs, clear_caches
+
+INSTALLED_BACKENDS = [backend for backend in BACKENDS if backend != 'cbor2' or cbor2 is not None]
+# (name, cbor hex, expected decoded value)
+DECODE_VECTORS = [
+    ('tag 24', 'd81843820102', ('tag', 24, b'\x82\x01\x02')),
+    ('indefinite array', '9f0102ff', [1, 2]),
+    ('nested indefinite arrays', '9f9f01ff9fff02ff', [[1], [], 2]),
+    ('indefinite bytes', '5f4201024103ff', b'\x01\x02\x03'),
+    ('indefinite map', 'bf0102ff', ('map', [(1, 2)])),
+    ('address', '82d818582183581c' + '00' * 28 + 'a0001a12345678',
+     [('tag', 24, bytes.fromhex('83581c' + '00' * 28 + 'a000')), 0x12345678]),
+]
+# (name, value, expected canonical cbor hex)
+CANONICAL_VECTORS = [
+    ('int keys', {10: 1, 1: 2, 256: 3, -1: 4}, 'a401020a012004190100' + '03'),
+    ('nested maps', [{2: {1: b''}, 1: []}], '81a2018002a10140'),
+]
+
+
+def normalize(value):
+    """Decoded values of any backend in one comparable form."""
+    if isinstance(value, TAG_TYPES):
+        return ('tag', value.tag, normalize(value.value))
+    if isinstance(value, dict):
+        return ('map', [(normalize(key), normalize(item)) for key, item in value.items()])
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+
+    return value
+
+
+def block_summary(block: Block):
+    return {
+        'hash': block.hash,
+        'prev_hash': block.prev_hash,
+        'epoch': block.epoch,
+        'slot': block.slot,
+        'height': block.height,
+        'txs': [{
+            'id': tx['id'],
+            'txBody': tx['txBody'],
+            'inputs': tx['inputs'],
+            'outputs': tx['outputs'],
+            'witnesses': normalize([[wit['type'], wit['sign']] for wit in tx['witnesses']]),
+        } for tx in block.txs or []],
+    }
+
+
+def use_backend(backend: str):
+    codec.set_backend(backend)
+    # Cached addresses were decoded by the previous backend.
+    clear_caches()
+
+
+@pytest.fixture(params=INSTALLED_BACKENDS)
+def backend(request):
+    previous = codec.backend
+    use_backend(request.param)
+    yield request.param
+    use_backend(previous)
+
+
+@pytest.fixture(scope='module')
+def chain():
+    generator = ChainGenerator(epochs=1, blocks_per_epoch=20, txs_per_block=3, wallets=20).generate()
+    return generator.network['startTime'], list(epoch_blobs(generator.epoch_files[0]))
+
+
+@pytest.mark.parametrize('name, data, expected', DECODE_VECTORS)
+def test_decode_vector(backend, name, data, expected):
+    assert normalize(codec.loads(bytes.fromhex(data))) == expected
+
+
+@pytest.mark.parametrize('name, value, expected', CANONICAL_VECTORS)
+def test_canonical_vector(backend, name, value, expected):
+    assert codec.dumps(value, canonical=True).hex() == expected
+
+
+def test_encoding_is_the_same_for_all_backends(backend):
+    value = [1, -5, b'ab', 'x', codec.Tag(24, b'\x01'), {1: [2]}, 2 ** 40, True, None]
+    assert codec.dumps(value).hex() == '8901244261626178d8184101a10181021b0000010000000000f5f6'
+
+
+def test_tx_body_vector(backend):
+    # Byron txs: inputs and outputs as indefinite-length arrays, the id is the hash of those bytes.
+    tx_input = [0, codec.Tag(24, codec.dumps([b'\x11' * 32, 0]))]
+    expected_body = '839f8200d8185824825820' + '11' * 32 + '00ff9f820001ffa0'
+    tx_id, tx_body = utils.pack_raw_txid_and_body([[[tx_input], [[0, 1]], {}], []])
+    assert tx_body == expected_body
+    assert tx_id == blake2b(bytes.fromhex(expected_body), digest_size=32).hexdigest()
+
+
+def test_blocks_are_parsed_the_same_by_all_backends(backend, chain):
+    start_time, blobs = chain
+    use_backend(BACKENDS[0])
+    reference = [(normalize(codec.loads(blob)), block_summary(Block.from_CBOR(blob, start_time))) for blob in blobs]
+
+    use_backend(backend)
+    for blob, expected in zip(blobs, reference):
+        assert (normalize(codec.loads(blob)), block_summary(Block.from_CBOR(blob, start_time))) == expected
@@ -0,0 +1,53 @@
+import random
+from array import array
+import pytest
+from models import chain_stats
+from models.chain_stats import TX_SUM_COLUMNS, aggregate_blocks
+
+
+def make_txs(tx_blocks: list, output_totals: list):
+    columns = {column: array('q', [index + 1 for index in range(len(tx_blocks))]) for column in TX_SUM_COLUMNS}
+    columns['output_total'] = array('q', output_totals)
+    return array('q', tx_blocks), columns
+
+
+def aggregate_pure_python(monkeypatch, *args):
+    with monkeypatch.context() as m:
+        m.setattr(chain_stats, 'np', None)
+        return aggregate_blocks(*args)
+
+
+@pytest.fixture
+def txs():
+    # Block 1 has no txs, the two txs of block 2 tie on the largest output total.
+    return make_txs([0, 0, 2, 2, 3], [10, 5, 7, 7, 1])
+
+
+def test_pure_python_aggregates(monkeypatch, txs):
+    result = aggregate_pure_python(monkeypatch, 4, *txs)
+    assert result['tx_count'] == [2, 0, 2, 1]
+    assert result['input_count'] == [1 + 2, 0, 3 + 4, 5]
+    assert result['output_total'] == [15, 0, 14, 1]
+    assert result['largest'] == [0, -1, 3, 4]
+
+
+def test_numpy_matches_pure_python(monkeypatch, txs):
+    pytest.importorskip('numpy')
+    assert aggregate_blocks(4, *txs) == aggregate_pure_python(monkeypatch, 4, *txs)
+
+
+def test_numpy_matches_pure_python_on_random_blocks(monkeypatch):
+    pytest.importorskip('numpy')
+    rng = random.Random(7)
+    tx_blocks = sorted(rng.choice(range(50)) for _ in range(500))
+    txs = make_txs(tx_blocks, [rng.randrange(5) for _ in tx_blocks])
+    assert aggregate_blocks(60, *txs) == aggregate_pure_python(monkeypatch, 60, *txs)
+
+
+def test_blocks_without_txs(monkeypatch):
+    txs = make_txs([], [])
+    expected = {column: [0, 0] for column in TX_SUM_COLUMNS + ['tx_count']}
+    expected['largest'] = [-1, -1]
+    assert aggregate_pure_python(monkeypatch, 2, *txs) == expected
+    if chain_stats.np is not None:
+        assert aggregate_blocks(2, *txs) == expected
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from db import DBPool, WorkerDBs
+
+
+class FakeDB:
+
+    def __init__(self, is_reusable=True):
+        self.reusable = is_reusable
+        self.closed = False
+
+    def is_reusable(self):
+        return self.reusable
+
+    def close(self):
+        self.closed = True
+
+
+def test_released_connection_is_reused():
+    pool = DBPool(2)
+    db = FakeDB()
+    pool.release(db)
+    assert pool.acquire() is db
+    assert not db.closed
+
+
+def test_connection_left_in_a_transaction_is_closed():
+    pool = DBPool(2)
+    db = FakeDB(is_reusable=False)
+    pool.release(db)
+    assert pool.idle == []
+    assert db.closed
+
+
+def test_idle_connections_are_capped():
+    pool = DBPool(1)
+    kept, extra = FakeDB(), FakeDB()
+    pool.release(kept)
+    pool.release(extra)
+    assert pool.idle == [kept]
+    assert extra.closed
+
+
+def test_worker_connections_are_kept_per_thread_and_closed_together(monkeypatch):
+    worker_dbs = WorkerDBs()
+    monkeypatch.setattr('db.DB', FakeDB)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        used = set(executor.map(lambda _: id(worker_dbs.get()), range(20)))
+
+    databases = worker_dbs.databases
+    assert len(used) == len(databases) <= 2
+    worker_dbs.close()
+    assert all(database.closed for database in databases)
+    assert worker_dbs.databases == []
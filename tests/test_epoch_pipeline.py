@@ -0,0 +1,123 @@
+import asyncio
+from models.epoch_pipeline import EpochPipeline, MemoryBudget
+
+
+async def is_blocked(task):
+    await asyncio.sleep(0.01)
+    return not task.done()
+
+
+def test_acquire_waits_for_a_release():
+    async def run():
+        budget = MemoryBudget(100)
+        await budget.acquire(60)
+        waiting = asyncio.ensure_future(budget.acquire(60))
+        blocked = await is_blocked(waiting)
+        await budget.release(60)
+        await waiting
+        return budget, blocked
+
+    budget, blocked = asyncio.run(run())
+    assert blocked
+    assert budget.used == 60
+
+
+def test_oversized_acquire_passes_when_nothing_is_held():
+    async def run():
+        budget = MemoryBudget(100)
+        await budget.acquire(250)
+        return budget
+
+    assert asyncio.run(run()).used == 250
+
+
+def test_smaller_resize_wakes_waiters():
+    async def run():
+        budget = MemoryBudget(100)
+        await budget.acquire(80)
+        waiting = asyncio.ensure_future(budget.acquire(50))
+        blocked = await is_blocked(waiting)
+        await budget.resize(80, 30)
+        await waiting
+        return budget, blocked
+
+    budget, blocked = asyncio.run(run())
+    assert blocked
+    assert budget.used == 80
+
+
+def test_larger_resize_waits_for_room():
+    async def run():
+        budget = MemoryBudget(100)
+        await budget.acquire(40)
+        await budget.acquire(40)
+        growing = asyncio.ensure_future(budget.resize(40, 90))
+        blocked = await is_blocked(growing)
+        await budget.release(40)
+        await growing
+        return budget, blocked
+
+    budget, blocked = asyncio.run(run())
+    assert blocked
+    assert budget.used == 90
+
+
+def test_resize_of_the_only_holder_passes_over_the_limit():
+    async def run():
+        budget = MemoryBudget(100)
+        await budget.acquire(40)
+        await budget.resize(40, 300)
+        return budget
+
+    assert asyncio.run(run()).used == 300
+
+
+class FakeBridge:
+
+    def __init__(self, budget_log, sizes):
+        self.budget_log = budget_log
+        self.sizes = sizes
+        self.pipeline = None
+
+    async def get_raw_epoch_by_id(self, epoch_id):
+        self.budget_log.append(self.pipeline.budget.used)
+        return b'\x00' * self.sizes[epoch_id]
+
+
+def test_download_holds_budget_before_the_epoch_arrives(monkeypatch):
+    monkeypatch.setattr('models.epoch_pipeline.EPOCH_SIZE_ESTIMATE', 10)
+    monkeypatch.setattr('models.epoch_pipeline.PARSED_EPOCH_MEMORY_FACTOR', 1)
+
+    async def run():
+        budget_log = []
+        bridge = FakeBridge(budget_log, {0: 30, 1: 5})
+        pipeline = EpochPipeline(bridge, None)
+        bridge.pipeline = pipeline
+        pipeline.budget = MemoryBudget(1000)
+        downloaded = asyncio.Queue()
+        await pipeline.download([0, 1], downloaded)
+        items = [downloaded.get_nowait() for _ in range(3)]
+        return pipeline.budget, budget_log, items
+
+    budget, budget_log, items = asyncio.run(run())
+    # The first epoch is estimated, the next one as large as the previous.
+    assert budget_log == [20, 60 + 60]
+    assert [(epoch_id, size) for epoch_id, _, size in items[:2]] == [(0, 60), (1, 10)]
+    assert items[2] is None
+    assert budget.used == 70
+
+
+def test_failed_download_gives_the_estimate_back(monkeypatch):
+    class FailingBridge:
+        async def get_raw_epoch_by_id(self, epoch_id):
+            raise IOError('bridge is gone')
+
+    async def run():
+        pipeline = EpochPipeline(FailingBridge(), None)
+        try:
+            await pipeline.download([0], asyncio.Queue())
+        except IOError:
+            pass
+        return pipeline.budget
+
+    assert asyncio.run(run()).used == 0
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+from config import config
+from lib.event_bus import EventBus, Subscription
+from routers import Routers
+from constants.events import EVENT_BLOCK_APPLIED, EVENT_ROLLBACK, EVENT_TX_STATE, EVENT_OVERFLOW
+
+
+def block(height, addresses=()):
+    return {'type': EVENT_BLOCK_APPLIED, 'height': height, 'addresses': list(addresses), 'txHashes': []}
+
+
+def rollback(height):
+    return {'type': EVENT_ROLLBACK, 'height': height}
+
+
+def drain(subscription: Subscription):
+    async def get_all():
+        events = []
+        while subscription.dropped or subscription.dropped_rollback or not subscription.queue.empty():
+            events.append(await subscription.get())
+        return events
+
+    return asyncio.run(get_all())
+
+
+def test_slow_subscriber_loses_the_oldest_events():
+    subscription = Subscription(buffer_size=2)
+    for height in range(1, 5):
+        subscription.push(block(height))
+
+    events = drain(subscription)
+    assert events[0] == {'type': EVENT_OVERFLOW, 'dropped': 2}
+    assert [event['height'] for event in events[1:]] == [3, 4]
+
+
+def test_dropped_rollback_is_still_delivered():
+    subscription = Subscription(buffer_size=2)
+    for event in [rollback(5), rollback(3), block(4), block(5), block(6)]:
+        subscription.push(event)
+
+    events = drain(subscription)
+    assert events[0] == {'type': EVENT_OVERFLOW, 'dropped': 3}
+    # The deepest rollback covers both, newer blocks follow it.
+    assert events[1] == rollback(3)
+    assert [event['height'] for event in events[2:]] == [5, 6]
+
+
+def test_rollbacks_pass_every_filter():
+    subscription = Subscription(addresses=['a1'])
+    subscription.push(block(1, ['a2']))
+    subscription.push(rollback(0))
+    subscription.push(block(2, ['a1']))
+    assert drain(subscription) == [rollback(0), block(2, ['a1'])]
+
+
+def test_emit_reaches_listeners_and_matching_subscriptions():
+    bus = EventBus()
+    seen = []
+    bus.add_listener(seen.append)
+    subscription = bus.subscribe(tx_hashes=['t1'])
+    bus.emit(EVENT_TX_STATE, {'txHashes': ['t1'], 'addresses': []})
+    bus.emit(EVENT_TX_STATE, {'txHashes': ['t2'], 'addresses': []})
+    assert [event['txHashes'] for event in seen] == [['t1'], ['t2']]
+    assert [event['txHashes'] for event in drain(subscription)] == [['t1']]
+
+
+def subscribe_handler(monkeypatch, allowed_origins=()):
+    monkeypatch.setitem(config, 'subscribe', {'allowedOrigins': list(allowed_origins)})
+    handler = Routers.SubscribeHandler.__new__(Routers.SubscribeHandler)
+    handler.request = SimpleNamespace(headers={'Host': 'importer.example'})
+    handler.subscription = Subscription()
+    handler.messages = []
+    handler.write_message = handler.messages.append
+    return handler
+
+
+def test_cross_site_subscriptions_need_an_allowed_origin(monkeypatch):
+    handler = subscribe_handler(monkeypatch, ['https://wallet.example'])
+    assert handler.check_origin('http://importer.example')
+    assert handler.check_origin('https://wallet.example')
+    assert not handler.check_origin('https://evil.example')
+
+
+def test_filters_must_be_lists_of_strings(monkeypatch):
+    handler = subscribe_handler(monkeypatch)
+    for message in ['{"addresses": "abc"}', '{"addresses": 5}', '{"addresses": [{}]}', '{"txs": ["t1", 2]}']:
+        handler.on_message(message)
+
+    assert all('invalid request' in message for message in handler.messages)
+    assert handler.subscription.addresses == set() and handler.subscription.tx_hashes == set()
+
+    handler.on_message('{"addresses": ["a1"], "txs": ["t1"]}')
+    assert handler.subscription.addresses == {'a1'} and handler.subscription.tx_hashes == {'t1'}
@@ -0,0 +1,73 @@
+import pytest
+from models.mempool import Mempool
+
+
+def make_tx(tx_id, inputs, outputs=(('addr', 10), )):
+    return {
+        'id': tx_id,
+        'inputs': [{'txId': tx_hash, 'idx': idx} for tx_hash, idx in inputs],
+        'outputs': [{'address': address, 'value': value} for address, value in outputs],
+    }
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('models.mempool.monotonic', lambda: now[0])
+    return now
+
+
+def test_conflicting_spend_is_found():
+    mempool = Mempool()
+    mempool.add(make_tx('t1', [('a', 0)]))
+    assert mempool.find_conflict(make_tx('t2', [('b', 0), ('a', 0)])) == 't1'
+    assert mempool.find_conflict(make_tx('t1', [('a', 0)])) is None
+    assert mempool.find_conflict(make_tx('t3', [('a', 1)])) is None
+
+
+def test_pending_outputs_can_be_spent():
+    mempool = Mempool()
+    mempool.add(make_tx('t1', [('a', 0)], [('addr1', 7), ('addr2', 3)]))
+    assert mempool.get_utxos(['t11', 'x0']) == {'t11': {'id': 't11', 'address': 'addr2', 'amount': 3, 'txHash': 't1', 'index': 1}}
+    assert mempool.get_txs_outputs(['t1', 't2']) == {'t1': [('addr1', 7), ('addr2', 3)]}
+
+
+def test_confirm_removes_the_tx_and_evicts_double_spends():
+    mempool = Mempool()
+    mempool.add(make_tx('t1', [('a', 0)]))
+    mempool.add(make_tx('t2', [('b', 0)]))
+    mempool.add(make_tx('t3', [('c', 0)]))
+    # t1 made it into a block, another tx of the block spent what t2 spends.
+    mempool.confirm(['t1', 'other'], ['a0', 'b0', 'z0'])
+    assert 't1' not in mempool and 't2' not in mempool
+    assert 't3' in mempool
+    assert mempool.spent_inputs == {'c0': 't3'}
+    assert set(mempool.outputs) == {'t30'}
+
+
+def test_expire_drops_txs_past_their_ttl(clock):
+    mempool = Mempool(ttl=60)
+    mempool.add(make_tx('t1', [('a', 0)]))
+    clock[0] += 30
+    mempool.add(make_tx('t2', [('b', 0)]))
+    clock[0] += 31
+    mempool.expire()
+    assert 't1' not in mempool and 't2' in mempool
+    assert mempool.find_conflict(make_tx('t4', [('a', 0)])) is None
+
+
+def test_dump_and_restore_keep_the_remaining_ttl(clock):
+    mempool = Mempool(ttl=60)
+    mempool.add(make_tx('t1', [('a', 0)]))
+    clock[0] += 20
+    entries = mempool.dump()
+    assert entries[0]['ttl'] == 40
+
+    restored = Mempool(ttl=60)
+    restored.restore(entries + [dict(entries[0], id='gone', ttl=0)])
+    assert len(restored) == 1
+    assert restored.find_conflict(make_tx('t2', [('a', 0)])) == 't1'
+    assert restored.get_utxos(['t10']) == mempool.get_utxos(['t10'])
+    clock[0] += 41
+    restored.expire()
+    assert len(restored) == 0
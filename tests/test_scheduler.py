@@ -0,0 +1,41 @@
+import asyncio
+from collections import deque
+from types import SimpleNamespace
+from models.scheduler import Scheduler
+from models.auto_tuner import auto_tuner
+from constants.scheduler import STATUS_BLOCK_PROCESSED
+
+
+class FakeDB:
+
+    async def get_best_block_num(self):
+        return {'height': 0, 'epoch': 0, 'slot': None, 'hash': None}
+
+    async def ensure_tx_partitions(self, block_height):
+        return False
+
+
+class FakeBridge:
+
+    async def get_status(self):
+        tip = {'slot': [5, 100], 'height': 50000}
+        return {'packedEpochs': 3, 'tip': {'local': tip, 'remote': tip}}
+
+
+def test_epoch_sync_that_stored_nothing_is_recorded(monkeypatch):
+    scheduler = Scheduler.__new__(Scheduler)
+    scheduler.logger = SimpleNamespace(info=lambda *args: None)
+    scheduler.db = FakeDB()
+    scheduler.http_bridge = FakeBridge()
+    scheduler.watched_addresses = None
+    scheduler.recent_blocks = deque()
+    scheduler.blocks_to_store = []
+
+    async def process_epochs(epoch_ids, height):
+        return STATUS_BLOCK_PROCESSED
+
+    syncs = []
+    monkeypatch.setattr(scheduler, 'process_epochs', process_epochs)
+    monkeypatch.setattr(auto_tuner, 'record_sync', lambda *args: syncs.append(args[:2]))
+    asyncio.run(scheduler.check_tip())
+    assert syncs == [(True, 0)]
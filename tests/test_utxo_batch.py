@@ -0,0 +1,59 @@
+import pytest
+from models.utxo_batch import UtxoBatch
+
+
+def make_tx(tx_id, block_num, inputs, outputs):
+    return {
+        'id': tx_id,
+        'blockNum': block_num,
+        'inputs': [{'txId': tx_hash, 'idx': idx} for tx_hash, idx in inputs],
+        'outputs': [{'address': address, 'value': value} for address, value in outputs],
+    }
+
+
+@pytest.fixture
+def batch():
+    # b spends an output of a created in the run, and a stored output.
+    return UtxoBatch([
+        make_tx('a', 10, [('genesis', 0)], [('addr1', 100), ('addr2', 50)]),
+        make_tx('b', 11, [('a', 0), ('stored', 1)], [('addr3', 120)]),
+    ])
+
+
+def db_utxo(tx_hash, idx, address, amount):
+    return {'id': f'{tx_hash}{idx}', 'address': address, 'amount': amount, 'txHash': tx_hash, 'index': idx}
+
+
+def test_outputs_spent_in_the_run_are_not_required(batch):
+    assert batch.spent_in_batch == {'a0': 11}
+    assert batch.required == {'genesis0': 10, 'stored1': 11}
+
+
+def test_unspent_skips_outputs_spent_in_the_run(batch):
+    assert sorted(utxo['utxo_id'] for utxo in batch.unspent()) == ['a1', 'b0']
+
+
+def test_resolve_merges_db_rows_and_the_run(batch):
+    txs_inputs = batch.resolve([db_utxo('genesis', 0, 'addr0', 150), db_utxo('stored', 1, 'addr4', 30)])
+    assert [utxo['id'] for utxo in txs_inputs['a']] == ['genesis0']
+    assert txs_inputs['b'] == [
+        {'id': 'a0', 'address': 'addr1', 'amount': 100, 'txHash': 'a', 'index': 0},
+        db_utxo('stored', 1, 'addr4', 30),
+    ]
+
+
+def test_resolve_raises_on_a_missing_input(batch):
+    with pytest.raises(Exception, match='failed to query input utxos for tx: b'):
+        batch.resolve([db_utxo('genesis', 0, 'addr0', 150)])
+
+
+def test_spent_outputs_are_backup_rows(batch):
+    assert batch.spent_outputs() == [{
+        'utxo_id': 'a0',
+        'tx_hash': 'a',
+        'tx_index': 0,
+        'receiver': 'addr1',
+        'amount': 100,
+        'block_num': 10,
+        'deleted_block_num': 11,
+    }]
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from config import config
+from models.scheduler import Scheduler
+from models.watched_addresses import WatchedAddresses
+
+
+class FakeDB:
+
+    def __init__(self, addresses, heights=(), utxos=()):
+        self.addresses = list(addresses)
+        self.heights = list(heights)
+        self.utxos = {utxo['id']: utxo for utxo in utxos}
+        self.utxo_queries = []
+        self.saved = []
+        self.backfilled = []
+
+    async def get_watched_addresses(self):
+        return self.addresses
+
+    async def get_unbackfilled_watched_addresses(self):
+        return self.addresses
+
+    async def get_address_activity_heights(self, addresses, max_height):
+        return self.heights
+
+    async def get_utxos_with_backup_by_ids(self, utxo_ids):
+        self.utxo_queries.append(utxo_ids)
+        return [self.utxos[utxo_id] for utxo_id in utxo_ids if utxo_id in self.utxos]
+
+    async def save_many_txs(self, txs, txs_utxos):
+        self.saved.extend(tx['id'] for tx in txs)
+
+    async def mark_watched_addresses_backfilled(self, addresses):
+        self.backfilled.extend(addresses)
+
+
+class FakeBridge:
+
+    def __init__(self, blocks):
+        self.blocks = blocks
+        self.requested = []
+
+    async def get_block_by_height(self, height):
+        self.requested.append(height)
+        return self.blocks[height]
+
+
+def make_tx(tx_id, inputs, outputs):
+    return {
+        'id': tx_id,
+        'inputs': [{'txId': tx_hash, 'idx': idx} for tx_hash, idx in inputs],
+        'outputs': [{'address': address, 'value': 1} for address in outputs],
+    }
+
+
+def utxo(tx_hash, idx, address):
+    return {'id': f'{tx_hash}{idx}', 'address': address, 'amount': 1, 'txHash': tx_hash, 'index': idx}
+
+
+@pytest.fixture
+def options(monkeypatch):
+    options = {'enabled': True, 'bloom': True, 'bloomHeadroom': 2}
+    monkeypatch.setitem(config, 'watchedAddresses', options)
+    monkeypatch.setitem(config, 'utxoHistoryRetention', None)
+    return options
+
+
+def make_scheduler(db, bridge):
+    scheduler = Scheduler.__new__(Scheduler)
+    scheduler.logger = SimpleNamespace(info=lambda *args: None, warning=lambda *args: None)
+    scheduler.db = db
+    scheduler.http_bridge = bridge
+    scheduler.watched_addresses = WatchedAddresses(db)
+    asyncio.run(scheduler.watched_addresses.load())
+    return scheduler
+
+
+def test_bloom_filter_is_rebuilt_when_full(options):
+    db = FakeDB(['a1', 'a2'])
+    watched = WatchedAddresses(db)
+    asyncio.run(watched.load())
+    assert watched.addresses.capacity == 4
+
+    db.addresses += ['a3', 'a4', 'a5']
+    asyncio.run(watched.add(['a3', 'a4', 'a5']))
+    assert watched.addresses.capacity == 10
+    assert all(address in watched.addresses for address in db.addresses)
+
+
+def test_bloom_filter_with_room_is_not_rebuilt(options):
+    db = FakeDB(['a1', 'a2'])
+    watched = WatchedAddresses(db)
+    asyncio.run(watched.load())
+    bloom = watched.addresses
+
+    asyncio.run(watched.add(['a3']))
+    assert watched.addresses is bloom
+    assert 'a3' in bloom
+
+
+def test_backfill_resolves_the_inputs_of_a_block_at_once(options):
+    block = SimpleNamespace(txs=[
+        make_tx('t1', [('g', 0)], ['other']),
+        make_tx('t2', [('t1', 0)], ['watched']),
+    ])
+    db = FakeDB(['watched'], [5], [utxo('g', 0, 'genesis'), utxo('t1', 0, 'other')])
+    scheduler = make_scheduler(db, FakeBridge({5: block}))
+    asyncio.run(scheduler.backfill_watched_addresses(100))
+
+    assert db.utxo_queries == [['g0', 't10']]
+    assert db.saved == ['t2']
+    assert db.backfilled == ['watched']
+
+
+def test_backfill_skips_blocks_before_the_pruned_history(options, monkeypatch):
+    monkeypatch.setitem(config, 'utxoHistoryRetention', 2000)
+    db = FakeDB(['watched'], [5, 9000], [utxo('g', 0, 'watched')])
+    bridge = FakeBridge({9000: SimpleNamespace(txs=[make_tx('t1', [('g', 0)], ['other'])])})
+    scheduler = make_scheduler(db, bridge)
+    asyncio.run(scheduler.backfill_watched_addresses(10000))
+
+    assert bridge.requested == [9000]
+    assert db.saved == ['t1']
+    assert db.backfilled == ['watched']
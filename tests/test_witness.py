@@ -0,0 +1,60 @@
+import pytest
+from lib import witness
+from lib import address as address_codec
+from lib.witness import InvalidWitness
+
+# RFC 8032, Ed25519 test 1: empty message.
+RFC_PUBLIC_KEY = bytes.fromhex('d75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a')
+RFC_SIGNATURE = bytes.fromhex(
+    'e5564300c360ac729086e2cc806e828a84877f1eb8e5d974d873e065224901555fb8821590a33bacc61e39701cf9b46bd25bf5f0595bbe24655141438e7a100b'
+)
+# A regular Byron address and the extended public key it was derived from.
+XPUB = bytes.fromhex(
+    'a29f179b1b779184b29ecba7abc03a25e29224d56134122ddfed73936e30609d'
+    '22d362584422f09cea02a91e7278c77ac2b6fc5d65dbd9b5a5943db725affa1d'
+)
+ADDRESS = 'Ae2tdPwUPEZ18ECT6ywsEv1cBGkrcyhJRaghfJLVwQWWj3nwvaBSaRwrEab'
+ADDRESS_ROOT = '2b4760cae89b7ae856a47dfdfc54e3210e18ebc5b23d030d33e0583f'
+
+
+def test_signature_vector_is_accepted():
+    witness.verify_signatures([(0, RFC_PUBLIC_KEY, b'', RFC_SIGNATURE)])
+
+
+def test_extended_public_key_is_accepted():
+    # The chain code after the key is not part of the signature check.
+    witness.verify_signatures([(0, RFC_PUBLIC_KEY + bytes(32), b'', RFC_SIGNATURE)])
+
+
+@pytest.mark.parametrize('public_key, data, signature', [
+    (RFC_PUBLIC_KEY, b'\x00', RFC_SIGNATURE),
+    (RFC_PUBLIC_KEY, b'', RFC_SIGNATURE[:-1] + b'\x00'),
+    (RFC_PUBLIC_KEY[:31], b'', RFC_SIGNATURE),
+])
+def test_bad_signature_is_rejected(public_key, data, signature):
+    with pytest.raises(InvalidWitness, match='witness 3 signature is invalid'):
+        witness.verify_signatures([(0, RFC_PUBLIC_KEY, b'', RFC_SIGNATURE), (3, public_key, data, signature)])
+
+
+def test_sign_data_covers_tag_magic_and_tx_id():
+    data = witness.sign_data(witness.PK_WITNESS, 764824073, 'aa' * 32)
+    assert data == bytes.fromhex('01' '1a2d964a09' '5820') + b'\xaa' * 32
+
+
+def test_address_root_vector():
+    assert witness.address_root(0, XPUB, {}).hex() == ADDRESS_ROOT
+    decoded = address_codec.decode_address(ADDRESS)
+    assert decoded['address_root'].hex() == ADDRESS_ROOT
+    witness.check_address_root(0, witness.PK_WITNESS, XPUB, decoded)
+
+
+def test_address_root_of_another_key_is_rejected():
+    decoded = address_codec.decode_address(ADDRESS)
+    with pytest.raises(InvalidWitness, match='witness 1 does not match the address'):
+        witness.check_address_root(1, witness.PK_WITNESS, RFC_PUBLIC_KEY + bytes(32), decoded)
+
+
+def test_redeem_witness_can_not_spend_a_regular_address():
+    decoded = address_codec.decode_address(ADDRESS)
+    with pytest.raises(InvalidWitness, match='witness 0 of type 2 can not spend an address of type 0'):
+        witness.check_address_root(0, witness.REDEEM_WITNESS, XPUB, decoded)